@@ -5,11 +5,15 @@ import "./openzeppelin-solidity/contracts/access/Ownable.sol";
 import "./openzeppelin-solidity/contracts/token/ERC20/ERC20.sol";
 import "./openzeppelin-solidity/contracts/token/ERC20/utils/SafeERC20.sol";
 import "./openzeppelin-solidity/contracts/security/ReentrancyGuard.sol";
+import "./openzeppelin-solidity/contracts/utils/structs/EnumerableSet.sol";
 import "../interfaces/IAaveLendingPoolV2.sol";
 import "../interfaces/IUniswapV3Pool.sol";
 import "../interfaces/IWETH.sol";
 import "./RangeManager.sol";
 import "./RoeRouter.sol";
+import "./lib/Approvals.sol";
+import "./lib/ReserveTokens.sol";
+import "./lib/Sqrt.sol";
 
 
 /**
@@ -26,8 +30,10 @@ Design:
  */
 contract GeVault is ERC20, Ownable, ReentrancyGuard {
   using SafeERC20 for ERC20;
+  using EnumerableSet for EnumerableSet.AddressSet;
   
   event Deposit(address indexed sender, address indexed token, uint amount, uint liquidity);
+  event DepositPair(address indexed sender, uint amount0, uint amount1, uint liquidity);
   event Withdraw(address indexed sender, address indexed token, uint amount, uint liquidity);
   event PushTick(address indexed ticker);
   event ShiftTick(address indexed ticker);
@@ -37,13 +43,32 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   event SetTreasury(address treasury);
   event SetFee(uint baseFeeX4);
   event SetTvlCap(uint tvlCap);
+  event SetIdleBuffer(uint idleBuffer0, uint idleBuffer1);
+  event SetCheckpointBounds(uint maxAge, uint maxDeviationX4);
+  event SyncReserveTokens(address indexed asset, address aToken, address debtToken);
+  event QueueDeposit(address indexed sender, uint indexed epoch, address indexed token, uint amount);
+  event QueueWithdraw(address indexed sender, uint indexed epoch, address indexed token, uint liquidity);
+  event CancelDeposit(address indexed sender, uint indexed epoch, uint amount0, uint amount1);
+  event CancelWithdraw(address indexed sender, uint indexed epoch, uint liquidity);
+  event Settle(uint indexed epoch, uint minted, uint burned);
+  event Claim(address indexed sender, uint indexed epoch, uint liquidity, uint amount0, uint amount1);
 
   RangeManager rangeManager; 
-  /// @notice Ticks properly ordered in ascending price order
-  TokenisableRange[] public ticks;
+  /// @notice Ticks properly ordered in ascending price order, stored as a deque: tick i is at slot ticksHead + i
+  mapping(uint => TokenisableRange) private tickSlots;
+  /// @notice First slot of the ticks deque
+  uint private ticksHead;
+  /// @notice Slot after the last tick of the ticks deque
+  uint private ticksTail;
+  /// @notice Initial slot of the deque, leaves room to add ticks at both ends
+  uint private constant TICKS_ORIGIN = 2**128;
   
-  /// @notice Tracks the beginning of active ticks: the next 4 ticks are the active
-  uint public tickIndex; 
+  /// @notice Tracks the beginning of active ticks, as a deque slot so it stays valid when ticks are shifted in
+  uint private activeTickSlot; 
+  /// @notice Ticks in which the vault holds aTokens: only those are unwound and valued
+  EnumerableSet.AddressSet private fundedTicks;
+  /// @notice Sqrt price beyond which a tick holds the base token, see getActiveTickIndex
+  mapping(address => uint160) private tickBoundsX96;
   /// @notice Pair tokens
   ERC20 public token0;
   ERC20 public token1;
@@ -63,6 +88,66 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   IWETH public WETH;
   bool public baseTokenIsToken0;
   
+  /// @notice Batched orders of an epoch, all priced against the TVL snapshot taken at settlement
+  struct Epoch {
+    uint deposit0;
+    uint deposit1;
+    uint withdrawLiquidity0;
+    uint withdrawLiquidity1;
+    uint mintedLiquidity0;
+    uint mintedLiquidity1;
+    uint withdrawn0;
+    uint withdrawn1;
+    bool isSettled;
+    bool isRefunded;
+  }
+  /// @notice User orders queued in an epoch
+  struct Order {
+    uint deposit0;
+    uint deposit1;
+    uint withdrawLiquidity0;
+    uint withdrawLiquidity1;
+  }
+  /// @notice Epoch currently accepting orders
+  uint public currentEpoch;
+  mapping(uint => Epoch) public epochs;
+  mapping(uint => mapping(address => Order)) public orders;
+  /// @notice Tokens held for queued deposits and claimable withdrawals, never deployed in ticks
+  uint public reserved0;
+  uint public reserved1;
+  /// @notice Amounts of token0 and token1 kept idle in the vault to serve small withdrawals without a rebalance
+  uint public idleBuffer0;
+  uint public idleBuffer1;
+  
+  /// @notice Share price and underlying prices taken after the last deposit or withdrawal
+  /// @dev Packed in 2 slots: {sharePriceX8, blockNumber} and {price0, price1}
+  struct Checkpoint {
+    uint128 sharePriceX8;
+    uint64 blockNumber;
+    uint128 price0;
+    uint128 price1;
+  }
+  /// @notice Share price checkpoint served by latestAnswer while fresh
+  Checkpoint public checkpoint;
+  /// @notice Max checkpoint age, in blocks
+  uint public checkpointMaxAge;
+  /// @notice Max token price deviation since the checkpoint, in E4
+  uint public checkpointMaxDeviationX4;
+  /// @notice Token => spender pairs approved for the max amount
+  mapping(address => mapping(address => bool)) private approved;
+  /// @notice Tick => lending pool reserve tokens, filled when the tick is added
+  mapping(address => ReserveTokens.Tokens) private reserveTokens;
+  
+  /// @notice Ticks balances and values collected in a single pass, shared by fee, TVL and share calculations
+  struct VaultState {
+    TokenisableRange[] ticks;
+    address[] aTokens;
+    uint[] balances;
+    uint reserve0;
+    uint reserve1;
+    uint tvlX8;
+  }
+  
 
   constructor(
     address _treasury, 
@@ -90,6 +175,9 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
     uniswapPool = IUniswapV3Pool(_uniswapPool);
     WETH = IWETH(weth);
     baseTokenIsToken0 = _baseTokenIsToken0;
+    ticksHead = TICKS_ORIGIN;
+    ticksTail = TICKS_ORIGIN;
+    activeTickSlot = TICKS_ORIGIN;
   }
   
   
@@ -115,48 +203,58 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   /// @param tr Tick address
   function pushTick(address tr) public onlyOwner {
     TokenisableRange t = TokenisableRange(tr);
-    (ERC20 t0,) = t.TOKEN0();
-    (ERC20 t1,) = t.TOKEN1();
-    require(t0 == token0 && t1 == token1, "GEV: Invalid TR");
-    if (ticks.length == 0) ticks.push(t);
-    else {
-      // Check that tick is properly ordered
-      if (baseTokenIsToken0) 
-        require( t.lowerTick() > ticks[ticks.length-1].upperTick(), "GEV: Push Tick Overlap");
-      else 
-        require( t.upperTick() < ticks[ticks.length-1].lowerTick(), "GEV: Push Tick Overlap");
-      
-      ticks.push(TokenisableRange(tr));
-    }
-    emit PushTick(tr);
+    checkTickTokens(t);
+    (bool hasPrevious, int24 previousBound) = lastTickBound();
+    appendTick(t, hasPrevious, previousBound);
   }  
 
 
+  /// @notice Add new tickers to the list in a single pass
+  /// @param trs Tick addresses, properly ordered
+  /// @dev Each tick is checked against the bound of the previous one, kept in memory
+  function pushTicks(address[] calldata trs) public onlyOwner {
+    (bool hasPrevious, int24 bound) = lastTickBound();
+    for (uint k = 0; k < trs.length; k++){
+      TokenisableRange t = TokenisableRange(trs[k]);
+      checkTickTokens(t);
+      bound = appendTick(t, hasPrevious, bound);
+      hasPrevious = true;
+    }
+  }
+
+
+  /// @notice Add a slice of a RangeManager tickers to the list
+  /// @param rm RangeManager
+  /// @param start Index of the first ticker imported
+  /// @param end Index after the last ticker imported
+  /// @dev Tickers are created by the RangeManager with its assets, so tokens are checked once
+  function importTicks(RangeManager rm, uint start, uint end) public onlyOwner {
+    require(rm.ASSET_0() == token0 && rm.ASSET_1() == token1, "GEV: Invalid TR");
+    (bool hasPrevious, int24 bound) = lastTickBound();
+    for (uint k = start; k < end; k++){
+      bound = appendTick(rm.tokenisedTicker(k), hasPrevious, bound);
+      hasPrevious = true;
+    }
+  }
+
+
   /// @notice Add a new ticker to the list
   /// @param tr Tick address
   function shiftTick(address tr) public onlyOwner {
     TokenisableRange t = TokenisableRange(tr);
-    (ERC20 t0,) = t.TOKEN0();
-    (ERC20 t1,) = t.TOKEN1();
-    require(t0 == token0 && t1 == token1, "GEV: Invalid TR");
-    if (ticks.length == 0) ticks.push(t);
+    checkTickTokens(t);
+    if (ticksTail == ticksHead) tickSlots[ticksTail++] = t;
     else {
       // Check that tick is properly ordered
       if (!baseTokenIsToken0) 
-        require( t.lowerTick() > ticks[0].upperTick(), "GEV: Shift Tick Overlap");
+        require( t.lowerTick() > tickSlots[ticksHead].upperTick(), "GEV: Shift Tick Overlap");
       else 
-        require( t.upperTick() < ticks[0].lowerTick(), "GEV: Shift Tick Overlap");
+        require( t.upperTick() < tickSlots[ticksHead].lowerTick(), "GEV: Shift Tick Overlap");
       
-      // extend array by pushing last elt
-      ticks.push(ticks[ticks.length-1]);
-      // shift each element
-      if (ticks.length > 2){
-        for (uint k = 0; k < ticks.length - 2; k++) 
-          ticks[ticks.length - 2 - k] = ticks[ticks.length - 3 - k];
-        }
-      // add new tick in first place
-      ticks[0] = t;
+      // add new tick in first place, other ticks keep their slot
+      tickSlots[--ticksHead] = t;
     }
+    setTickBound(t);
     emit ShiftTick(tr);
   }
 
@@ -165,17 +263,38 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   /// @param tr New tick address
   /// @param index Tick to modify
   function modifyTick(address tr, uint index) public onlyOwner {
-    (ERC20 t0,) = TokenisableRange(tr).TOKEN0();
-    (ERC20 t1,) = TokenisableRange(tr).TOKEN1();
-    require(t0 == token0 && t1 == token1, "GEV: Invalid TR");
-    ticks[index] = TokenisableRange(tr);
+    checkTickTokens(TokenisableRange(tr));
+    require(index < getTickLength(), "GEV: Invalid Tick Index");
+    tickSlots[ticksHead + index] = TokenisableRange(tr);
+    setTickBound(TokenisableRange(tr));
     emit ModifyTick(tr, index);
   }
   
   /// @notice Ticks length getter
   /// @return len Ticks length
   function getTickLength() public view returns(uint len){
-    len = ticks.length;
+    len = ticksTail - ticksHead;
+  }
+  
+  /// @notice Tick getter
+  /// @param index Tick index, 0 is the first tick
+  /// @return Tick address
+  function ticks(uint index) public view returns(TokenisableRange){
+    require(index < getTickLength(), "GEV: Invalid Tick Index");
+    return tickSlots[ticksHead + index];
+  }
+  
+  /// @notice Active tick index getter: the active ticks are the 4 ticks starting there
+  /// @return Active tick index
+  function tickIndex() public view returns(uint){
+    return activeTickSlot - ticksHead;
+  }
+  
+  /// @notice Funded ticks getter
+  /// @return funded Addresses of the ticks in which the vault holds aTokens
+  /// @dev A tick replaced with modifyTick stays funded until its assets are unwound by the next rebalance
+  function getFundedTicks() public view returns(address[] memory funded){
+    funded = fundedTicks.values();
   }
   
   /// @notice Set the base fee
@@ -194,6 +313,36 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   }
   
   
+  /// @notice Set the idle buffers, topped up on each rebalance
+  /// @param newIdleBuffer0 Amount of token0 kept idle
+  /// @param newIdleBuffer1 Amount of token1 kept idle
+  function setIdleBuffer(uint newIdleBuffer0, uint newIdleBuffer1) public onlyOwner {
+    idleBuffer0 = newIdleBuffer0;
+    idleBuffer1 = newIdleBuffer1;
+    emit SetIdleBuffer(newIdleBuffer0, newIdleBuffer1);
+  }
+  
+  
+  /// @notice Set the bounds within which latestAnswer serves the share price checkpoint
+  /// @param newMaxAge Max checkpoint age, in blocks, 0 disables the checkpoint
+  /// @param newMaxDeviationX4 Max token price deviation since the checkpoint, in E4
+  function setCheckpointBounds(uint newMaxAge, uint newMaxDeviationX4) public onlyOwner {
+    require(newMaxDeviationX4 < 1e4, "GEV: Invalid Deviation");
+    checkpointMaxAge = newMaxAge;
+    checkpointMaxDeviationX4 = newMaxDeviationX4;
+    emit SetCheckpointBounds(newMaxAge, newMaxDeviationX4);
+  }
+  
+  
+  /// @notice Reload the cached reserve tokens of a tick from the lending pool
+  /// @param tr Tick address
+  /// @dev For ticks listed in the lending pool after being added, or dropped and listed again
+  function syncReserveTokens(address tr) public onlyOwner {
+    ReserveTokens.Tokens memory tokens = ReserveTokens.sync(reserveTokens, lendingPool, tr);
+    emit SyncReserveTokens(tr, tokens.aToken, tokens.debtToken);
+  }
+  
+  
   //////// PUBLIC FUNCTIONS
   
     
@@ -201,7 +350,7 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   /// @dev Provide the list of tickers from 
   function rebalance() public {
     require(poolMatchesOracle(), "GEV: Oracle Error");
-    removeFromAllTicks();
+    removeFromAllTicks(loadTicks());
     if (isEnabled) deployAssets();
   }
   
@@ -211,19 +360,24 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   /// @param token Address of the token redeemed for
   /// @return amount Total token returned
   /// @dev For simplicity+efficieny, withdrawal is like a rebalancing, but a subset of the tokens are sent back to the user before redeploying
+  /// @dev Withdrawals covered by the idle balance are paid directly, without touching the ticks
   function withdraw(uint liquidity, address token) public nonReentrant returns (uint amount) {
     require(poolMatchesOracle(), "GEV: Oracle Error");
     if (liquidity == 0) liquidity = balanceOf(msg.sender);
     require(liquidity <= balanceOf(msg.sender), "GEV: Insufficient Balance");
     require(liquidity > 0, "GEV: Withdraw Zero");
     
-    uint vaultValueX8 = getTVL();
-    uint valueX8 = vaultValueX8 * liquidity / totalSupply();
+    VaultState memory state = getVaultState();
+    uint valueX8 = state.tvlX8 * liquidity / totalSupply();
     amount = valueX8 * 10**ERC20(token).decimals() / oracle.getAssetPrice(token);
-    uint fee = amount * getAdjustedBaseFee(token == address(token1)) / 1e4;
+    uint fee = amount * adjustedBaseFee(state, token == address(token1)) / 1e4;
     
     _burn(msg.sender, liquidity);
-    removeFromAllTicks();
+    bool isIdleWithdrawal = amount <= idleBalance(token);
+    if (!isIdleWithdrawal) {
+      removeFromAllTicks(state);
+      require(idleBalance(token) >= amount, "GEV: Insufficient Liquidity");
+    }
     ERC20(token).safeTransfer(treasury, fee);
     uint bal = amount - fee;
 
@@ -236,7 +390,8 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
     }
     
     // if pool enabled, deploy assets in ticks, otherwise just let assets sit here until totally withdrawn
-    if (isEnabled) deployAssets();
+    if (isEnabled && !isIdleWithdrawal) deployAssets();
+    writeCheckpoint(state.tvlX8 - valueX8, totalSupply());
     emit Withdraw(msg.sender, token, amount, liquidity);
   }
 
@@ -250,45 +405,193 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
     require(poolMatchesOracle(), "GEV: Oracle Error");
     require(token == address(token0) || token == address(token1), "GEV: Invalid Token");
     require(amount > 0 || msg.value > 0, "GEV: Deposit Zero");
+    // Snapshot before pulling the deposit, which would otherwise be valued as idle assets
+    VaultState memory state = getVaultState();
+    amount = pullDeposit(token, amount);
     
-    // Wrap if necessary and deposit here
-    if (msg.value > 0){
-      require(token == address(WETH), "GEV: Invalid Weth");
-      // wraps ETH by sending to the wrapper that sends back WETH
-      WETH.deposit{value: msg.value}();
-      amount = msg.value;
+    uint valueX8 = chargeDepositFee(state, ERC20(token), amount);
+    liquidity = mintAndRebalance(state, valueX8);
+    writeCheckpoint(state.tvlX8 + valueX8, totalSupply());
+    emit Deposit(msg.sender, token, amount, liquidity);
+  }
+
+
+  /// @notice Deposit both tokens in the pool with a single rebalance
+  /// @param amount0 Amount of token0 deposited
+  /// @param amount1 Amount of token1 deposited
+  /// @return liquidity Amount of GEV tokens minted
+  /// @dev Both legs are valued and charged the adjusted fee against the same vault snapshot
+  function depositPair(uint amount0, uint amount1) public nonReentrant returns (uint liquidity) {
+    require(isEnabled, "GEV: Pool Disabled");
+    require(poolMatchesOracle(), "GEV: Oracle Error");
+    require(amount0 > 0 || amount1 > 0, "GEV: Deposit Zero");
+    // Snapshot before pulling the deposit, which would otherwise be valued as idle assets
+    VaultState memory state = getVaultState();
+    if (amount0 > 0) token0.safeTransferFrom(msg.sender, address(this), amount0);
+    if (amount1 > 0) token1.safeTransferFrom(msg.sender, address(this), amount1);
+    
+    uint valueX8 = chargeDepositFee(state, token0, amount0) + chargeDepositFee(state, token1, amount1);
+    liquidity = mintAndRebalance(state, valueX8);
+    writeCheckpoint(state.tvlX8 + valueX8, totalSupply());
+    emit DepositPair(msg.sender, amount0, amount1, liquidity);
+  }
+  
+  
+  //////// BATCHED DEPOSITS AND WITHDRAWALS
+  
+  
+  /// @notice Queue a deposit in the current epoch, convert to WETH if necessary
+  /// @param token Token address
+  /// @param amount Amount of token deposited
+  /// @dev Shares are claimable once the epoch is settled
+  function queueDeposit(address token, uint amount) public payable nonReentrant {
+    require(isEnabled, "GEV: Pool Disabled");
+    require(token == address(token0) || token == address(token1), "GEV: Invalid Token");
+    require(amount > 0 || msg.value > 0, "GEV: Deposit Zero");
+    amount = pullDeposit(token, amount);
+    
+    Order storage order = orders[currentEpoch][msg.sender];
+    Epoch storage epoch = epochs[currentEpoch];
+    if (token == address(token0)){
+      order.deposit0 += amount;
+      epoch.deposit0 += amount;
+      reserved0 += amount;
     }
-    else { 
-      ERC20(token).safeTransferFrom(msg.sender, address(this), amount);
+    else {
+      order.deposit1 += amount;
+      epoch.deposit1 += amount;
+      reserved1 += amount;
     }
+    emit QueueDeposit(msg.sender, currentEpoch, token, amount);
+  }
+  
+  
+  /// @notice Queue a withdrawal in the current epoch
+  /// @param liquidity Amount of GEV tokens to redeem; if 0, redeem all
+  /// @param token Address of the token redeemed for
+  /// @dev GEV tokens are held by the vault until settlement, the tokens are then claimable
+  function queueWithdraw(uint liquidity, address token) public nonReentrant {
+    require(token == address(token0) || token == address(token1), "GEV: Invalid Token");
+    if (liquidity == 0) liquidity = balanceOf(msg.sender);
+    require(liquidity <= balanceOf(msg.sender), "GEV: Insufficient Balance");
+    require(liquidity > 0, "GEV: Withdraw Zero");
+    _transfer(msg.sender, address(this), liquidity);
     
-    // Send deposit fee to treasury
-    uint fee = amount * getAdjustedBaseFee(token == address(token0)) / 1e4;
-    ERC20(token).safeTransfer(treasury, fee);
-    uint valueX8 = oracle.getAssetPrice(token) * (amount - fee) / 10**ERC20(token).decimals();
-    require(tvlCap > valueX8 + getTVL(), "GEV: Max Cap Reached");
-
-    uint vaultValueX8 = getTVL();
+    Order storage order = orders[currentEpoch][msg.sender];
+    Epoch storage epoch = epochs[currentEpoch];
+    if (token == address(token0)){
+      order.withdrawLiquidity0 += liquidity;
+      epoch.withdrawLiquidity0 += liquidity;
+    }
+    else {
+      order.withdrawLiquidity1 += liquidity;
+      epoch.withdrawLiquidity1 += liquidity;
+    }
+    emit QueueWithdraw(msg.sender, currentEpoch, token, liquidity);
+  }
+  
+  
+  /// @notice Cancel the deposits queued in the current epoch and get the tokens back
+  /// @return amount0 Amount of token0 refunded
+  /// @return amount1 Amount of token1 refunded
+  /// @dev Deposited ETH is refunded as WETH
+  function cancelDeposit() public nonReentrant returns (uint amount0, uint amount1) {
+    Order storage order = orders[currentEpoch][msg.sender];
+    Epoch storage epoch = epochs[currentEpoch];
+    (amount0, amount1) = (order.deposit0, order.deposit1);
+    require(amount0 + amount1 > 0, "GEV: No Deposit");
+    (order.deposit0, order.deposit1) = (0, 0);
+    epoch.deposit0 -= amount0;
+    epoch.deposit1 -= amount1;
+    reserved0 -= amount0;
+    reserved1 -= amount1;
+    if (amount0 > 0) token0.safeTransfer(msg.sender, amount0);
+    if (amount1 > 0) token1.safeTransfer(msg.sender, amount1);
+    emit CancelDeposit(msg.sender, currentEpoch, amount0, amount1);
+  }
+  
+  
+  /// @notice Cancel the withdrawals queued in the current epoch and get the GEV tokens back
+  /// @return liquidity Amount of GEV tokens returned
+  function cancelWithdraw() public nonReentrant returns (uint liquidity) {
+    Order storage order = orders[currentEpoch][msg.sender];
+    Epoch storage epoch = epochs[currentEpoch];
+    liquidity = order.withdrawLiquidity0 + order.withdrawLiquidity1;
+    require(liquidity > 0, "GEV: No Withdrawal");
+    epoch.withdrawLiquidity0 -= order.withdrawLiquidity0;
+    epoch.withdrawLiquidity1 -= order.withdrawLiquidity1;
+    (order.withdrawLiquidity0, order.withdrawLiquidity1) = (0, 0);
+    _transfer(address(this), msg.sender, liquidity);
+    emit CancelWithdraw(msg.sender, currentEpoch, liquidity);
+  }
+  
+  
+  /// @notice Settle the current epoch: price all queued orders against one vault snapshot, then rebalance once
+  /// @dev Permissionless. Deposits are refunded if the vault is disabled or if they would exceed the TVL cap
+  /// @dev Orders can be cancelled until then, e.g. while settlement reverts
+  function settle() public nonReentrant {
+    require(poolMatchesOracle(), "GEV: Oracle Error");
+    uint epochId = currentEpoch;
+    Epoch storage epoch = epochs[epochId];
+    // an empty epoch would only force a rebalance
+    require(epoch.deposit0 + epoch.deposit1 + epoch.withdrawLiquidity0 + epoch.withdrawLiquidity1 > 0, "GEV: Empty Epoch");
+    currentEpoch = epochId + 1;
+    
+    VaultState memory state = getVaultState();
     uint tSupply = totalSupply();
-    // initial liquidity at 1e18 token ~ $1
-    if (tSupply == 0 || vaultValueX8 == 0)
-      liquidity = valueX8 * 1e10;
+    (uint fee0, uint fee1, uint depositValueX8) = settleDeposits(epoch, state, tSupply);
+    (uint wFee0, uint wFee1, uint withdrawValueX8) = settleWithdrawals(epoch, state, tSupply);
+    epoch.isSettled = true;
+    
+    removeFromAllTicks(state);
+    if (fee0 + wFee0 > 0) token0.safeTransfer(treasury, fee0 + wFee0);
+    if (fee1 + wFee1 > 0) token1.safeTransfer(treasury, fee1 + wFee1);
+    require(token0.balanceOf(address(this)) >= reserved0 && token1.balanceOf(address(this)) >= reserved1, "GEV: Insufficient Liquidity");
+    if (isEnabled) deployAssets();
+    writeCheckpoint(state.tvlX8 + depositValueX8 - withdrawValueX8, totalSupply());
+    emit Settle(epochId, epoch.mintedLiquidity0 + epoch.mintedLiquidity1, epoch.withdrawLiquidity0 + epoch.withdrawLiquidity1);
+  }
+  
+  
+  /// @notice Claim GEV tokens and redeemed tokens of a settled epoch
+  /// @param epochId Epoch id
+  /// @return liquidity Amount of GEV tokens received
+  /// @return amount0 Amount of token0 received
+  /// @return amount1 Amount of token1 received
+  function claim(uint epochId) public nonReentrant returns (uint liquidity, uint amount0, uint amount1) {
+    Epoch storage epoch = epochs[epochId];
+    require(epoch.isSettled, "GEV: Epoch Not Settled");
+    Order memory order = orders[epochId][msg.sender];
+    delete orders[epochId][msg.sender];
+    
+    if (epoch.isRefunded){
+      amount0 = order.deposit0;
+      amount1 = order.deposit1;
+    }
     else {
-      liquidity = tSupply * valueX8 / vaultValueX8;
+      if (order.deposit0 > 0) liquidity += order.deposit0 * epoch.mintedLiquidity0 / epoch.deposit0;
+      if (order.deposit1 > 0) liquidity += order.deposit1 * epoch.mintedLiquidity1 / epoch.deposit1;
     }
+    if (order.withdrawLiquidity0 > 0) amount0 += order.withdrawLiquidity0 * epoch.withdrawn0 / epoch.withdrawLiquidity0;
+    if (order.withdrawLiquidity1 > 0) amount1 += order.withdrawLiquidity1 * epoch.withdrawn1 / epoch.withdrawLiquidity1;
     
-    rebalance();
-    require(liquidity > 0, "GEV: No Liquidity Added");
-    _mint(msg.sender, liquidity);    
-    emit Deposit(msg.sender, token, amount, liquidity);
+    reserved0 -= amount0;
+    reserved1 -= amount1;
+    if (liquidity > 0) _transfer(address(this), msg.sender, liquidity);
+    if (amount0 > 0) token0.safeTransfer(msg.sender, amount0);
+    if (amount1 > 0) token1.safeTransfer(msg.sender, amount1);
+    emit Claim(msg.sender, epochId, liquidity, amount0, amount1);
   }
   
   
   /// @notice Get value of 1e18 GEV tokens
   /// @return priceX8 price of 1e18 tokens with 8 decimals
+  /// @dev Serves the checkpoint while it is recent enough and the token prices haven't moved, otherwise values all ticks
   function latestAnswer() external view returns (uint256 priceX8) {
     uint supply = totalSupply();
     if (supply == 0) return 0;
+    Checkpoint memory cp = checkpoint;
+    if (isCheckpointFresh(cp)) return cp.sharePriceX8;
     uint vaultValue = getTVL();
     priceX8 = vaultValue * 1e18 / supply;
   }
@@ -296,39 +599,85 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   
   /// @notice Get vault underlying assets
   function getReserves() public view returns (uint amount0, uint amount1){
-    for (uint k = 0; k < ticks.length; k++){
-      TokenisableRange t = ticks[k];
-      address aTick = lendingPool.getReserveData(address(t)).aTokenAddress;
-      uint bal = ERC20(aTick).balanceOf(address(this));
-      (uint amt0, uint amt1) = t.getTokenAmounts(bal);
-      amount0 += amt0;
-      amount1 += amt1;
-    }
+    VaultState memory state = getVaultState();
+    (amount0, amount1) = (state.reserve0, state.reserve1);
   }
 
 
   //////// INTERNAL FUNCTIONS
   
+  /// @notice Load each funded tick aToken address and vault balance
+  /// @return state Vault state with ticks balances, without reserves and values
+  /// @dev Cost scales with the number of funded ticks, not with the ladder length
+  function loadTicks() internal view returns (VaultState memory state) {
+    uint len = fundedTicks.length();
+    state.ticks = new TokenisableRange[](len);
+    state.aTokens = new address[](len);
+    state.balances = new uint[](len);
+    for (uint k = 0; k < len; k++){
+      TokenisableRange t = TokenisableRange(fundedTicks.at(k));
+      address aTick = ReserveTokens.get(reserveTokens, lendingPool, address(t)).aToken;
+      state.ticks[k] = t;
+      state.aTokens[k] = aTick;
+      state.balances[k] = ERC20(aTick).balanceOf(address(this));
+    }
+  }
+  
+  
+  /// @notice Snapshot ticks balances, underlying reserves and TVL in a single pass
+  /// @return state Vault state
+  /// @dev Empty ticks are skipped as they add nothing to reserves or TVL
+  function getVaultState() internal view returns (VaultState memory state) {
+    state = loadTicks();
+    for (uint k = 0; k < state.ticks.length; k++){
+      uint bal = state.balances[k];
+      if (bal == 0) continue;
+      TokenisableRange t = state.ticks[k];
+      (uint amt0, uint amt1) = t.getTokenAmounts(bal);
+      state.reserve0 += amt0;
+      state.reserve1 += amt1;
+      state.tvlX8 += bal * t.latestAnswer() / 1e18;
+    }
+    // Idle assets are part of the vault
+    uint idle0 = idleBalance(address(token0));
+    uint idle1 = idleBalance(address(token1));
+    state.reserve0 += idle0;
+    state.reserve1 += idle1;
+    if (idle0 > 0) state.tvlX8 += idle0 * oracle.getAssetPrice(address(token0)) / 10**token0.decimals();
+    if (idle1 > 0) state.tvlX8 += idle1 * oracle.getAssetPrice(address(token1)) / 10**token1.decimals();
+  }
+  
+  
   /// @notice Remove assets from all the underlying ticks
-  function removeFromAllTicks() internal {
-    for (uint k = 0; k < ticks.length; k++){
-      removeFromTick(k);
+  /// @param state Vault state snapshot, taken before any tick balance change
+  function removeFromAllTicks(VaultState memory state) internal {
+    for (uint k = 0; k < state.ticks.length; k++){
+      removeFromTick(state.ticks[k], state.aTokens[k], state.balances[k]);
     }    
   }
   
   
   /// @notice Remove from tick
-  function removeFromTick(uint index) internal {
-    TokenisableRange tr = ticks[index];
-    address aTokenAddress = lendingPool.getReserveData(address(tr)).aTokenAddress;
-    uint aBal = ERC20(aTokenAddress).balanceOf(address(this));
+  /// @param tr Tick address
+  /// @param aTokenAddress Lending pool aToken of the tick
+  /// @param aBal Vault aToken balance
+  function removeFromTick(TokenisableRange tr, address aTokenAddress, uint aBal) internal {
     uint sBal = tr.balanceOf(aTokenAddress);
 
     // if there are less tokens available than the balance (because of outstanding debt), withdraw what's available
-    if (aBal > sBal) aBal = sBal;
-    if (aBal > 0){
-      lendingPool.withdraw(address(tr), aBal, address(this));
-      tr.withdraw(aBal, 0, 0);
+    // and keep the tick funded, otherwise withdraw all so that no aToken dust is left behind
+    if (aBal > sBal) {
+      if (sBal > 0){
+        lendingPool.withdraw(address(tr), sBal, address(this));
+        tr.withdraw(sBal, 0, 0);
+      }
+    }
+    else {
+      fundedTicks.remove(address(tr));
+      if (aBal > 0){
+        aBal = lendingPool.withdraw(address(tr), type(uint256).max, address(this));
+        tr.withdraw(aBal, 0, 0);
+      }
     }
   }
   
@@ -336,11 +685,14 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   /// @notice 
   function deployAssets() internal { 
     uint newTickIndex = getActiveTickIndex();
-    uint availToken0 = token0.balanceOf(address(this));
-    uint availToken1 = token1.balanceOf(address(this));
+    uint availToken0 = idleBalance(address(token0));
+    uint availToken1 = idleBalance(address(token1));
+    // Top up the idle buffers before deploying the rest
+    availToken0 = availToken0 > idleBuffer0 ? availToken0 - idleBuffer0 : 0;
+    availToken1 = availToken1 > idleBuffer1 ? availToken1 - idleBuffer1 : 0;
     
     // Check which is the main token
-    (uint amount0ft, uint amount1ft) = ticks[newTickIndex].getTokenAmountsExcludingFees(1e18);
+    (uint amount0ft, uint amount1ft) = ticks(newTickIndex).getTokenAmountsExcludingFees(1e18);
     uint tick0Index = newTickIndex;
     uint tick1Index = newTickIndex + 2;
     if (amount1ft > 0){
@@ -350,16 +702,169 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
     
     // Deposit into the ticks + into the LP
     if (availToken0 > 0){
-      depositAndStash(ticks[tick0Index], availToken0 / 2, 0);
-      depositAndStash(ticks[tick0Index+1], availToken0 / 2, 0);
+      depositAndStash(ticks(tick0Index), availToken0 / 2, 0);
+      depositAndStash(ticks(tick0Index+1), availToken0 / 2, 0);
     }
     if (availToken1 > 0){
-      depositAndStash(ticks[tick1Index], 0, availToken1 / 2);
-      depositAndStash(ticks[tick1Index+1], 0, availToken1 / 2);
+      depositAndStash(ticks(tick1Index), 0, availToken1 / 2);
+      depositAndStash(ticks(tick1Index+1), 0, availToken1 / 2);
+    }
+    
+    if (newTickIndex + ticksHead != activeTickSlot) activeTickSlot = newTickIndex + ticksHead;
+    emit Rebalance(newTickIndex);
+  }
+  
+  
+  /// @notice Checkpoint the share price after a deposit or withdrawal
+  /// @param tvlX8 Vault value after the operation: value before it plus value deposited or minus value withdrawn
+  /// @param supply GEV supply after the operation
+  /// @dev Skipped when the checkpoint max age is 0, as a checkpoint is then never served
+  function writeCheckpoint(uint tvlX8, uint supply) internal {
+    if (checkpointMaxAge == 0) return;
+    if (supply == 0 || tvlX8 == 0) {
+      delete checkpoint;
+      return;
+    }
+    checkpoint = Checkpoint(
+      uint128(tvlX8 * 1e18 / supply), 
+      uint64(block.number), 
+      uint128(oracle.getAssetPrice(address(token0))), 
+      uint128(oracle.getAssetPrice(address(token1)))
+    );
+  }
+  
+  
+  /// @notice Whether a checkpoint can be served as the share price
+  /// @param cp Checkpoint
+  function isCheckpointFresh(Checkpoint memory cp) internal view returns (bool) {
+    if (checkpointMaxAge == 0 || cp.blockNumber == 0 || block.number > cp.blockNumber + checkpointMaxAge) return false;
+    return isWithinDeviation(oracle.getAssetPrice(address(token0)), cp.price0) 
+      && isWithinDeviation(oracle.getAssetPrice(address(token1)), cp.price1);
+  }
+  
+  
+  /// @notice Whether a price is within the checkpoint max deviation of a reference price
+  function isWithinDeviation(uint price, uint refPrice) internal view returns (bool) {
+    uint delta = price > refPrice ? price - refPrice : refPrice - price;
+    return delta * 1e4 <= refPrice * checkpointMaxDeviationX4;
+  }
+  
+  
+  /// @notice Send the deposit fee to treasury
+  /// @param state Vault state before the deposit
+  /// @param token Token deposited
+  /// @param amount Amount of token deposited
+  /// @return valueX8 Value of the deposit after fee
+  function chargeDepositFee(VaultState memory state, ERC20 token, uint amount) internal returns (uint valueX8) {
+    if (amount == 0) return 0;
+    uint fee = amount * adjustedBaseFee(state, token == token0) / 1e4;
+    token.safeTransfer(treasury, fee);
+    valueX8 = oracle.getAssetPrice(address(token)) * (amount - fee) / 10**token.decimals();
+  }
+  
+  
+  /// @notice Mint GEV tokens for a deposit and rebalance the vault
+  /// @param state Vault state before the deposit
+  /// @param valueX8 Value of the deposit after fees
+  /// @return liquidity Amount of GEV tokens minted
+  function mintAndRebalance(VaultState memory state, uint valueX8) internal returns (uint liquidity) {
+    require(tvlCap > valueX8 + state.tvlX8, "GEV: Max Cap Reached");
+
+    uint tSupply = totalSupply();
+    // initial liquidity at 1e18 token ~ $1
+    if (tSupply == 0 || state.tvlX8 == 0)
+      liquidity = valueX8 * 1e10;
+    else {
+      liquidity = tSupply * valueX8 / state.tvlX8;
+    }
+    
+    // Pool already checked against oracle and enabled, rebalance from the snapshot
+    removeFromAllTicks(state);
+    deployAssets();
+    require(liquidity > 0, "GEV: No Liquidity Added");
+    _mint(msg.sender, liquidity);    
+  }
+  
+  
+  /// @notice Pull deposited tokens, wrapping ETH if necessary
+  /// @param token Token address
+  /// @param amount Amount of token deposited, ignored if ETH is sent
+  /// @return received Amount of token received
+  function pullDeposit(address token, uint amount) internal returns (uint received) {
+    if (msg.value > 0){
+      require(token == address(WETH), "GEV: Invalid Weth");
+      // wraps ETH by sending to the wrapper that sends back WETH
+      WETH.deposit{value: msg.value}();
+      received = msg.value;
+    }
+    else { 
+      ERC20(token).safeTransferFrom(msg.sender, address(this), amount);
+      received = amount;
     }
+  }
+  
+  
+  /// @notice Mint GEV tokens for the deposits of an epoch
+  /// @param epoch Epoch settled
+  /// @param state Vault state before settlement
+  /// @param tSupply GEV supply before settlement
+  /// @return fee0 Token0 deposit fee
+  /// @return fee1 Token1 deposit fee
+  /// @return valueX8 Value of the deposits after fees, 0 if refunded
+  function settleDeposits(Epoch storage epoch, VaultState memory state, uint tSupply) internal returns (uint fee0, uint fee1, uint valueX8) {
+    if (epoch.deposit0 + epoch.deposit1 == 0) return (0, 0, 0);
+    fee0 = epoch.deposit0 * adjustedBaseFee(state, true) / 1e4;
+    fee1 = epoch.deposit1 * adjustedBaseFee(state, false) / 1e4;
+    uint value0 = oracle.getAssetPrice(address(token0)) * (epoch.deposit0 - fee0) / 10**token0.decimals();
+    uint value1 = oracle.getAssetPrice(address(token1)) * (epoch.deposit1 - fee1) / 10**token1.decimals();
     
-    if (newTickIndex != tickIndex) tickIndex = newTickIndex;
-    emit Rebalance(tickIndex);
+    // Deposits stay reserved and can be claimed back
+    if (!isEnabled || tvlCap <= value0 + value1 + state.tvlX8){
+      epoch.isRefunded = true;
+      return (0, 0, 0);
+    }
+    valueX8 = value0 + value1;
+    reserved0 -= epoch.deposit0;
+    reserved1 -= epoch.deposit1;
+    // initial liquidity at 1e18 token ~ $1
+    if (tSupply == 0 || state.tvlX8 == 0){
+      epoch.mintedLiquidity0 = value0 * 1e10;
+      epoch.mintedLiquidity1 = value1 * 1e10;
+    }
+    else {
+      epoch.mintedLiquidity0 = tSupply * value0 / state.tvlX8;
+      epoch.mintedLiquidity1 = tSupply * value1 / state.tvlX8;
+    }
+    _mint(address(this), epoch.mintedLiquidity0 + epoch.mintedLiquidity1);
+  }
+  
+  
+  /// @notice Burn GEV tokens queued for withdrawal in an epoch and reserve the tokens redeemed
+  /// @param epoch Epoch settled
+  /// @param state Vault state before settlement
+  /// @param tSupply GEV supply before settlement
+  /// @return fee0 Token0 withdrawal fee
+  /// @return fee1 Token1 withdrawal fee
+  /// @return valueX8 Value redeemed, fees included
+  function settleWithdrawals(Epoch storage epoch, VaultState memory state, uint tSupply) internal returns (uint fee0, uint fee1, uint valueX8) {
+    if (epoch.withdrawLiquidity0 + epoch.withdrawLiquidity1 == 0) return (0, 0, 0);
+    valueX8 = state.tvlX8 * (epoch.withdrawLiquidity0 + epoch.withdrawLiquidity1) / tSupply;
+    uint amount0 = state.tvlX8 * epoch.withdrawLiquidity0 / tSupply * 10**token0.decimals() / oracle.getAssetPrice(address(token0));
+    uint amount1 = state.tvlX8 * epoch.withdrawLiquidity1 / tSupply * 10**token1.decimals() / oracle.getAssetPrice(address(token1));
+    fee0 = amount0 * adjustedBaseFee(state, false) / 1e4;
+    fee1 = amount1 * adjustedBaseFee(state, true) / 1e4;
+    epoch.withdrawn0 = amount0 - fee0;
+    epoch.withdrawn1 = amount1 - fee1;
+    reserved0 += epoch.withdrawn0;
+    reserved1 += epoch.withdrawn1;
+    _burn(address(this), epoch.withdrawLiquidity0 + epoch.withdrawLiquidity1);
+  }
+  
+  
+  /// @notice Amount of a token held by the vault outside of the ticks and not reserved for batched orders
+  /// @param token Token address
+  function idleBalance(address token) internal view returns (uint amount) {
+    amount = ERC20(token).balanceOf(address(this)) - (token == address(token0) ? reserved0 : reserved1);
   }
   
   
@@ -367,50 +872,39 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   function poolMatchesOracle() public view returns (bool matches){
     (uint160 sqrtPriceX96,,,,,,) = uniswapPool.slot0();
     
-    uint decimals0 = token0.decimals();
-    uint decimals1 = token1.decimals();
-    uint priceX8 = 10**decimals0;
-    // Overflow if dont scale down the sqrtPrice before div 2*192
-    priceX8 = priceX8 * uint(sqrtPriceX96 / 2 ** 12) ** 2 * 1e8 / 2**168;
-    priceX8 = priceX8 / 10**decimals1;
+    uint priceX8 = Sqrt.priceX8FromSqrtPriceX96(sqrtPriceX96, token0.decimals(), token1.decimals());
     uint oraclePrice = 1e8 * oracle.getAssetPrice(address(token0)) / oracle.getAssetPrice(address(token1));
     if (oraclePrice < priceX8 * 101 / 100 && oraclePrice > priceX8 * 99 / 100) matches = true;
   }
 
 
-  /// @notice Helper that checks current allowance and approves if necessary
-  /// @param token Target token
-  /// @param spender Spender
-  /// @param amount Amount below which we need to approve the token spending
-  function checkSetApprove(address token, address spender, uint amount) private {
-    if ( ERC20(token).allowance(address(this), spender) < amount ) ERC20(token).safeIncreaseAllowance(spender, type(uint256).max);
-  }
-  
-  
   /// @notice Calculate the vault total ticks value
   /// @return valueX8 Total value of the vault with 8 decimals
   function getTVL() public view returns (uint valueX8){
-    for(uint k=0; k<ticks.length; k++){
-      TokenisableRange t = ticks[k];
-      uint bal = getTickBalance(k);
-      valueX8 += bal * t.latestAnswer() / 1e18;
-    }
+    valueX8 = getVaultState().tvlX8;
   }
   
   
   /// @notice Deposit assets in a ticker, and the ticker in lending pool
-  /// @param t Tik address
-  /// @return liquidity The amount of ticker liquidity added
-  function depositAndStash(TokenisableRange t, uint amount0, uint amount1) internal returns (uint liquidity){
-    checkSetApprove(address(token0), address(t), amount0);
-    checkSetApprove(address(token1), address(t), amount1);
-    liquidity = t.deposit(amount0, amount1);
-    
-    uint bal = t.balanceOf(address(this));
-    if (bal > 0){
-      checkSetApprove(address(t), address(lendingPool), bal);
-      lendingPool.deposit(address(t), bal, address(this), 0);
-    }
+  /// @param t Tick address
+  /// @param amount0 Amount of token0 deposited
+  /// @param amount1 Amount of token1 deposited
+  /// @dev Only the token deposited is approved, once for the max amount, and the minted amount is stashed without reading the balance
+  function depositAndStash(TokenisableRange t, uint amount0, uint amount1) internal {
+    if (amount0 > 0) Approvals.approveOnce(approved, address(token0), address(t));
+    if (amount1 > 0) Approvals.approveOnce(approved, address(token1), address(t));
+    uint liquidity = t.deposit(amount0, amount1);
+    if (liquidity > 0) stash(t, liquidity);
+  }
+  
+  
+  /// @notice Deposit a ticker in lending pool
+  /// @param t Tick address
+  /// @param amount Amount of ticker deposited
+  function stash(TokenisableRange t, uint amount) internal {
+    Approvals.approveOnce(approved, address(t), address(lendingPool));
+    lendingPool.deposit(address(t), amount, address(this), 0);
+    fundedTicks.add(address(t));
   }
   
   
@@ -418,23 +912,88 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   /// @param index Tick index
   /// @return liquidity Amount of Ticker
   function getTickBalance(uint index) public view returns (uint liquidity) {
-    TokenisableRange t = ticks[index];
-    address aTokenAddress = lendingPool.getReserveData(address(t)).aTokenAddress;
+    TokenisableRange t = ticks(index);
+    address aTokenAddress = ReserveTokens.get(reserveTokens, lendingPool, address(t)).aToken;
     liquidity = ERC20(aTokenAddress).balanceOf(address(this));
   }
   
   
   /// @notice Return first valid tick
+  /// @dev Ticks are ordered so that holding the base token is monotonic along the list: binary search the first tick 
+  /// @dev that holds some base token at the pool price, the active ticks start 2 ticks below
   function getActiveTickIndex() public view returns (uint activeTickIndex) {
-    if (ticks.length >= 5){
-      // looking for index at which the underlying asset differs from the next tick
-      for (activeTickIndex = 0; activeTickIndex < ticks.length - 3; activeTickIndex++){
-        (uint amt0, uint amt1) = ticks[activeTickIndex+1].getTokenAmountsExcludingFees(1e18);
-        (uint amt0n, uint amt1n) = ticks[activeTickIndex+2].getTokenAmountsExcludingFees(1e18);
-        if ( (amt0 == 0 && amt0n > 0) || (amt1 == 0 && amt1n > 0) )
-          break;
+    uint len = getTickLength();
+    if (len >= 5){
+      (uint160 sqrtPriceX96,,,,,,) = uniswapPool.slot0();
+      uint head = ticksHead;
+      uint low = 0;
+      uint high = len;
+      while (low < high) {
+        uint mid = (low + high) / 2;
+        if (holdsBaseToken(tickBoundsX96[address(tickSlots[head + mid])], sqrtPriceX96)) high = mid;
+        else low = mid + 1;
       }
+      // if no tick switches underlying asset, default to the last possible index
+      activeTickIndex = (low >= 2 && low < len) ? low - 2 : len - 3;
+    }
+  }
+  
+  
+  /// @notice Whether a tick holds some base token at a given price
+  /// @param boundX96 Tick sqrt price bound, lower bound if the base token is token1, else upper bound
+  /// @param sqrtPriceX96 Pool sqrt price
+  function holdsBaseToken(uint160 boundX96, uint160 sqrtPriceX96) internal view returns (bool) {
+    return baseTokenIsToken0 ? sqrtPriceX96 < boundX96 : sqrtPriceX96 > boundX96;
+  }
+  
+  
+  /// @notice Check that a tick has the vault underlying tokens
+  /// @param t Tick address
+  function checkTickTokens(TokenisableRange t) internal view {
+    (ERC20 t0,) = t.TOKEN0();
+    (ERC20 t1,) = t.TOKEN1();
+    require(t0 == token0 && t1 == token1, "GEV: Invalid TR");
+  }
+  
+  
+  /// @notice Bound of the last tick, used to check the ordering of the next tick pushed
+  /// @return hasPrevious Whether there is a last tick
+  /// @return bound Last tick upper tick if the base token is token0, else its lower tick
+  function lastTickBound() internal view returns (bool hasPrevious, int24 bound) {
+    if (ticksTail == ticksHead) return (false, 0);
+    TokenisableRange t = tickSlots[ticksTail - 1];
+    return (true, baseTokenIsToken0 ? t.upperTick() : t.lowerTick());
+  }
+  
+  
+  /// @notice Append a tick, checking that it is properly ordered after the previous tick
+  /// @param t Tick address
+  /// @param hasPrevious Whether there is a previous tick
+  /// @param previousBound Previous tick upper tick if the base token is token0, else its lower tick
+  /// @return bound Tick upper tick if the base token is token0, else its lower tick
+  function appendTick(TokenisableRange t, bool hasPrevious, int24 previousBound) internal returns (int24 bound) {
+    int24 lower = t.lowerTick();
+    int24 upper = t.upperTick();
+    // Check that tick is properly ordered
+    if (hasPrevious){
+      if (baseTokenIsToken0) 
+        require(lower > previousBound, "GEV: Push Tick Overlap");
+      else 
+        require(upper < previousBound, "GEV: Push Tick Overlap");
     }
+    bound = baseTokenIsToken0 ? upper : lower;
+    tickSlots[ticksTail++] = t;
+    tickBoundsX96[address(t)] = TickMath.getSqrtRatioAtTick(bound);
+    ReserveTokens.getOrCache(reserveTokens, lendingPool, address(t));
+    emit PushTick(address(t));
+  }
+  
+  
+  /// @notice Store the tick sqrt price bound used by getActiveTickIndex and cache its reserve tokens
+  /// @param t Tick address
+  function setTickBound(TokenisableRange t) internal {
+    tickBoundsX96[address(t)] = TickMath.getSqrtRatioAtTick(baseTokenIsToken0 ? t.upperTick() : t.lowerTick());
+    ReserveTokens.getOrCache(reserveTokens, lendingPool, address(t));
   }
 
 
@@ -443,9 +1002,16 @@ contract GeVault is ERC20, Ownable, ReentrancyGuard {
   /// @dev Simple linear model: from baseFeeX4 / 2 to baseFeeX4 * 2
   /// @dev Call before withdrawing from ticks or reserves will both be 0
   function getAdjustedBaseFee(bool increaseToken0) public view returns (uint adjustedBaseFeeX4) {
-    (uint res0, uint res1) = getReserves();
-    uint value0 = res0 * oracle.getAssetPrice(address(token0)) / 10**token0.decimals();
-    uint value1 = res1 * oracle.getAssetPrice(address(token1)) / 10**token1.decimals();
+    adjustedBaseFeeX4 = adjustedBaseFee(getVaultState(), increaseToken0);
+  }
+  
+  
+  /// @notice Get deposit fee from a vault state snapshot
+  /// @param state Vault state
+  /// @param increaseToken0 Whether (token0 added || token1 removed) or not
+  function adjustedBaseFee(VaultState memory state, bool increaseToken0) internal view returns (uint adjustedBaseFeeX4) {
+    uint value0 = state.reserve0 * oracle.getAssetPrice(address(token0)) / 10**token0.decimals();
+    uint value1 = state.reserve1 * oracle.getAssetPrice(address(token1)) / 10**token1.decimals();
 
     if (increaseToken0)
       adjustedBaseFeeX4 = baseFeeX4 * value0 / (value1 + 1);
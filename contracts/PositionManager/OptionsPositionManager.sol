@@ -49,10 +49,16 @@ contract OptionsPositionManager is PositionManager {
       executeBuyOptions(poolId, assets, amounts, user, sourceSwap);
     }
     // Liquidate
-    else {
+    else if ( mode == 1 ){
       (, uint poolId, address user, address collateral) = abi.decode(params, (uint8, uint, address, address));
       executeLiquidation(poolId, assets, amounts, user, collateral);
     }
+    // Liquidate several users
+    else {
+      (, uint poolId, address[] memory users, address[] memory options, uint[] memory legAmounts, address collateral) 
+        = abi.decode(params, (uint8, uint, address[], address[], uint[], address));
+      executeLiquidations(poolId, assets, amounts, users, options, legAmounts, collateral);
+    }
     result = true;
   }
   
@@ -65,17 +71,17 @@ contract OptionsPositionManager is PositionManager {
     address user,
     address[] memory sourceSwap
   ) internal {
-    (ILendingPool lendingPool,,, address token0, address token1 ) = getPoolAddresses(poolId);
-    require( address(lendingPool) == msg.sender, "OPM: Call Unallowed");
+    PoolContext memory ctx = getPoolContext(poolId);
+    require( address(ctx.lp) == msg.sender, "OPM: Call Unallowed");
     
     for ( uint8 k = 0; k<assets.length; k++){
       address asset = assets[k];
       uint amount = amounts[k];
-      withdrawOptionAssets(poolId, asset, amount, sourceSwap[k], user);
+      withdrawOptionAssets(ctx, asset, amount, sourceSwap[k], user);
     }
     // send all tokens to lendingPool
-    cleanup(lendingPool, user, token0);
-    cleanup(lendingPool, user, token1);
+    cleanup(ctx.lp, user, ctx.token0);
+    cleanup(ctx.lp, user, ctx.token1);
   }
   
   
@@ -87,9 +93,9 @@ contract OptionsPositionManager is PositionManager {
     address user,
     address collateral
   ) internal {
-    (ILendingPool lendingPool,,, address token0, address token1) = getPoolAddresses(poolId);
-    require( address(lendingPool) == msg.sender, "OPM: Call Unallowed");
-    uint[2] memory amts = [ERC20(token0).balanceOf(address(this)), ERC20(token1).balanceOf(address(this))];
+    PoolContext memory ctx = getPoolContext(poolId);
+    require( address(ctx.lp) == msg.sender, "OPM: Call Unallowed");
+    uint[2] memory amts = [ERC20(ctx.token0).balanceOf(address(this)), ERC20(ctx.token1).balanceOf(address(this))];
     for ( uint8 k =0; k<assets.length; k++){
       address debtAsset = assets[k];
       
@@ -97,12 +103,12 @@ contract OptionsPositionManager is PositionManager {
       uint amount = amounts[k];
       
       // liquidate and send assets here
-      checkSetAllowance(debtAsset, address(lendingPool), amount);
-      lendingPool.liquidationCall(collateral, debtAsset, user, amount, false);
+      checkSetAllowance(debtAsset, address(ctx.lp), amount);
+      ctx.lp.liquidationCall(collateral, debtAsset, user, amount, false);
       // repay tokens
-      uint debt = closeDebt(poolId, address(this), debtAsset, amount, collateral);
-      uint amt0 = ERC20(token0).balanceOf(address(this));
-      uint amt1 = ERC20(token1).balanceOf(address(this));
+      uint debt = closeDebt(ctx, address(this), debtAsset, amount, collateral);
+      uint amt0 = ERC20(ctx.token0).balanceOf(address(this));
+      uint amt1 = ERC20(ctx.token1).balanceOf(address(this));
       emit LiquidatePosition(user, debtAsset, debt, amt0 - amts[0], amt1 - amts[1]);
       amts[0] = amt0;
       amts[1] = amt1;
@@ -111,17 +117,48 @@ contract OptionsPositionManager is PositionManager {
   }
 
 
+  /// @notice Execute operation liquidation of several users
+  /// @param users Owners of the loans, one per liquidation
+  /// @param options Borrowed Ticker asset repaid, one per liquidation
+  /// @param legAmounts Borrowed Ticker amount repaid, one per liquidation
+  /// @dev Flashloaned assets are the distinct options with summed amounts, so each TR is recreated only once
+  function executeLiquidations(
+    uint poolId,
+    address[] calldata assets,
+    uint256[] calldata amounts,
+    address[] memory users,
+    address[] memory options,
+    uint[] memory legAmounts,
+    address collateral
+  ) internal {
+    PoolContext memory ctx = getPoolContext(poolId);
+    require( address(ctx.lp) == msg.sender, "OPM: Call Unallowed");
+    require(collateral == ctx.token0 || collateral == ctx.token1, "OPM: Invalid Collateral Asset");
+    uint[2] memory amts = [ERC20(ctx.token0).balanceOf(address(this)), ERC20(ctx.token1).balanceOf(address(this))];
+    for ( uint k = 0; k < users.length; k++){
+      checkSetAllowance(options[k], address(ctx.lp), legAmounts[k]);
+      ctx.lp.liquidationCall(collateral, options[k], users[k], legAmounts[k], false);
+      uint amt0 = ERC20(ctx.token0).balanceOf(address(this));
+      uint amt1 = ERC20(ctx.token1).balanceOf(address(this));
+      emit LiquidatePosition(users[k], options[k], legAmounts[k], amt0 - amts[0], amt1 - amts[1]);
+      amts[0] = amt0;
+      amts[1] = amt1;
+    }
+    recreateDebts(ctx, assets, amounts);
+  }
+
+
   ////////////////////// BUY OPTIONS
   
   /// @notice Withdraw underlying option assets and swap if necessary
-  /// @param poolId ID of the ROE lending pool
+  /// @param ctx ROE pool addresses
   /// @param flashAsset Option asset to borrow
   /// @param flashAmount Amount to borrow
   /// @param sourceSwap Asset to swap (put-call parity)
   /// @param user Address of option buyer
   /// @dev Only withdraws the tokens and swap, doesnt deposit, as this is done afterwards to avoid doing multiple times
   function withdrawOptionAssets(
-    uint poolId,
+    PoolContext memory ctx,
     address flashAsset,
     uint256 flashAmount,
     address sourceSwap,
@@ -129,21 +166,20 @@ contract OptionsPositionManager is PositionManager {
   ) 
     private returns (bool result)
   {
-    (, IPriceOracle oracle, IUniswapV2Router01 router, address token0, address token1) = getPoolAddresses(poolId);
-    sanityCheckUnderlying(flashAsset, token0, token1);
+    sanityCheckUnderlying(flashAsset, ctx.token0, ctx.token1);
     // Remove Liquidity and get underlying tokens
     (uint256 amount0, uint256 amount1) = TokenisableRange(flashAsset).withdraw(flashAmount, 0, 0);
     if (sourceSwap != address(0) ){
-      require(sourceSwap == token0 || sourceSwap == token1, "OPM: Invalid Swap Token");
+      require(sourceSwap == ctx.token0 || sourceSwap == ctx.token1, "OPM: Invalid Swap Token");
       address[] memory path = new address[](2);
       path[0] = sourceSwap ;
-      path[1] = sourceSwap == token0 ? token1 : token0;
-      uint amount = sourceSwap == token0 ? amount0 : amount1;
+      path[1] = sourceSwap == ctx.token0 ? ctx.token1 : ctx.token0;
+      uint amount = sourceSwap == ctx.token0 ? amount0 : amount1;
 
-      uint received = swapExactTokensForTokens(router, oracle, amount, path);
+      uint received = swapExactTokensForTokens(ctx, amount, path);
       // if swap underlying, then sourceSwap amount is 0 and the other amount is amount withdrawn + amount received from swap
-      amount0 = sourceSwap == token0 ? 0 : amount0 + received;
-      amount1 = sourceSwap == token1 ? 0 : amount1 + received;
+      amount0 = sourceSwap == ctx.token0 ? 0 : amount0 + received;
+      amount1 = sourceSwap == ctx.token1 ? 0 : amount1 + received;
     }
     emit BuyOptions(user, flashAsset, flashAmount, amount0, amount1);
     result = true;
@@ -166,7 +202,7 @@ contract OptionsPositionManager is PositionManager {
   {
     require(options.length == amounts.length && sourceSwap.length == options.length, "OPM: Array Length Mismatch");
     bytes memory params = abi.encode(0, poolId, msg.sender, sourceSwap);
-    (ILendingPool LP,,,, ) = getPoolAddresses(poolId);
+    ILendingPool LP = getPoolContext(poolId).lp;
 
     uint[] memory flashtype = new uint[](options.length);
     for (uint8 i = 0; i< options.length; ){
@@ -197,18 +233,48 @@ contract OptionsPositionManager is PositionManager {
   {
     require(options.length == amounts.length, "ARRAY_LEN_MISMATCH");
     bytes memory params = abi.encode(1, poolId, user, collateralAsset); // mode = 1 -> liquidation
-    (ILendingPool LP,,, address token0, address token1) = getPoolAddresses(poolId);
+    PoolContext memory ctx = getPoolContext(poolId);
     
     uint[] memory flashtype = new uint[](options.length);
     for (uint8 i = 0; i< options.length; ){
       flashtype[i] = 0; // dont open debt for liquidations, need to repay
       unchecked { i+=1; }
     }
-    LP.flashLoan( address(this), options, amounts, flashtype, msg.sender, params, 0);
+    ctx.lp.flashLoan( address(this), options, amounts, flashtype, msg.sender, params, 0);
 
     // send all tokens to liquidator
-    cleanup(LP, msg.sender, token0);
-    cleanup(LP, msg.sender, token1);
+    cleanup(ctx.lp, msg.sender, ctx.token0);
+    cleanup(ctx.lp, msg.sender, ctx.token1);
+  }
+
+
+  /// @notice Liquidate several unhealthy positions in a single flashloan
+  /// @param poolId ID of the ROE lending pool
+  /// @param users Owners of the loans to liquidate, one per liquidation
+  /// @param options Borrowed Ticker asset to repay, one per liquidation
+  /// @param amounts Borrowed Ticker amount to repay, one per liquidation
+  /// @param collateralAsset Asset used for liquidation fee
+  /// @dev Same options are flashloaned once with the summed amounts, then recreated with a single swap for all liquidations
+  function liquidateMany (
+    uint poolId, 
+    address[] memory users,
+    address[] memory options, 
+    uint[] memory amounts,
+    address collateralAsset
+  )
+    external
+  {
+    require(users.length == options.length && options.length == amounts.length, "ARRAY_LEN_MISMATCH");
+    bytes memory params = abi.encode(2, poolId, users, options, amounts, collateralAsset); // mode = 2 -> batch liquidation
+    PoolContext memory ctx = getPoolContext(poolId);
+    
+    (address[] memory flashAssets, uint[] memory flashAmounts) = sumByAsset(options, amounts);
+    uint[] memory flashtype = new uint[](flashAssets.length); // dont open debt for liquidations, need to repay
+    ctx.lp.flashLoan( address(this), flashAssets, flashAmounts, flashtype, msg.sender, params, 0);
+
+    // send all tokens to liquidator
+    cleanup(ctx.lp, msg.sender, ctx.token0);
+    cleanup(ctx.lp, msg.sender, ctx.token1);
   }
 
 
@@ -229,26 +295,82 @@ contract OptionsPositionManager is PositionManager {
   ) 
     external
   {
-    (ILendingPool LP,,, address token0, address token1) = getPoolAddresses(poolId);
-    uint debt = ERC20(LP.getReserveData(debtAsset).variableDebtTokenAddress).balanceOf(user);
+    PoolContext memory ctx = getPoolContext(poolId);
+    uint debt = ERC20(getReserveTokens(ctx.lp, debtAsset).debtToken).balanceOf(user);
     if ( repayAmount > 0 && repayAmount < debt ) debt = repayAmount;
     require(debt > 0, "OPM: No Debt");
-    debt = closeDebt(poolId, user, debtAsset, debt, collateralAsset);
+    debt = closeDebt(ctx, user, debtAsset, debt, collateralAsset);
 
-    cleanup(LP, user, token0);
-    cleanup(LP, user, token1);
+    cleanup(ctx.lp, user, ctx.token0);
+    cleanup(ctx.lp, user, ctx.token1);
     emit ReducedPosition(user, debtAsset, debt);
   }
 
 
-  /// @notice Repays a TR debt
+  /// @notice Repays several TR debts, such as the legs of a strangle, with at most one swap in each direction
   /// @param poolId ID of the ROE lending pool
+  /// @param user Owner of the debts
+  /// @param debtAssets the borrowed LP token addresses, in strictly increasing order
+  /// @param amounts amounts of borrowed tokens to repay; 0 or higher than current debt will repay all
+  /// @param collateralAsset Asset used for liquidation fee
+  /// @dev Token needs of all legs are summed: one swap covers the missing token, then one swap back to collateral if the user closes
+  function closeMany(
+    uint poolId, 
+    address user,
+    address[] memory debtAssets, 
+    uint[] memory amounts,
+    address collateralAsset
+  ) 
+    external
+  {
+    require(debtAssets.length == amounts.length, "OPM: Array Length Mismatch");
+    PoolContext memory ctx = getPoolContext(poolId);
+    require(collateralAsset == ctx.token0 || collateralAsset == ctx.token1, "OPM: Invalid Collateral Asset");
+    for ( uint k = 0; k < debtAssets.length; k++){
+      // ordering prevents repeated legs, which would be counted twice
+      require(k == 0 || debtAssets[k] > debtAssets[k-1], "OPM: Unsorted Debt Assets");
+      uint debt = ERC20(getReserveTokens(ctx.lp, debtAssets[k]).debtToken).balanceOf(user);
+      if ( amounts[k] > 0 && amounts[k] < debt ) debt = amounts[k];
+      require(debt > 0, "OPM: No Debt");
+      amounts[k] = debt;
+    }
+    (uint[] memory token0Amounts, uint[] memory token1Amounts, uint need0, uint need1) = getDebtTokenAmounts(ctx, debtAssets, amounts);
+
+    PMWithdraw(ctx.lp, user, ctx.token0, IERC20(getReserveTokens(ctx.lp, ctx.token0).aToken).balanceOf(user));
+    PMWithdraw(ctx.lp, user, ctx.token1, IERC20(getReserveTokens(ctx.lp, ctx.token1).aToken).balanceOf(user));
+    // If another user softLiquidates a share of the liquidation goes to the treasury
+    if (user != msg.sender) calculateAndSendFee(ctx, need0, need1, collateralAsset);
+    swapMissingTokens(ctx, need0, need1);
+
+    for ( uint k = 0; k < debtAssets.length; k++){
+      uint debt = reformDebt(ctx, debtAssets[k], token0Amounts[k], token1Amounts[k]);
+      checkSetAllowance(debtAssets[k], address(ctx.lp), debt);
+      ctx.lp.repay( debtAssets[k], debt, 2, user);
+      emit ClosePosition(user, debtAssets[k], debt, token0Amounts[k], token1Amounts[k]);
+      emit ReducedPosition(user, debtAssets[k], debt);
+    }
+    
+    // Swap remaining other token back to collateral: this allows to control exposure
+    if (user == msg.sender) {
+      address[] memory path = new address[](2);
+      (path[0], path[1]) = collateralAsset == ctx.token0 ? (ctx.token1, ctx.token0) : (ctx.token0, ctx.token1);
+      uint amount = ERC20(path[0]).balanceOf(address(this));
+      uint received = swapExactTokensForTokens(ctx, amount, path);
+      if (received > 0) emit Swap(msg.sender, path[0], amount, path[1], received);
+    }
+    cleanup(ctx.lp, user, ctx.token0);
+    cleanup(ctx.lp, user, ctx.token1);
+  }
+
+
+  /// @notice Repays a TR debt
+  /// @param ctx ROE pool addresses
   /// @param user Owner of the debt to close. If user is address(this), we dont repay but just recreate tokens, flashloan will take care of getting them back
   /// @param debtAsset the borrowed LP token address
   /// @param repayAmount amount of borrowed tokens to repay; 0 or higher than current debt will repay all
   /// @param collateralAsset Asset used for liquidation fee
   function closeDebt(
-    uint poolId, 
+    PoolContext memory ctx, 
     address user,
     address debtAsset, 
     uint repayAmount,
@@ -256,7 +378,7 @@ contract OptionsPositionManager is PositionManager {
   ) 
     internal returns (uint debt)
   {
-    (ILendingPool LP,,IUniswapV2Router01 ammRouter, address token0, address token1) = getPoolAddresses(poolId);
+    (ILendingPool LP, address token0, address token1) = (ctx.lp, ctx.token0, ctx.token1);
     sanityCheckUnderlying(debtAsset, token0, token1);
     require(collateralAsset == token0 || collateralAsset == token1, "OPM: Invalid Collateral Asset");
     uint amtA;
@@ -273,13 +395,13 @@ contract OptionsPositionManager is PositionManager {
       checkSetAllowance(token1, debtAsset, token1Amount);
       // If called by this contract himself this is a liquidation, skip that step
       if (user != address(this) ){
-        amtA = IERC20(LP.getReserveData(token0).aTokenAddress ).balanceOf(user);
-        amtB = IERC20(LP.getReserveData(token1).aTokenAddress ).balanceOf(user);
+        amtA = IERC20(getReserveTokens(LP, token0).aToken).balanceOf(user);
+        amtB = IERC20(getReserveTokens(LP, token1).aToken).balanceOf(user);
         PMWithdraw(LP, user, token0, amtA );
         PMWithdraw(LP, user, token1, amtB );
         // If another user softLiquidates a share of the liquidation goes to the treasury
         if (user != msg.sender ) {
-          uint feeAmount = calculateAndSendFee(poolId, token0Amount, token1Amount, collateralAsset);
+          uint feeAmount = calculateAndSendFee(ctx, token0Amount, token1Amount, collateralAsset);
           if (collateralAsset == token0) amtA -= feeAmount;
           else amtB -= feeAmount;
         }
@@ -295,12 +417,12 @@ contract OptionsPositionManager is PositionManager {
       if ( amtA < token0Amount ){
         path[0] = token1;
         path[1] = token0;
-        swapTokensForExactTokens(ammRouter, token0Amount - amtA, amtB, path); 
+        swapTokensForExactTokens(ctx, token0Amount - amtA, amtB, path); 
       }
       else if ( amtB < token1Amount ){
         path[0] = token0;
         path[1] = token1;
-        swapTokensForExactTokens(ammRouter, token1Amount - amtB, amtA, path); 
+        swapTokensForExactTokens(ctx, token1Amount - amtB, amtA, path); 
       }
       debt = TokenisableRange(debtAsset).deposit(token0Amount, token1Amount);
     }
@@ -324,7 +446,85 @@ contract OptionsPositionManager is PositionManager {
     }
     
     // Swap other token back to collateral: this allows to control exposure
-    if (user == msg.sender) swapTokens(poolId, collateralAsset == token0 ? token1 : token0, 0);
+    if (user == msg.sender) swapTokens(ctx, collateralAsset == token0 ? token1 : token0, 0);
+  }
+  
+  
+  /// @notice Recreate flashloaned TR debts from the liquidated assets, swapping at most once for all TRs
+  /// @param ctx ROE pool addresses
+  /// @param assets The distinct borrowed LP token addresses
+  /// @param amounts The amounts to recreate
+  /// @dev Tokens will be taken back by the flashloan
+  function recreateDebts(PoolContext memory ctx, address[] calldata assets, uint256[] calldata amounts) internal {
+    (uint[] memory token0Amounts, uint[] memory token1Amounts, uint need0, uint need1) = getDebtTokenAmounts(ctx, assets, amounts);
+    swapMissingTokens(ctx, need0, need1);
+    for ( uint k = 0; k < assets.length; k++){
+      uint debt = reformDebt(ctx, assets[k], token0Amounts[k], token1Amounts[k]);
+      checkSetAllowance(assets[k], address(ctx.lp), debt);
+      emit ClosePosition(address(this), assets[k], debt, token0Amounts[k], token1Amounts[k]);
+    }
+  }
+
+
+  /// @notice Underlying token amounts needed to reform each TR debt
+  /// @param ctx ROE pool addresses
+  /// @param debtAssets The borrowed LP token addresses
+  /// @param debts The debt amounts, before dust
+  /// @return token0Amounts Amount of token0 needed by each TR
+  /// @return token1Amounts Amount of token1 needed by each TR
+  /// @return need0 Amount of token0 needed by all TRs
+  /// @return need1 Amount of token1 needed by all TRs
+  function getDebtTokenAmounts(PoolContext memory ctx, address[] memory debtAssets, uint[] memory debts) 
+    internal returns (uint[] memory token0Amounts, uint[] memory token1Amounts, uint need0, uint need1)
+  {
+    token0Amounts = new uint[](debtAssets.length);
+    token1Amounts = new uint[](debtAssets.length);
+    for ( uint k = 0; k < debtAssets.length; k++){
+      sanityCheckUnderlying(debtAssets[k], ctx.token0, ctx.token1);
+      // Add dust to be sure debt reformed >= debt outstanding
+      uint debt = debts[k] + addDust(debtAssets[k], ctx.token0, ctx.token1);
+      // Claim fees first so that deposit will match exactly
+      TokenisableRange(debtAssets[k]).claimFee();
+      (token0Amounts[k], token1Amounts[k]) = TokenisableRange(debtAssets[k]).getTokenAmounts(debt);
+      checkExpectedBalances(debtAssets[k], debt, token0Amounts[k], token1Amounts[k]);
+      need0 += token0Amounts[k];
+      need1 += token1Amounts[k];
+    }
+  }
+
+
+  /// @notice Swap one underlying token for the missing amount of the other one
+  /// @param ctx ROE pool addresses
+  /// @param need0 Amount of token0 needed
+  /// @param need1 Amount of token1 needed
+  function swapMissingTokens(PoolContext memory ctx, uint need0, uint need1) internal {
+    uint amtA = ERC20(ctx.token0).balanceOf(address(this));
+    uint amtB = ERC20(ctx.token1).balanceOf(address(this));
+    // swap if one token is missing - consider that there is enough 
+    address[] memory path = new address[](2);
+    if ( amtA < need0 ){
+      path[0] = ctx.token1;
+      path[1] = ctx.token0;
+      swapTokensForExactTokens(ctx, need0 - amtA, amtB, path); 
+    }
+    else if ( amtB < need1 ){
+      path[0] = ctx.token0;
+      path[1] = ctx.token1;
+      swapTokensForExactTokens(ctx, need1 - amtB, amtA, path); 
+    }
+  }
+
+
+  /// @notice Deposit underlying tokens into a TR
+  /// @param ctx ROE pool addresses
+  /// @param debtAsset the borrowed LP token address
+  /// @param token0Amount Amount of token0 deposited
+  /// @param token1Amount Amount of token1 deposited
+  /// @return debt Amount of TR reformed
+  function reformDebt(PoolContext memory ctx, address debtAsset, uint token0Amount, uint token1Amount) internal returns (uint debt) {
+    checkSetAllowance(ctx.token0, debtAsset, token0Amount);
+    checkSetAllowance(ctx.token1, debtAsset, token1Amount);
+    debt = TokenisableRange(debtAsset).deposit(token0Amount, token1Amount);
   }
   
   
@@ -350,17 +550,17 @@ contract OptionsPositionManager is PositionManager {
 
   
   /// @notice Calculates the liquidation fee and sends it to the treasury
-  /// @param poolId ROE pool Id
+  /// @param ctx ROE pool addresses
   /// @param token0Amount Amount of token0 used to liquidate the debt
   /// @param token1Amount Amount of token1 used to liquidate the debt
   /// @param collateralAsset Asset used for liquidation fee
   function calculateAndSendFee(
-    uint poolId, 
+    PoolContext memory ctx, 
     uint token0Amount, 
     uint token1Amount, 
     address collateralAsset
   ) internal returns (uint feeAmount) {
-    (, IPriceOracle oracle,, address token0, address token1) = getPoolAddresses(poolId);
+    (IPriceOracle oracle, address token0, address token1) = (ctx.oracle, ctx.token0, ctx.token1);
     
     uint feeValueE8 = token0Amount * oracle.getAssetPrice(token0) / 10**ERC20(token0).decimals()
                     + token1Amount * oracle.getAssetPrice(token1) / 10**ERC20(token1).decimals() ;
@@ -389,8 +589,9 @@ contract OptionsPositionManager is PositionManager {
   )
     external
   {
-    (ILendingPool LP, IPriceOracle oracle,, address token0, address token1 ) = getPoolAddresses(poolId);
-    require( LP.getReserveData(optionAddress).aTokenAddress != address(0x0), "OPM: Invalid Address" );
+    PoolContext memory ctx = getPoolContext(poolId);
+    (ILendingPool LP, address token0, address token1) = (ctx.lp, ctx.token0, ctx.token1);
+    require( getReserveTokens(LP, optionAddress).aToken != address(0x0), "OPM: Invalid Address" );
     
     PMWithdraw(LP, msg.sender, token0, amount0);
     PMWithdraw(LP, msg.sender, token1, amount1);
@@ -416,8 +617,9 @@ contract OptionsPositionManager is PositionManager {
   )
     external
   {
-    (ILendingPool LP,,, address token0, address token1 ) = getPoolAddresses(poolId);
-    require( LP.getReserveData(optionAddress).aTokenAddress != address(0x0), "OPM: Invalid Address" );
+    PoolContext memory ctx = getPoolContext(poolId);
+    (ILendingPool LP, address token0, address token1) = (ctx.lp, ctx.token0, ctx.token1);
+    require( getReserveTokens(LP, optionAddress).aToken != address(0x0), "OPM: Invalid Address" );
     PMWithdraw(LP, msg.sender, optionAddress, amount);
 
     // Get output amounts from oracle to avoid sandwich
@@ -436,11 +638,21 @@ contract OptionsPositionManager is PositionManager {
   /// @param sourceAsset Asset to be swapped
   /// @param amount of asset to swap - if 0, swap all
   /// @return received Amount of target token received
-  function swapTokens(uint poolId, address sourceAsset, uint amount) public returns (uint received) {
-    (ILendingPool LP, IPriceOracle oracle,IUniswapV2Router01 router, address token0, address token1) = getPoolAddresses(poolId);
+  function swapTokens(uint poolId, address sourceAsset, uint amount) external returns (uint received) {
+    received = swapTokens(getPoolContext(poolId), sourceAsset, amount);
+  }
+  
+  
+  /// @notice Swap user assets
+  /// @param ctx ROE pool addresses
+  /// @param sourceAsset Asset to be swapped
+  /// @param amount of asset to swap - if 0, swap all
+  /// @return received Amount of target token received
+  function swapTokens(PoolContext memory ctx, address sourceAsset, uint amount) internal returns (uint received) {
+    (ILendingPool LP, address token0, address token1) = (ctx.lp, ctx.token0, ctx.token1);
     require(sourceAsset == token0 || sourceAsset == token1, "OPM: Invalid Swap Asset");
     if (amount == 0) {
-      amount = ERC20(LP.getReserveData(sourceAsset).aTokenAddress).balanceOf(msg.sender);
+      amount = ERC20(getReserveTokens(LP, sourceAsset).aToken).balanceOf(msg.sender);
       if (amount == 0) return 0;
     }
     PMWithdraw(LP, msg.sender, sourceAsset, amount);
@@ -448,7 +660,7 @@ contract OptionsPositionManager is PositionManager {
     address[] memory path = new address[](2);
     path[0] = sourceAsset ;
     path[1] = sourceAsset == token0 ? token1 : token0;
-    received = swapExactTokensForTokens(router, oracle, amount, path);
+    received = swapExactTokensForTokens(ctx, amount, path);
     
     cleanup(LP, msg.sender, token0);
     cleanup(LP, msg.sender, token1);
@@ -461,6 +673,49 @@ contract OptionsPositionManager is PositionManager {
   ////////////////////// HELPERS
 
   
+  /// @notice Swaps exact assets through the pool swap route: Uniswap V3 if set, else the AMM router
+  /// @param ctx ROE pool addresses
+  /// @param amount Amount of source token swapped
+  /// @param path The path [source, target] of the swap
+  /// @return received Amount of target tokens received
+  /// @dev The V3 swap isn't quoted beforehand, the oracle-derived minimum amount out protects it
+  function swapExactTokensForTokens(PoolContext memory ctx, uint amount, address[] memory path) 
+    internal returns (uint256 received)
+  {
+    if (address(ctx.swapRouter) == address(0x0)) return swapExactTokensForTokens(ctx.router, ctx.oracle, amount, path);
+    // skip dust amounts, which have no value
+    uint minAmount = quoteFromOracle(ctx.oracle, path[0], amount, path[1]) * 99 / 100; // allow 1% slippage 
+    if (minAmount > 0){
+      checkSetAllowance(path[0], address(ctx.swapRouter), amount);
+      received = ctx.swapRouter.exactInputSingle(ISwapRouter.ExactInputSingleParams(
+        path[0], path[1], ctx.feeTier, address(this), block.timestamp, amount, minAmount, 0
+      ));
+    }
+  }
+  
+  
+  /// @notice Swaps assets for exact assets through the pool swap route: Uniswap V3 if set, else the AMM router
+  /// @param ctx ROE pool addresses
+  /// @param recvAmount Amount of target token received
+  /// @param maxAmount Amount of source token allowed to be spent minus margin
+  /// @param path The path [source, target] of the swap
+  /// @dev The V3 swap isn't quoted beforehand, the amount spent is also capped by the oracle-derived amount
+  function swapTokensForExactTokens(PoolContext memory ctx, uint recvAmount, uint maxAmount, address[] memory path) internal {
+    if (address(ctx.swapRouter) == address(0x0)) {
+      swapTokensForExactTokens(ctx.router, recvAmount, maxAmount, path);
+      return;
+    }
+    require( maxAmount <= ERC20(path[0]).balanceOf(address(this)), "OPM: Insufficient Token Amount" );
+    // cap the amount spent at the oracle-derived amount, allow 1% slippage
+    uint oracleMaxAmount = getTargetAmountFromOracle(ctx.oracle, path[1], recvAmount, path[0]) * 101 / 100;
+    if (oracleMaxAmount < maxAmount) maxAmount = oracleMaxAmount;
+    checkSetAllowance(path[0], address(ctx.swapRouter), maxAmount);
+    ctx.swapRouter.exactOutputSingle(ISwapRouter.ExactOutputSingleParams(
+      path[0], path[1], ctx.feeTier, address(this), block.timestamp, recvAmount, maxAmount, 0
+    ));
+  }
+
+  
   /// @notice Swaps assets for exact assets
   /// @param ammRouter AMM router
   /// @param oracle Price oracle
@@ -518,11 +773,53 @@ contract OptionsPositionManager is PositionManager {
       uint valueB = amountB * oracle.getAssetPrice(assetB) / 10**ERC20(assetB).decimals();
       We expect valueA == valueB
     */
+    amountB = quoteFromOracle(oracle, assetA, amountA, assetB);
+    require( amountB > 0, "OPM: Target Amount Too Low");
+  }
+  
+  
+  /// @notice Calculate a target swap amount based on oracle-provided token prices, 0 for dust amounts
+  /// @param oracle Price oracle
+  /// @param assetA address of token A
+  /// @param amountA Amount of toke A
+  /// @param assetB address of token B
+  /// @return amountB Amount of target token
+  function quoteFromOracle(IPriceOracle oracle, address assetA, uint amountA, address assetB) 
+    internal view returns (uint amountB) 
+  {
     uint priceAssetA = oracle.getAssetPrice(assetA);
     uint priceAssetB = oracle.getAssetPrice(assetB);
     require ( priceAssetA > 0 && priceAssetB > 0, "OPM: Invalid Oracle Price");
     amountB = amountA * priceAssetA * 10**ERC20(assetB).decimals() / 10**ERC20(assetA).decimals() / priceAssetB;
-    require( amountB > 0, "OPM: Target Amount Too Low");
+  }
+  
+  
+  /// @notice Group amounts by asset
+  /// @param assets Assets list, possibly repeated
+  /// @param amounts Amounts list
+  /// @return distinct Distinct assets, in order of first appearance
+  /// @return sums Summed amount of each distinct asset
+  function sumByAsset(address[] memory assets, uint[] memory amounts) 
+    internal pure returns (address[] memory distinct, uint[] memory sums) 
+  {
+    address[] memory _distinct = new address[](assets.length);
+    uint[] memory _sums = new uint[](assets.length);
+    uint length;
+    for ( uint k = 0; k < assets.length; k++){
+      uint i;
+      while (i < length && _distinct[i] != assets[k]) i++;
+      if (i == length) {
+        _distinct[length] = assets[k];
+        length++;
+      }
+      _sums[i] += amounts[k];
+    }
+    distinct = new address[](length);
+    sums = new uint[](length);
+    for ( uint k = 0; k < length; k++){
+      distinct[k] = _distinct[k];
+      sums[k] = _sums[k];
+    }
   }
   
   
@@ -10,8 +10,10 @@ import {IPriceOracle} from "../../interfaces/IPriceOracle.sol";
 import "../../interfaces/IUniswapV2Router01.sol";
 import "../../interfaces/IUniswapV2Pair.sol";
 import "../../interfaces/IUniswapV2Factory.sol";
+import "../../interfaces/ISwapRouter.sol";
 
 import "../RoeRouter.sol";
+import "../lib/ReserveTokens.sol";
 
 
 contract PositionManager is IFlashLoanReceiver {
@@ -22,6 +24,38 @@ contract PositionManager is IFlashLoanReceiver {
   ILendingPool public LENDING_POOL; // IFlashLoanReceiver  requirement
   RoeRouter public ROEROUTER; 
   
+  /// @notice Addresses of a ROE pool, resolved once per entry point and passed down
+  struct PoolContext {
+    ILendingPool lp;
+    IPriceOracle oracle;
+    IUniswapV2Router01 router;
+    address token0;
+    address token1;
+    ISwapRouter swapRouter;
+    uint24 feeTier;
+  }
+  
+  /// @notice Snapshot of a RoeRouter pool record with its lending pool, valid while the RoeRouter pool version is unchanged
+  struct PoolRecord {
+    ILendingPoolAddressesProvider lpap;
+    ILendingPool lp;
+    IUniswapV2Router01 router;
+    address token0;
+    address token1;
+    ISwapRouter swapRouter;
+    uint24 feeTier;
+    uint64 version;
+  }
+  
+  /// @notice Pool records by poolId, empty for pools never used or deprecated
+  mapping(uint => PoolRecord) private poolRecords;
+  
+  /// @notice Reserve tokens by lending pool and asset, filled on first use
+  mapping(address => mapping(address => ReserveTokens.Tokens)) private reserveTokens;
+  
+  ////////////////////// EVENTS
+  event SyncReserveTokens(address indexed lendingPool, address indexed asset, address aToken, address debtToken);
+  
   
   ////////////////////// GENERAL   
 
@@ -53,23 +87,68 @@ contract PositionManager is IFlashLoanReceiver {
   }
   
   
-  /// @notice Get lp, oracle, router and underlying tokens from RoeRouter
+  /// @notice Read a pool record from RoeRouter
+  /// @param poolId Id of the ROE pool
+  function getPoolRecord(uint poolId) internal view returns (PoolRecord memory record, bool isDeprecated) {
+    (address lpap, address token0, address token1, address router, bool _isDeprecated) = ROEROUTER.pools(poolId);
+    (address swapRouter, uint24 feeTier) = ROEROUTER.swapRoutes(poolId);
+    record = PoolRecord(
+      ILendingPoolAddressesProvider(lpap), 
+      ILendingPool(ILendingPoolAddressesProvider(lpap).getLendingPool()), 
+      IUniswapV2Router01(router), 
+      token0, 
+      token1,
+      ISwapRouter(swapRouter),
+      feeTier,
+      ROEROUTER.poolVersions(poolId)
+    );
+    isDeprecated = _isDeprecated;
+  }
+  
+  
+  /// @notice Get lp, oracle, router and underlying tokens of a pool
   /// @param poolId Id of the ROE pool
-  /// @return lp ROE Lending pool address
-  /// @return oracle Lending pool oracle
-  /// @return router Lending pool LP asset router
-  /// @return token0 First underlying token in lexicographic order
-  /// @return token1 Second underlying token
-  function getPoolAddresses(uint poolId) 
-    internal view 
-    returns( ILendingPool lp, IPriceOracle oracle, IUniswapV2Router01 router, address token0, address token1) 
-  {
-    (address lpap, address _token0, address _token1, address r, ) = ROEROUTER.pools(poolId);
-    token0 = _token0;
-    token1 = _token1;
-    lp = ILendingPool(ILendingPoolAddressesProvider(lpap).getLendingPool());
-    oracle = IPriceOracle(ILendingPoolAddressesProvider(lpap).getPriceOracle());
-    router = IUniswapV2Router01(r);
+  /// @return ctx Lending pool, its oracle, LP asset router, underlying tokens in lexicographic order and V3 swap route if any
+  /// @dev The pool record is read from the snapshot, filled on first use and reloaded when the RoeRouter pool version changes. 
+  /// Deprecated pools aren't snapshotted. The oracle can be changed in the address provider, so it's always read
+  function getPoolContext(uint poolId) internal returns (PoolContext memory ctx) {
+    PoolRecord memory record = poolRecords[poolId];
+    if (address(record.lp) == address(0x0) || record.version != ROEROUTER.poolVersions(poolId)) {
+      bool isStored = address(record.lp) != address(0x0);
+      bool isDeprecated;
+      (record, isDeprecated) = getPoolRecord(poolId);
+      if (!isDeprecated) poolRecords[poolId] = record;
+      else if (isStored) delete poolRecords[poolId];
+    }
+    ctx = PoolContext(
+      record.lp, 
+      IPriceOracle(record.lpap.getPriceOracle()), 
+      record.router, 
+      record.token0, 
+      record.token1, 
+      record.swapRouter, 
+      record.feeTier
+    );
+  }
+  
+  
+  /// @notice Reload the cached reserve tokens of an asset from the lending pool
+  /// @param LP The ROE lending pool
+  /// @param asset Reserve asset
+  /// @dev Only for the RoeRouter owner, in case a reserve is dropped and listed again
+  function syncReserveTokens(ILendingPool LP, address asset) external {
+    require(msg.sender == ROEROUTER.owner(), "PM: Unallowed");
+    ReserveTokens.Tokens memory tokens = ReserveTokens.sync(reserveTokens[address(LP)], LP, asset);
+    emit SyncReserveTokens(address(LP), asset, tokens.aToken, tokens.debtToken);
+  }
+  
+  
+  /// @notice Get the aToken and debt token of a reserve
+  /// @param LP The ROE lending pool
+  /// @param asset Reserve asset
+  /// @return tokens Reserve tokens, 0x0 if the asset isn't listed
+  function getReserveTokens(ILendingPool LP, address asset) internal returns (ReserveTokens.Tokens memory tokens) {
+    tokens = ReserveTokens.getOrCache(reserveTokens[address(LP)], LP, asset);
   }
   
   
@@ -92,7 +171,7 @@ contract PositionManager is IFlashLoanReceiver {
       checkSetAllowance(asset, address(LP), amt);
       
       // if there is a debt, try to repay the debt 
-      uint debt = ERC20(LP.getReserveData(asset).variableDebtTokenAddress).balanceOf(user);
+      uint debt = ERC20(getReserveTokens(LP, asset).debtToken).balanceOf(user);
       if ( debt > 0 ){
         if (amt <= debt ) {
           LP.repay( asset, amt, 2, user);
@@ -123,7 +202,7 @@ contract PositionManager is IFlashLoanReceiver {
   /// @param amount The amount withdrawn
   function PMWithdraw(ILendingPool LP, address user, address asset, uint amount) internal {
     if ( amount > 0 ){
-      LP.PMTransfer(LP.getReserveData(asset).aTokenAddress, user, amount);
+      LP.PMTransfer(getReserveTokens(LP, asset).aToken, user, amount);
       LP.withdraw(asset, amount, address(this));
     }
   }  
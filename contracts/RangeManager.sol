@@ -16,6 +16,8 @@ import "../interfaces/IUniswapV2Router01.sol";
 import "../interfaces/ISwapRouter.sol";
 import "../interfaces/INonfungiblePositionManager.sol";
 import "./TokenisableRange.sol";
+import "./lib/Approvals.sol";
+import "./lib/ReserveTokens.sol";
 import "./openzeppelin-solidity/contracts/proxy/beacon/BeaconProxy.sol";
 import "./openzeppelin-solidity/contracts/access/Ownable.sol";
 import {IPriceOracle} from "../interfaces/IPriceOracle.sol";
@@ -28,6 +30,7 @@ contract RangeManager is ReentrancyGuard, Ownable {
   event Withdraw(address user, address asset, uint amount);
   event Deposit(address user, address asset, uint amount);
   event AddRange(uint128 startX10, uint128 endX10, uint step);
+  event SyncReserveTokens(address indexed asset, address aToken, address debtToken);
 
   ERC20 public ASSET_0;
   ERC20 public ASSET_1;
@@ -43,6 +46,10 @@ contract RangeManager is ReentrancyGuard, Ownable {
   Step [] public stepList; 
   TokenisableRange [] public tokenisedRanges;
   TokenisableRange [] public tokenisedTicker;
+  // Token => spender pairs approved for the max amount
+  mapping(address => mapping(address => bool)) private approved;
+  // Asset => lending pool reserve tokens, filled on first use
+  mapping(address => ReserveTokens.Tokens) private reserveTokens;
   
   
   constructor(ILendingPool lendingPool, ERC20 _asset0, ERC20 _asset1)  {
@@ -94,39 +101,85 @@ contract RangeManager is ReentrancyGuard, Ownable {
   /// @param amount1 Amount of token1
   function initRange(address tr, uint amount0, uint amount1) external onlyOwner {
     ASSET_0.safeTransferFrom(msg.sender, address(this), amount0);
-    ASSET_0.safeIncreaseAllowance(tr, amount0);
+    Approvals.approveOnce(approved, address(ASSET_0), tr);
     ASSET_1.safeTransferFrom(msg.sender, address(this), amount1);
-    ASSET_1.safeIncreaseAllowance(tr, amount1);
+    Approvals.approveOnce(approved, address(ASSET_1), tr);
     TokenisableRange(tr).init(amount0, amount1);
     ERC20(tr).safeTransfer(msg.sender, TokenisableRange(tr).balanceOf(address(this)));
   }
 
+  
+  /// @notice Initialize several previously created tickers, pulling the assets once
+  /// @param trs Range addresses
+  /// @param amounts0 Amount of token0 for each range
+  /// @param amounts1 Amount of token1 for each range
+  /// @dev Assets not used by the ranges are sent back
+  function initRanges(address[] calldata trs, uint[] calldata amounts0, uint[] calldata amounts1) external onlyOwner {
+    require(trs.length == amounts0.length && trs.length == amounts1.length, "RM: Invalid Length");
+    uint total0;
+    uint total1;
+    for (uint k = 0; k < trs.length; k++){
+      total0 += amounts0[k];
+      total1 += amounts1[k];
+    }
+    ASSET_0.safeTransferFrom(msg.sender, address(this), total0);
+    ASSET_1.safeTransferFrom(msg.sender, address(this), total1);
+    for (uint k = 0; k < trs.length; k++){
+      Approvals.approveOnce(approved, address(ASSET_0), trs[k]);
+      Approvals.approveOnce(approved, address(ASSET_1), trs[k]);
+      TokenisableRange(trs[k]).init(amounts0[k], amounts1[k]);
+      ERC20(trs[k]).safeTransfer(msg.sender, TokenisableRange(trs[k]).balanceOf(address(this)));
+    }
+    ASSET_0.safeTransfer(msg.sender, ASSET_0.balanceOf(address(this)));
+    ASSET_1.safeTransfer(msg.sender, ASSET_1.balanceOf(address(this)));
+  }
+
+  
+  /// @notice Set the price cache max age of a range created by this manager
+  /// @param tr Range address
+  /// @param maxAge Number of blocks during which the cached price is valid, 0 disables the cache
+  function setPriceCacheAge(address tr, uint maxAge) external onlyOwner {
+    TokenisableRange(tr).setPriceCacheAge(maxAge);
+  }
 
+  
+  /// @notice Set the lazy harvesting thresholds of a range created by this manager
+  /// @param tr Range address
+  /// @param interval Min number of seconds between harvests on deposit, 0 harvests on every deposit
+  /// @param minValueX8 Value of pending fees above which deposits harvest anyway, 0 to ignore
+  function setHarvestThresholds(address tr, uint interval, uint minValueX8) external onlyOwner {
+    TokenisableRange(tr).setHarvestThresholds(interval, minValueX8);
+  }
+
+
+  /// @notice Reload the cached reserve tokens of an asset from the lending pool
+  /// @param asset Reserve asset
+  /// @dev In case a reserve is dropped and listed again
+  function syncReserveTokens(address asset) external onlyOwner {
+    ReserveTokens.Tokens memory tokens = ReserveTokens.sync(reserveTokens, LENDING_POOL, asset);
+    emit SyncReserveTokens(asset, tokens.aToken, tokens.debtToken);
+  }
+  
+  
   /// @notice Remove assets from tokenisedRanges
   /// @param step Id of the range+ticker step from which to remove assets
   function removeFromStep(uint256 step) internal {
     require(step < tokenisedRanges.length && step < tokenisedTicker.length, "Invalid step");
     uint256 trAmt;
     
-    trAmt = ERC20(LENDING_POOL.getReserveData(address(tokenisedRanges[step])).aTokenAddress).balanceOf(msg.sender);   
+    address aToken = ReserveTokens.getOrCache(reserveTokens, LENDING_POOL, address(tokenisedRanges[step])).aToken;
+    trAmt = ERC20(aToken).balanceOf(msg.sender);   
     if (trAmt > 0) {       
-        LENDING_POOL.PMTransfer(
-          LENDING_POOL.getReserveData(address(tokenisedRanges[step])).aTokenAddress, 
-          msg.sender, 
-          trAmt
-        );
+        LENDING_POOL.PMTransfer(aToken, msg.sender, trAmt);
         trAmt = LENDING_POOL.withdraw(address(tokenisedRanges[step]), type(uint256).max, address(this));
         tokenisedRanges[step].withdraw(trAmt, 0, 0);
         emit Withdraw(msg.sender, address(tokenisedRanges[step]), trAmt);
     }        
 
-    trAmt = ERC20(LENDING_POOL.getReserveData(address(tokenisedTicker[step])).aTokenAddress).balanceOf(msg.sender);
+    aToken = ReserveTokens.getOrCache(reserveTokens, LENDING_POOL, address(tokenisedTicker[step])).aToken;
+    trAmt = ERC20(aToken).balanceOf(msg.sender);
     if (trAmt > 0) {    
-        LENDING_POOL.PMTransfer(
-          LENDING_POOL.getReserveData(address(tokenisedTicker[step])).aTokenAddress, 
-          msg.sender, 
-          trAmt
-        );
+        LENDING_POOL.PMTransfer(aToken, msg.sender, trAmt);
         uint256 ttAmt = LENDING_POOL.withdraw(address(tokenisedTicker[step]), type(uint256).max, address(this));
         tokenisedTicker[step].withdraw(ttAmt, 0, 0);
         emit Withdraw(msg.sender, address(tokenisedTicker[step]), trAmt);
@@ -151,18 +204,18 @@ contract RangeManager is ReentrancyGuard, Ownable {
   function transferAssetsIntoStep(TokenisableRange tr, uint256 step, uint256 amount0, uint256 amount1) internal {
     removeFromStep(step);
     if (amount0 > 0) {    
-      LENDING_POOL.PMTransfer( LENDING_POOL.getReserveData(address(ASSET_0)).aTokenAddress, msg.sender, amount0 );
+      LENDING_POOL.PMTransfer( ReserveTokens.getOrCache(reserveTokens, LENDING_POOL, address(ASSET_0)).aToken, msg.sender, amount0 );
       LENDING_POOL.withdraw( address(ASSET_0), amount0, address(this) );
-      ASSET_0.safeIncreaseAllowance(address(tr), amount0);
+      Approvals.approveOnce(approved, address(ASSET_0), address(tr));
     }
     if (amount1 > 0) {
-      LENDING_POOL.PMTransfer( LENDING_POOL.getReserveData(address(ASSET_1)).aTokenAddress, msg.sender, amount1 );
+      LENDING_POOL.PMTransfer( ReserveTokens.getOrCache(reserveTokens, LENDING_POOL, address(ASSET_1)).aToken, msg.sender, amount1 );
       LENDING_POOL.withdraw( address(ASSET_1), amount1, address(this) );
-      ASSET_1.safeIncreaseAllowance(address(tr), amount1);
+      Approvals.approveOnce(approved, address(ASSET_1), address(tr));
     }
     uint256 lpAmt = tr.deposit(amount0, amount1);
     emit Deposit(msg.sender, address(tr), lpAmt);
-    tr.approve(address(LENDING_POOL), lpAmt);
+    Approvals.approveOnce(approved, address(tr), address(LENDING_POOL));
     LENDING_POOL.deposit(address(tr), lpAmt, msg.sender, 0);
     cleanup();
   }
@@ -192,12 +245,12 @@ contract RangeManager is ReentrancyGuard, Ownable {
     uint256 asset1_amt = ASSET_1.balanceOf(address(this));
     
     if (asset0_amt > 0) {
-      ASSET_0.safeIncreaseAllowance(address(LENDING_POOL), asset0_amt);
+      Approvals.approveOnce(approved, address(ASSET_0), address(LENDING_POOL));
       LENDING_POOL.deposit(address(ASSET_0), asset0_amt, msg.sender, 0);
     }
     
     if (asset1_amt > 0) {
-      ASSET_1.safeIncreaseAllowance(address(LENDING_POOL), asset1_amt);
+      Approvals.approveOnce(approved, address(ASSET_1), address(LENDING_POOL));
       LENDING_POOL.deposit(address(ASSET_1), asset1_amt, msg.sender, 0);
     }
     
@@ -12,6 +12,7 @@ contract RoeRouter is Ownable {
   event AddPool(uint poolId, address lendingPoolAddressProvider);
   event DeprecatePool(uint poolId);
   event UpdateTreasury(address treasury);
+  event SetSwapRoute(uint poolId, address swapRouter, uint24 feeTier);
 
   /// ROE treasury
   address public treasury;
@@ -28,6 +29,18 @@ contract RoeRouter is Ownable {
     bool isDeprecated;
   }
   
+  /// Version of each pool parameters, bumped on any change so that consumers can refresh their copies
+  mapping(uint => uint64) public poolVersions;
+  
+  /// Uniswap V3 swap route of a pool, if set used instead of the ammRouter for swaps
+  mapping(uint => SwapRoute) public swapRoutes;
+  
+  /// Swap route structure
+  struct SwapRoute {
+    address swapRouter;
+    uint24 feeTier;
+  }
+  
   
   /// @notice constructor
   constructor (address treasury_) {
@@ -47,6 +60,7 @@ contract RoeRouter is Ownable {
   /// @dev isDeprecated is a statement about the pool record, and does not imply anything about the pool itself
   function deprecatePool(uint poolId) public onlyOwner {
     pools[poolId].isDeprecated = true;
+    poolVersions[poolId]++;
     emit DeprecatePool(poolId);
   }
   
@@ -78,6 +92,20 @@ contract RoeRouter is Ownable {
     emit AddPool(poolId, lendingPoolAddressProvider);
   }
   
+  /// @notice Set the Uniswap V3 route used to swap a pool tokens
+  /// @param poolId pool ID
+  /// @param swapRouter address of a Uniswap V3 SwapRouter, or 0x0 to swap through the pool ammRouter
+  /// @param feeTier fee tier of the token0/token1 Uniswap V3 pool used
+  /// @dev Bumps the pool version, so that position managers reload their pool snapshot
+  function setSwapRoute(uint poolId, address swapRouter, uint24 feeTier) public onlyOwner {
+    require(poolId < pools.length, "Invalid Pool");
+    require(swapRouter == address(0x0) || feeTier > 0, "Invalid Fee Tier");
+    swapRoutes[poolId] = SwapRoute(swapRouter, feeTier);
+    poolVersions[poolId]++;
+    emit SetSwapRoute(poolId, swapRouter, feeTier);
+  }
+  
+  
   /// @notice Modify treaury address
   /// @param newTreasury New treasury address
   function setTreasury(address newTreasury) public onlyOwner {
@@ -7,9 +7,13 @@ import "../interfaces/IUniswapV3Pool.sol";
 import "./openzeppelin-solidity/contracts/token/ERC20/ERC20.sol";
 import "./openzeppelin-solidity/contracts/token/ERC20/utils/SafeERC20.sol";
 import "./openzeppelin-solidity/contracts/utils/Strings.sol";
+import "./openzeppelin-solidity/contracts/utils/math/SafeCast.sol";
 import "./openzeppelin-solidity/contracts/security/ReentrancyGuard.sol";
 import "./lib/LiquidityAmounts.sol";
+import "./lib/FullMath.sol";
 import "./lib/TickMath.sol";
+import "./lib/Approvals.sol";
+import "./lib/Sqrt.sol";
 import "../interfaces/IAaveOracle.sol";
 import "../interfaces/IAaveOracle.sol";
 
@@ -17,21 +21,26 @@ import "../interfaces/IAaveOracle.sol";
 /// @notice Tokenize a Uniswap V3 NFT position
 contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
   using SafeERC20 for ERC20;
+  using SafeCast for uint256;
   /// EVENTS
   event InitTR(address asset0, address asset1, uint128 startX10, uint128 endX10);
   event Deposit(address sender, uint trAmount);
   event Withdraw(address sender, uint trAmount);
   event ClaimFees(uint fee0, uint fee1);
+  event SetPriceCacheAge(uint maxAge);
+  event SetHarvestThresholds(uint interval, uint minValueX8);
+  event Migrate();
   
   /// VARIABLES
 
-  int24 public lowerTick;
-  int24 public upperTick;
-  uint24 public feeTier;
+  // @notice V1 storage, moved to the packed range and fees slots by migrate(), use loadRange and loadFees to read them
+  int24 private lowerTick_legacy;
+  int24 private upperTick_legacy;
+  uint24 private feeTier_legacy;
   
   uint256 public tokenId;
-  uint256 public fee0;
-  uint256 public fee1;
+  uint256 private fee0_legacy;
+  uint256 private fee1_legacy;
   
   struct ASSET {
     ERC20 token;
@@ -46,13 +55,56 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
   string _symbol;
   
   enum ProxyState { INIT_PROXY, INIT_LP, READY }
-  ProxyState public status;
+  ProxyState private status_legacy;
   address private creator;
   
-  uint128 public liquidity;
-  // @notice deprecated, keep to avoid beacon storage slot overwriting errors
-  address public TREASURY_DEPRECATED = 0x22Cc3f665ba4C898226353B672c5123c58751692;
-  uint public treasuryFee_deprecated = 20;
+  uint128 private liquidity_legacy;
+  
+  // @notice Fields read on every valuation, packed in a single slot
+  // @dev Takes the slot of the deprecated TREASURY_DEPRECATED, whose initializer only ever ran on the implementation so it is empty in proxies
+  struct RangeState {
+    int24 lowerTick;
+    int24 upperTick;
+    uint24 feeTier;
+    ProxyState status;
+    uint8 decimals0;
+    uint8 decimals1;
+    bool migrated;
+    uint128 liquidity;
+  }
+  RangeState internal range;
+  // @notice Uncompounded fees, in the slot of the deprecated treasuryFee_deprecated
+  struct Fees {
+    uint128 fee0;
+    uint128 fee1;
+  }
+  Fees internal fees;
+  
+  // @notice Uniswap pool and range sqrt prices, constant once the proxy is initialized, cached for the hot paths
+  // @dev Appended to keep the storage layout of existing proxies, filled by cacheRangeParameters after an upgrade
+  IUniswapV3Pool public pool;
+  uint160 public sqrtRatioLowerX96;
+  uint160 public sqrtRatioUpperX96;
+  
+  // @notice LP price with the oracle prices it was computed from, refreshed when the range changes or when poked
+  struct PriceCache {
+    uint128 priceX8;
+    uint64 blockNumber;
+    uint128 token0Price;
+    uint128 token1Price;
+  }
+  PriceCache public priceCache;
+  // @notice Number of blocks during which latestAnswer serves the cached price, 0 disables the cache
+  uint public priceCacheMaxAge;
+  
+  // @notice Lazy harvesting: deposits collect fees only once harvestInterval seconds have passed since the last harvest,
+  // or once pending fees are worth harvestMinValueX8. A 0 threshold is ignored, both at 0 collect fees on every deposit
+  uint public harvestInterval;
+  uint public harvestMinValueX8;
+  uint public lastHarvest;
+  
+  // @notice Token => spender pairs approved for the max amount
+  mapping(address => mapping(address => bool)) private approved;
   
   // These are constant across chains - https://docs.uniswap.org/protocol/reference/deployments
   INonfungiblePositionManager constant public POS_MGR = INonfungiblePositionManager(0xC36442b4a4522E871399CD717aBDD847Ab11FE88); 
@@ -60,18 +112,6 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
   address constant public treasury = 0x22Cc3f665ba4C898226353B672c5123c58751692;
   uint constant public treasuryFee = 20;
 
-  /// @notice Babylonian method for sqrt
-  /// @param x sqrt parameter
-  /// @return y Square root
-  function sqrt(uint x) internal pure returns (uint y) {
-      uint z = (x + 1) / 2;
-      y = x;
-      while (z < y) {
-          y = z;
-          z = (x / z + z) / 2;
-      }
-  }
-
 
   /// @notice Store range parameters
   /// @param _oracle Address of the IAaveOracle interface of the ROE lending pool
@@ -84,9 +124,9 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
   /// @param isTicker Range is single tick liquidity around upperTick/startX10/startName
   function initProxy(IAaveOracle _oracle, ERC20 asset0, ERC20 asset1, uint128 startX10, uint128 endX10, string memory startName, string memory endName, bool isTicker) external {
     require(address(_oracle) != address(0x0), "Invalid oracle");
-    require(status == ProxyState.INIT_PROXY, "!InitProxy");
+    require(loadRange().status == ProxyState.INIT_PROXY, "!InitProxy");
     creator = msg.sender;
-    status = ProxyState.INIT_LP;
+    (range.status, range.migrated) = (ProxyState.INIT_LP, true);
     ORACLE = _oracle;
     
     TOKEN0.token    = asset0;
@@ -96,30 +136,150 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
     string memory quoteSymbol = asset0.symbol();
     string memory baseSymbol  = asset1.symbol();
         
-    int24 _upperTick = TickMath.getTickAtSqrtRatio( uint160( 2**48 * sqrt( (2 ** 96 * (10 ** TOKEN1.decimals)) * 1e10 / (uint256(startX10) * 10 ** TOKEN0.decimals) ) ) );
-    int24 _lowerTick = TickMath.getTickAtSqrtRatio( uint160( 2**48 * sqrt( (2 ** 96 * (10 ** TOKEN1.decimals)) * 1e10 / (uint256(endX10  ) * 10 ** TOKEN0.decimals) ) ) );
+    int24 _upperTick = TickMath.getTickAtSqrtRatio( Sqrt.rangeSqrtPriceX96(startX10, TOKEN0.decimals, TOKEN1.decimals) );
+    int24 _lowerTick = TickMath.getTickAtSqrtRatio( Sqrt.rangeSqrtPriceX96(endX10,   TOKEN0.decimals, TOKEN1.decimals) );
     
+    uint24 _feeTier = 5;
     if (isTicker) { 
-      feeTier   = 5;
       int24 midleTick;
       midleTick = (_upperTick + _lowerTick) / 2;
-      _upperTick = (midleTick + int24(feeTier)) - (midleTick + int24(feeTier)) % int24(feeTier * 2);
-      _lowerTick = _upperTick - int24(feeTier) - int24(feeTier);
+      _upperTick = (midleTick + int24(_feeTier)) - (midleTick + int24(_feeTier)) % int24(_feeTier * 2);
+      _lowerTick = _upperTick - int24(_feeTier) - int24(_feeTier);
       _name     = string(abi.encodePacked("Ticker ", baseSymbol, " ", quoteSymbol, " ", startName, "-", endName));
      _symbol    = string(abi.encodePacked("T-",startName,"_",endName,"-",baseSymbol,"-",quoteSymbol));
     } else {
-      feeTier   = 5;
-      _lowerTick = (_lowerTick + int24(feeTier)) - (_lowerTick + int24(feeTier)) % int24(feeTier * 2);
-      _upperTick = (_upperTick + int24(feeTier)) - (_upperTick + int24(feeTier)) % int24(feeTier * 2);
+      _lowerTick = (_lowerTick + int24(_feeTier)) - (_lowerTick + int24(_feeTier)) % int24(_feeTier * 2);
+      _upperTick = (_upperTick + int24(_feeTier)) - (_upperTick + int24(_feeTier)) % int24(_feeTier * 2);
       _name     = string(abi.encodePacked("Ranger ", baseSymbol, " ", quoteSymbol, " ", startName, "-", endName));
       _symbol   = string(abi.encodePacked("R-",startName,"_",endName,"-",baseSymbol,"-",quoteSymbol));
     }
-    lowerTick = _lowerTick;
-    upperTick = _upperTick;
+    // Never initialized proxies have empty V1 slots, so they start in the packed layout
+    range = RangeState(_lowerTick, _upperTick, _feeTier, ProxyState.INIT_LP, TOKEN0.decimals, TOKEN1.decimals, true, 0);
+    cacheRangeParameters();
     emit InitTR(address(asset0), address(asset1), startX10, endX10);
   }
   
 
+  /// @notice Store the Uniswap pool and range sqrt prices, for proxies initialized before they were cached
+  /// @dev Values only depend on the range parameters, so anyone can fill them once
+  function cacheRangeParameters() public {
+    RangeState memory r = loadRange();
+    require(r.status != ProxyState.INIT_PROXY, "!InitProxy");
+    require(address(pool) == address(0x0), "TR: Already Cached");
+    pool = IUniswapV3Pool(V3_FACTORY.getPool(address(TOKEN0.token), address(TOKEN1.token), r.feeTier * 100));
+    sqrtRatioLowerX96 = TickMath.getSqrtRatioAtTick(r.lowerTick);
+    sqrtRatioUpperX96 = TickMath.getSqrtRatioAtTick(r.upperTick);
+  }
+  
+  
+  /// @notice Get the Uniswap pool, cached if possible
+  function getPool() internal view returns (IUniswapV3Pool _pool) {
+    _pool = pool;
+    if (address(_pool) == address(0x0)) _pool = IUniswapV3Pool(V3_FACTORY.getPool(address(TOKEN0.token), address(TOKEN1.token), loadRange().feeTier * 100));
+  }
+  
+  
+  /// @notice Get the range sqrt prices, cached if possible
+  function getSqrtRatios() internal view returns (uint160 sqrtRatioAX96, uint160 sqrtRatioBX96) {
+    (sqrtRatioAX96, sqrtRatioBX96) = (sqrtRatioLowerX96, sqrtRatioUpperX96);
+    if (sqrtRatioAX96 == 0) {
+      RangeState memory r = loadRange();
+      (sqrtRatioAX96, sqrtRatioBX96) = (TickMath.getSqrtRatioAtTick(r.lowerTick), TickMath.getSqrtRatioAtTick(r.upperTick));
+    }
+  }
+  
+  
+  /// @notice Move the V1 storage to the packed layout
+  /// @dev State changing functions migrate lazily, anyone can call this to migrate ahead of time
+  function migrate() public {
+    if (range.migrated) return;
+    range = loadRange();
+    range.migrated = true;
+    fees = Fees(fee0_legacy.toUint128(), fee1_legacy.toUint128());
+    // Clear the V1 slots, the refunds pay for part of the migration
+    (lowerTick_legacy, upperTick_legacy, feeTier_legacy) = (0, 0, 0);
+    (fee0_legacy, fee1_legacy, liquidity_legacy) = (0, 0, 0);
+    emit Migrate();
+  }
+  
+  
+  /// @notice Get the hot range fields, from the V1 storage until the proxy is migrated
+  function loadRange() internal view returns (RangeState memory r) {
+    r = range;
+    if (!r.migrated) r = RangeState(lowerTick_legacy, upperTick_legacy, feeTier_legacy, status_legacy, TOKEN0.decimals, TOKEN1.decimals, false, liquidity_legacy);
+  }
+  
+  
+  /// @notice Get the uncompounded fees, from the V1 storage until the proxy is migrated
+  function loadFees() internal view returns (uint _fee0, uint _fee1) {
+    if (!range.migrated) return (fee0_legacy, fee1_legacy);
+    Fees memory f = fees;
+    (_fee0, _fee1) = (f.fee0, f.fee1);
+  }
+  
+  
+  /// @notice Range lower tick
+  function lowerTick() external view returns (int24) { return loadRange().lowerTick; }
+  /// @notice Range upper tick
+  function upperTick() external view returns (int24) { return loadRange().upperTick; }
+  /// @notice Uniswap fee tier, in bips
+  function feeTier() external view returns (uint24) { return loadRange().feeTier; }
+  /// @notice Initialization status
+  function status() external view returns (ProxyState) { return loadRange().status; }
+  /// @notice Liquidity of the Uniswap position
+  function liquidity() external view returns (uint128) { return loadRange().liquidity; }
+  /// @notice Uncompounded quote token fees
+  function fee0() external view returns (uint _fee0) { (_fee0, ) = loadFees(); }
+  /// @notice Uncompounded base token fees
+  function fee1() external view returns (uint _fee1) { (, _fee1) = loadFees(); }
+
+
+  /// @notice Set the price cache max age
+  /// @param maxAge Number of blocks during which the cached price is valid, 0 disables the cache
+  function setPriceCacheAge(uint maxAge) external {
+    require(msg.sender == creator, "Unallowed call");
+    priceCacheMaxAge = maxAge;
+    delete priceCache;
+    updatePriceCache();
+    emit SetPriceCacheAge(maxAge);
+  }
+  
+  
+  /// @notice Set the lazy harvesting thresholds
+  /// @param interval Min number of seconds between harvests on deposit, 0 to ignore
+  /// @param minValueX8 Value of pending fees above which deposits harvest, 0 to ignore
+  /// @dev Thresholds apply independently, deposits harvest every time if both are 0
+  function setHarvestThresholds(uint interval, uint minValueX8) external {
+    require(msg.sender == creator, "Unallowed call");
+    harvestInterval = interval;
+    harvestMinValueX8 = minValueX8;
+    emit SetHarvestThresholds(interval, minValueX8);
+  }
+  
+  
+  /// @notice Refresh the cached price, for keepers
+  function poke() external {
+    require(priceCacheMaxAge > 0, "TR: Price Cache Disabled");
+    updatePriceCache();
+  }
+  
+  
+  /// @notice Store the current LP price if the price cache is enabled
+  function updatePriceCache() internal {
+    if (priceCacheMaxAge == 0) return;
+    uint token0Price = ORACLE.getAssetPrice(address(TOKEN0.token));
+    uint token1Price = ORACLE.getAssetPrice(address(TOKEN1.token));
+    priceCache = PriceCache(uint128(getValuePerLPAtPrice(token0Price, token1Price)), uint64(block.number), uint128(token0Price), uint128(token1Price));
+  }
+
+
+  /// @notice Approve the Uniswap position manager for both tokens, once
+  function approvePositionManager() internal {
+    Approvals.approveOnce(approved, address(TOKEN0.token), address(POS_MGR));
+    Approvals.approveOnce(approved, address(TOKEN1.token), address(POS_MGR));
+  }
+
+
   /// @notice Get the name of this contract token
   /// @dev Override name, symbol and decimals from ERC20 inheritance
   function name()     public view virtual override returns (string memory) { return _name; }
@@ -132,20 +292,21 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
   /// @param n1 Amount of base token added
   /// @notice The token amounts must be 95% correct or this will fail the Uniswap slippage check
   function init(uint n0, uint n1) external {
-    require(status == ProxyState.INIT_LP, "!InitLP");
+    migrate();
+    RangeState memory r = range;
+    require(r.status == ProxyState.INIT_LP, "!InitLP");
     require(msg.sender == creator, "Unallowed call");
-    status = ProxyState.READY;
+    range.status = ProxyState.READY;
     TOKEN0.token.safeTransferFrom(msg.sender, address(this), n0);
     TOKEN1.token.safeTransferFrom(msg.sender, address(this), n1);
-    TOKEN0.token.safeIncreaseAllowance(address(POS_MGR), n0);
-    TOKEN1.token.safeIncreaseAllowance(address(POS_MGR), n1);
-    (tokenId, liquidity, , ) = POS_MGR.mint( 
+    approvePositionManager();
+    (tokenId, range.liquidity, , ) = POS_MGR.mint( 
       INonfungiblePositionManager.MintParams({
          token0: address(TOKEN0.token),
          token1: address(TOKEN1.token),
-         fee: feeTier * 100,
-         tickLower: lowerTick,
-         tickUpper: upperTick,
+         fee: r.feeTier * 100,
+         tickLower: r.lowerTick,
+         tickUpper: r.upperTick,
          amount0Desired: n0,
          amount1Desired: n1,
          amount0Min: n0 * 95 / 100,
@@ -159,12 +320,16 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
     TOKEN0.token.safeTransfer( msg.sender,  TOKEN0.token.balanceOf(address(this)));
     TOKEN1.token.safeTransfer(msg.sender, TOKEN1.token.balanceOf(address(this)));
     _mint(msg.sender, 1e18);
+    updatePriceCache();
     emit Deposit(msg.sender, 1e18);
   }
   
   
   /// @notice Claim the accumulated Uniswap V3 trading fees
   function claimFee() public {
+    migrate();
+    // lastHarvest is only used by lazy harvesting, spare the write otherwise
+    if (harvestInterval > 0 || harvestMinValueX8 > 0) lastHarvest = block.timestamp;
     (uint256 newFee0, uint256 newFee1) = POS_MGR.collect( 
       INonfungiblePositionManager.CollectParams({
         tokenId: tokenId,
@@ -180,21 +345,19 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
     if (tf0 > 0) TOKEN0.token.safeTransfer(treasury, tf0);
     if (tf1 > 0) TOKEN1.token.safeTransfer(treasury, tf1);
     
-    fee0 = fee0 + newFee0 - tf0;
-    fee1 = fee1 + newFee1 - tf1;
+    fees = Fees((fees.fee0 + newFee0 - tf0).toUint128(), (fees.fee1 + newFee1 - tf1).toUint128());
     
     // Calculate expected balance,  
     (uint256 bal0, uint256 bal1) = returnExpectedBalanceWithoutFees(0, 0);
     
     // If accumulated more than 1% worth of fees, compound by adding fees to Uniswap position
-    if ((fee0 * 100 > bal0 ) && (fee1 * 100 > bal1)) { 
-      TOKEN0.token.safeIncreaseAllowance(address(POS_MGR), fee0);
-      TOKEN1.token.safeIncreaseAllowance(address(POS_MGR), fee1);
+    if ((uint(fees.fee0) * 100 > bal0 ) && (uint(fees.fee1) * 100 > bal1)) { 
+      approvePositionManager();
       (uint128 newLiquidity, uint256 added0, uint256 added1) = POS_MGR.increaseLiquidity(
         INonfungiblePositionManager.IncreaseLiquidityParams({
           tokenId: tokenId,
-          amount0Desired: fee0,
-          amount1Desired: fee1,
+          amount0Desired: fees.fee0,
+          amount1Desired: fees.fee1,
           amount0Min: 0,
           amount1Min: 0,
           deadline: block.timestamp
@@ -205,12 +368,12 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
       uint token1Price = ORACLE.getAssetPrice(address(TOKEN1.token));
       uint addedValue = added0 * token0Price / 10**TOKEN0.decimals + added1 * token1Price / 10**TOKEN1.decimals;
       uint totalValue =   bal0 * token0Price / 10**TOKEN0.decimals +   bal1 * token1Price / 10**TOKEN1.decimals;
-      uint liquidityValue = totalValue * newLiquidity / liquidity;
+      uint liquidityValue = totalValue * newLiquidity / range.liquidity;
       require(addedValue > liquidityValue * 95 / 100 && liquidityValue > addedValue * 95 / 100, "TR: Claim Fee Slippage");
-      fee0 -= added0;
-      fee1 -= added1;
-      liquidity = liquidity + newLiquidity;
+      fees = Fees(fees.fee0 - uint128(added0), fees.fee1 - uint128(added1));
+      range.liquidity = range.liquidity + newLiquidity;
     }
+    updatePriceCache();
     emit ClaimFees(newFee0, newFee1);
   }
   
@@ -224,7 +387,8 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
     // Prevents TR oracle values from being too manipulatable by emptying the range and redepositing 
     require(totalSupply() > 0, "TR Closed"); 
     
-    claimFee();
+    migrate();
+    (uint accFee0, uint accFee1) = harvestOrGetAccruedFees();
     TOKEN0.token.transferFrom(msg.sender, address(this), n0);
     TOKEN1.token.transferFrom(msg.sender, address(this), n1);
     
@@ -234,20 +398,14 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
     // Cannot repay only one side, if fees are both 0, or if one side is missing, skip adding fees here
       // if ( fee0+fee1 == 0 || (n0 == 0 && fee0 > 0) || (n1 == 0 && fee1 > 0) ) skip  
       // DeMorgan: !( (n0 == 0 && fee0 > 0) || (n1 == 0 && fee1 > 0) ) = !(n0 == 0 && fee0 > 0) && !(n0 == 0 && fee1 > 0)
-    if ( fee0+fee1 > 0 && ( n0 > 0 || fee0 == 0) && ( n1 > 0 || fee1 == 0 ) ){
-      address pool = V3_FACTORY.getPool(address(TOKEN0.token), address(TOKEN1.token), feeTier * 100);
-      (uint160 sqrtPriceX96,,,,,,)  = IUniswapV3Pool(pool).slot0();
-      (uint256 token0Amount, uint256 token1Amount) = LiquidityAmounts.getAmountsForLiquidity( sqrtPriceX96, TickMath.getSqrtRatioAtTick(lowerTick), TickMath.getSqrtRatioAtTick(upperTick), liquidity);
-      if (token0Amount + fee0 > 0) newFee0 = n0 * fee0 / (token0Amount + fee0);
-      if (token1Amount + fee1 > 0) newFee1 = n1 * fee1 / (token1Amount + fee1);
-      fee0 += newFee0;
-      fee1 += newFee1; 
+    if ( accFee0+accFee1 > 0 && ( n0 > 0 || accFee0 == 0) && ( n1 > 0 || accFee1 == 0 ) ){
+      (newFee0, newFee1) = getDepositFeeShare(n0, n1, accFee0, accFee1);
+      fees = Fees((fees.fee0 + newFee0).toUint128(), (fees.fee1 + newFee1).toUint128());
       n0   -= newFee0;
       n1   -= newFee1;
     }
 
-    TOKEN0.token.safeIncreaseAllowance(address(POS_MGR), n0);
-    TOKEN1.token.safeIncreaseAllowance(address(POS_MGR), n1);
+    approvePositionManager();
 
     // New liquidity is indeed the amount of liquidity added, not the total, despite being unclear in Uniswap doc
     (uint128 newLiquidity, uint256 added0, uint256 added1) = POS_MGR.increaseLiquidity(
@@ -271,27 +429,99 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
       require (TOKEN0_PRICE > 0 && TOKEN1_PRICE > 0, "Invalid Oracle Price");
       // Calculate the equivalent liquidity amount of the non-yet compounded fees
       // Assume linearity for liquidity in same tick range; calculate feeLiquidity equivalent and consider it part of base liquidity 
-      feeLiquidity = newLiquidity * ( (fee0 * TOKEN0_PRICE / 10 ** TOKEN0.decimals) + (fee1 * TOKEN1_PRICE / 10 ** TOKEN1.decimals) )   
+      feeLiquidity = newLiquidity * ( (accFee0 * TOKEN0_PRICE / 10 ** TOKEN0.decimals) + (accFee1 * TOKEN1_PRICE / 10 ** TOKEN1.decimals) )   
                                     / ( (added0   * TOKEN0_PRICE / 10 ** TOKEN0.decimals) + (added1   * TOKEN1_PRICE / 10 ** TOKEN1.decimals) ); 
     }
                                      
-    lpAmt = totalSupply() * newLiquidity / (liquidity + feeLiquidity); 
-    liquidity = liquidity + newLiquidity;
+    lpAmt = totalSupply() * newLiquidity / (range.liquidity + feeLiquidity); 
+    range.liquidity = range.liquidity + newLiquidity;
     
     _mint(msg.sender, lpAmt);
     TOKEN0.token.safeTransfer( msg.sender, n0 - added0);
     TOKEN1.token.safeTransfer( msg.sender, n1 - added1);
+    updatePriceCache();
     emit Deposit(msg.sender, lpAmt);
   }
   
   
+  /// @notice Proportion of a deposit that goes to the fee pool, so that the deposit matches the range composition
+  /// @param n0 Amount of quote asset
+  /// @param n1 Amount of base asset
+  /// @param accFee0 Accrued quote asset fees
+  /// @param accFee1 Accrued base asset fees
+  function getDepositFeeShare(uint n0, uint n1, uint accFee0, uint accFee1) internal view returns (uint newFee0, uint newFee1) {
+    (uint160 sqrtPriceX96,,,,,,)  = getPool().slot0();
+    (uint160 sqrtRatioAX96, uint160 sqrtRatioBX96) = getSqrtRatios();
+    (uint256 token0Amount, uint256 token1Amount) = LiquidityAmounts.getAmountsForLiquidity( sqrtPriceX96, sqrtRatioAX96, sqrtRatioBX96, range.liquidity);
+    if (token0Amount + accFee0 > 0) newFee0 = n0 * accFee0 / (token0Amount + accFee0);
+    if (token1Amount + accFee1 > 0) newFee1 = n1 * accFee1 / (token1Amount + accFee1);
+  }
+  
+  
+  /// @notice Claim fees if a harvest is due, otherwise account for the fees still pending in the Uniswap position
+  /// @return accFee0 Quote asset fees owned by the range, collected or not
+  /// @return accFee1 Base asset fees owned by the range, collected or not
+  function harvestOrGetAccruedFees() internal returns (uint accFee0, uint accFee1) {
+    (uint interval, uint minValueX8) = (harvestInterval, harvestMinValueX8);
+    if ((interval == 0 && minValueX8 == 0) || (interval > 0 && block.timestamp >= lastHarvest + interval)) {
+      claimFee();
+      return loadFees();
+    }
+    (uint pending0, uint pending1) = getPendingFees();
+    // oracle is only read for a value threshold
+    if (minValueX8 > 0) {
+      uint pendingValue = pending0 * ORACLE.getAssetPrice(address(TOKEN0.token)) / 10**TOKEN0.decimals 
+                        + pending1 * ORACLE.getAssetPrice(address(TOKEN1.token)) / 10**TOKEN1.decimals;
+      if (pendingValue >= minValueX8) {
+        claimFee();
+        return loadFees();
+      }
+    }
+    (accFee0, accFee1) = loadFees();
+    (accFee0, accFee1) = (accFee0 + pending0, accFee1 + pending1);
+  }
+  
+  
+  /// @notice Uniswap fees accrued in the position and not collected yet, net of the treasury fee
+  /// @dev Same as the amounts POS_MGR.collect would return, from tokensOwed and the pool fee growth since the last update
+  function getPendingFees() public view returns (uint pending0, uint pending1) {
+    (,,,,,,, uint128 positionLiquidity, uint feeGrowthInside0LastX128, uint feeGrowthInside1LastX128, uint128 tokensOwed0, uint128 tokensOwed1) = POS_MGR.positions(tokenId);
+    (uint feeGrowthInside0X128, uint feeGrowthInside1X128) = getFeeGrowthInside();
+    unchecked {
+      pending0 = tokensOwed0 + FullMath.mulDiv(feeGrowthInside0X128 - feeGrowthInside0LastX128, positionLiquidity, 2**128);
+      pending1 = tokensOwed1 + FullMath.mulDiv(feeGrowthInside1X128 - feeGrowthInside1LastX128, positionLiquidity, 2**128);
+    }
+    pending0 -= pending0 * treasuryFee / 100;
+    pending1 -= pending1 * treasuryFee / 100;
+  }
+  
+  
+  /// @notice Pool fee growth inside the range, as computed by the Uniswap pool
+  /// @dev Fee growth values are allowed to overflow, like in Uniswap
+  function getFeeGrowthInside() internal view returns (uint feeGrowthInside0X128, uint feeGrowthInside1X128) {
+    IUniswapV3Pool _pool = getPool();
+    (, int24 tickCurrent,,,,,) = _pool.slot0();
+    RangeState memory r = loadRange();
+    (,, uint lower0, uint lower1,,,,) = _pool.ticks(r.lowerTick);
+    (,, uint upper0, uint upper1,,,,) = _pool.ticks(r.upperTick);
+    unchecked {
+      if (tickCurrent < r.lowerTick) 
+        (feeGrowthInside0X128, feeGrowthInside1X128) = (lower0 - upper0, lower1 - upper1);
+      else if (tickCurrent >= r.upperTick) 
+        (feeGrowthInside0X128, feeGrowthInside1X128) = (upper0 - lower0, upper1 - lower1);
+      else
+        (feeGrowthInside0X128, feeGrowthInside1X128) = (_pool.feeGrowthGlobal0X128() - lower0 - upper0, _pool.feeGrowthGlobal1X128() - lower1 - upper1);
+    }
+  }
+  
+  
   /// @notice Withdraw assets from a range
   /// @param lp Amount of tokens withdrawn
   /// @param amount0Min Minimum amount of quote token withdrawn
   /// @param amount1Min Minimum amount of base token withdrawn
   function withdraw(uint256 lp, uint256 amount0Min, uint256 amount1Min) external nonReentrant returns (uint256 removed0, uint256 removed1) {
     claimFee();
-    uint removedLiquidity = uint(liquidity) * lp / totalSupply();
+    uint removedLiquidity = uint(range.liquidity) * lp / totalSupply();
     (removed0, removed1) = POS_MGR.decreaseLiquidity(
       INonfungiblePositionManager.DecreaseLiquidityParams({
         tokenId: tokenId,
@@ -301,7 +531,7 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
         deadline: block.timestamp
       })
     );
-    liquidity = uint128(uint256(liquidity) - removedLiquidity); 
+    range.liquidity = uint128(uint256(range.liquidity) - removedLiquidity); 
     
     POS_MGR.collect( 
       INonfungiblePositionManager.CollectParams({
@@ -312,17 +542,20 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
       })
     );
     // Handle uncompounded fees
-    if (fee0 > 0) {
-      TOKEN0.token.safeTransfer( msg.sender, fee0 * lp / totalSupply());
-      removed0 += fee0 * lp / totalSupply();
-      fee0 -= fee0 * lp / totalSupply();
+    (uint _fee0, uint _fee1) = loadFees();
+    if (_fee0 > 0) {
+      TOKEN0.token.safeTransfer( msg.sender, _fee0 * lp / totalSupply());
+      removed0 += _fee0 * lp / totalSupply();
+      _fee0 -= _fee0 * lp / totalSupply();
     } 
-    if (fee1 > 0) {
-      TOKEN1.token.safeTransfer(  msg.sender, fee1 * lp / totalSupply());
-      removed1 += fee1 * lp / totalSupply();
-      fee1 -= fee1 * lp / totalSupply();
+    if (_fee1 > 0) {
+      TOKEN1.token.safeTransfer(  msg.sender, _fee1 * lp / totalSupply());
+      removed1 += _fee1 * lp / totalSupply();
+      _fee1 -= _fee1 * lp / totalSupply();
     }
+    fees = Fees(uint128(_fee0), uint128(_fee1));
     _burn(msg.sender, lp);
+    updatePriceCache();
     emit Withdraw(msg.sender, lp);
   }
   
@@ -335,15 +568,18 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
     if (TOKEN0_PRICE == 0) TOKEN0_PRICE = ORACLE.getAssetPrice(address(TOKEN0.token));
     if (TOKEN1_PRICE == 0) TOKEN1_PRICE = ORACLE.getAssetPrice(address(TOKEN1.token));
 
-    (amt0, amt1) = LiquidityAmounts.getAmountsForLiquidity( uint160( sqrt( (2 ** 192 * ((TOKEN0_PRICE * 10 ** TOKEN1.decimals) / TOKEN1_PRICE)) / ( 10 ** TOKEN0.decimals ) ) ), TickMath.getSqrtRatioAtTick(lowerTick), TickMath.getSqrtRatioAtTick(upperTick),  liquidity);
+    RangeState memory r = loadRange();
+    (uint160 sqrtRatioAX96, uint160 sqrtRatioBX96) = getSqrtRatios();
+    (amt0, amt1) = LiquidityAmounts.getAmountsForLiquidity( Sqrt.oracleSqrtPriceX96(TOKEN0_PRICE, TOKEN1_PRICE, r.decimals0, r.decimals1), sqrtRatioAX96, sqrtRatioBX96,  r.liquidity);
   }
     
     
   /// @notice Calculate the balance of underlying assets based on the assets price, excluding fees
   function returnExpectedBalance(uint TOKEN0_PRICE, uint TOKEN1_PRICE) public view returns (uint256 amt0, uint256 amt1) {
     (amt0, amt1) = returnExpectedBalanceWithoutFees(TOKEN0_PRICE, TOKEN1_PRICE);
-    amt0 += fee0;
-    amt1 += fee1;
+    (uint _fee0, uint _fee1) = loadFees();
+    amt0 += _fee0;
+    amt1 += _fee1;
   }
 
   /// @notice Return the price of LP tokens based on the underlying assets price
@@ -352,23 +588,30 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
   function getValuePerLPAtPrice(uint TOKEN0_PRICE, uint TOKEN1_PRICE) public view returns (uint256 priceX1e8) {
     if ( totalSupply() == 0 ) return 0;
     (uint256 amt0, uint256 amt1) = returnExpectedBalance(TOKEN0_PRICE, TOKEN1_PRICE);
-    uint totalValue = TOKEN0_PRICE * amt0 / (10 ** TOKEN0.decimals) + amt1 * TOKEN1_PRICE / (10 ** TOKEN1.decimals);
+    RangeState memory r = loadRange();
+    uint totalValue = TOKEN0_PRICE * amt0 / (10 ** r.decimals0) + amt1 * TOKEN1_PRICE / (10 ** r.decimals1);
     return totalValue * 1e18 / totalSupply();
   } 
 
   
   /// @notice Return the price of the LP token
+  /// @dev Serves the cached price if it is recent enough and was computed from the current oracle prices
   function latestAnswer() public view returns (uint256 priceX1e8) {
-    return getValuePerLPAtPrice(ORACLE.getAssetPrice(address(TOKEN0.token)), ORACLE.getAssetPrice(address(TOKEN1.token)));
+    uint token0Price = ORACLE.getAssetPrice(address(TOKEN0.token));
+    uint token1Price = ORACLE.getAssetPrice(address(TOKEN1.token));
+    PriceCache memory cache = priceCache;
+    if (block.number <= cache.blockNumber + priceCacheMaxAge && cache.token0Price == token0Price && cache.token1Price == token1Price) 
+      return cache.priceX8;
+    return getValuePerLPAtPrice(token0Price, token1Price);
   }
   
   
   /// @notice Return the underlying tokens amounts for a given TR balance excluding the fees
   /// @param amount Amount of tokens we want the underlying amounts for
   function getTokenAmountsExcludingFees(uint amount) public view returns (uint token0Amount, uint token1Amount){
-    address pool = V3_FACTORY.getPool(address(TOKEN0.token), address(TOKEN1.token), feeTier * 100);
-    (uint160 sqrtPriceX96,,,,,,)  = IUniswapV3Pool(pool).slot0();
-    (token0Amount, token1Amount) = LiquidityAmounts.getAmountsForLiquidity( sqrtPriceX96, TickMath.getSqrtRatioAtTick(lowerTick), TickMath.getSqrtRatioAtTick(upperTick),  uint128 ( uint(liquidity) * amount / totalSupply() ) );
+    (uint160 sqrtPriceX96,,,,,,)  = getPool().slot0();
+    (uint160 sqrtRatioAX96, uint160 sqrtRatioBX96) = getSqrtRatios();
+    (token0Amount, token1Amount) = LiquidityAmounts.getAmountsForLiquidity( sqrtPriceX96, sqrtRatioAX96, sqrtRatioBX96,  uint128 ( uint(loadRange().liquidity) * amount / totalSupply() ) );
   }  
   
   
@@ -376,8 +619,9 @@ contract TokenisableRange is ERC20("", ""), ReentrancyGuard {
   /// @param amount Amount of tokens we want the underlying amounts for
   function getTokenAmounts(uint amount) external view returns (uint token0Amount, uint token1Amount){
     (token0Amount, token1Amount) = getTokenAmountsExcludingFees(amount);
-    token0Amount += fee0 * amount / totalSupply();
-    token1Amount += fee1 * amount / totalSupply();
+    (uint _fee0, uint _fee1) = loadFees();
+    token0Amount += _fee0 * amount / totalSupply();
+    token1Amount += _fee1 * amount / totalSupply();
   }
 
 }
\ No newline at end of file
@@ -2,6 +2,7 @@
 pragma solidity 0.8.19;
 
 import "../../interfaces/AggregatorV3Interface.sol";
+import "../lib/Sqrt.sol";
 
 interface UniswapV2Pair {
   function totalSupply() external view returns (uint);
@@ -39,17 +40,6 @@ contract LPOracle {
     return 8;
   }
 
-  /// @notice Calculate a square root 
-  /// @param y Square root variable
-  function sqrt(uint x) internal pure returns (uint y) {
-    uint z = (x + 1) / 2;
-    y = x;
-    while (z < y) {
-      y = z;
-      z = (x / z + z) / 2;
-    }
-  }
-
   /// @notice Get the price for the latest available round of a feed
   /// @param priceFeed Price feed
   /// @return Latest price
@@ -87,9 +77,9 @@ contract LPOracle {
     // Code below attempts to relief some common overflow potential
     uint norm_b;
     if (decimalsB >= decimalsA) {
-      norm_b = sqrt( a * b * priceA * 10**(decimalsB-decimalsA) / priceB );
+      norm_b = Sqrt.sqrt( a * b * priceA * 10**(decimalsB-decimalsA) / priceB );
     } else {
-      norm_b = sqrt( a * b * priceA / 10**(decimalsA-decimalsB) / priceB );
+      norm_b = Sqrt.sqrt( a * b * priceA / 10**(decimalsA-decimalsB) / priceB );
     }
     uint norm_a = a * b / norm_b;
 
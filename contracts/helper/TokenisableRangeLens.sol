@@ -0,0 +1,78 @@
+// SPDX-License-Identifier: UNLICENSED
+pragma solidity 0.8.19;
+
+import "../../interfaces/IAaveLendingPoolV2.sol";
+import "../openzeppelin-solidity/contracts/token/ERC20/ERC20.sol";
+import "../TokenisableRange.sol";
+import "../RangeManager.sol";
+
+
+/// @notice Read the state of many TokenisableRanges and of their lending pool reserves in a single call
+/// @dev Read only, meant for eth_call from dashboards and keepers
+contract TokenisableRangeLens {
+  struct RangeData {
+    address range;
+    address token0;
+    address token1;
+    int24 lowerTick;
+    int24 upperTick;
+    uint128 liquidity;
+    uint totalSupply;
+    uint fee0;
+    uint fee1;
+    // underlying amounts of the whole supply, including fees
+    uint amount0;
+    uint amount1;
+    uint latestAnswer;
+    address aToken;
+    address debtToken;
+    uint aTokenSupply;
+    uint debtTokenSupply;
+  }
+
+
+  /// @notice Get the state of a list of ranges
+  /// @param lendingPool Lending pool where the ranges are listed, reserve fields are left empty for ranges that aren't
+  /// @param ranges Ranges addresses
+  function getRangesData(ILendingPool lendingPool, TokenisableRange[] memory ranges) public view returns (RangeData[] memory data) {
+    data = new RangeData[](ranges.length);
+    for (uint k = 0; k < ranges.length; k++) data[k] = getRangeData(lendingPool, ranges[k]);
+  }
+
+
+  /// @notice Get the state of all the ranges and tickers of a RangeManager
+  /// @param rangeManager Range manager
+  /// @return data Ranges data, followed by the tickers data, in step order
+  function getRangeManagerData(RangeManager rangeManager) external view returns (RangeData[] memory data) {
+    uint length = rangeManager.getStepListLength();
+    TokenisableRange[] memory ranges = new TokenisableRange[](2 * length);
+    for (uint k = 0; k < length; k++) {
+      ranges[k] = rangeManager.tokenisedRanges(k);
+      ranges[length + k] = rangeManager.tokenisedTicker(k);
+    }
+    data = getRangesData(rangeManager.LENDING_POOL(), ranges);
+  }
+
+
+  /// @notice Get the state of a range
+  /// @dev Price dependent values are 0 if the pool or the oracle call fails, so that a broken range doesn't hide the others
+  function getRangeData(ILendingPool lendingPool, TokenisableRange t) public view returns (RangeData memory d) {
+    d.range = address(t);
+    (ERC20 token0, ) = t.TOKEN0();
+    (ERC20 token1, ) = t.TOKEN1();
+    (d.token0, d.token1) = (address(token0), address(token1));
+    (d.lowerTick, d.upperTick) = (t.lowerTick(), t.upperTick());
+    d.liquidity = t.liquidity();
+    d.totalSupply = t.totalSupply();
+    (d.fee0, d.fee1) = (t.fee0(), t.fee1());
+    if (d.totalSupply > 0) {
+      try t.getTokenAmounts(d.totalSupply) returns (uint amount0, uint amount1) { (d.amount0, d.amount1) = (amount0, amount1); } catch {}
+    }
+    try t.latestAnswer() returns (uint price) { d.latestAnswer = price; } catch {}
+
+    DataTypes.ReserveData memory reserve = lendingPool.getReserveData(address(t));
+    (d.aToken, d.debtToken) = (reserve.aTokenAddress, reserve.variableDebtTokenAddress);
+    if (d.aToken != address(0x0)) d.aTokenSupply = ERC20(d.aToken).totalSupply();
+    if (d.debtToken != address(0x0)) d.debtTokenSupply = ERC20(d.debtToken).totalSupply();
+  }
+}
@@ -0,0 +1,24 @@
+// SPDX-License-Identifier: UNLICENSED
+pragma solidity 0.8.19;
+
+import "../openzeppelin-solidity/contracts/token/ERC20/ERC20.sol";
+import "../openzeppelin-solidity/contracts/token/ERC20/utils/SafeERC20.sol";
+
+
+/// @notice One time max approvals, remembered in the caller storage
+/// @dev Once a (token, spender) pair is approved, later calls only read the caller storage: no allowance call and no SSTORE
+library Approvals {
+  using SafeERC20 for ERC20;
+
+  /// @notice Approve spender for the max amount of token, unless it was already done
+  /// @param approved Caller storage of the approved pairs, token => spender => approved
+  /// @param token Token to approve
+  /// @param spender Spender
+  function approveOnce(mapping(address => mapping(address => bool)) storage approved, address token, address spender) internal {
+    if (approved[token][spender]) return;
+    // safeApprove only sets allowances from 0, clear what is left of previous exact approvals
+    if (ERC20(token).allowance(address(this), spender) > 0) ERC20(token).safeApprove(spender, 0);
+    ERC20(token).safeApprove(spender, type(uint256).max);
+    approved[token][spender] = true;
+  }
+}
@@ -0,0 +1,54 @@
+// SPDX-License-Identifier: UNLICENSED
+pragma solidity 0.8.19;
+
+import "../../interfaces/IAaveLendingPoolV2.sol";
+
+
+/// @notice Lending pool reserve token addresses, remembered in the caller storage
+/// @dev Reserve tokens don't change once an asset is listed: read them from storage instead of decoding getReserveData on every call
+library ReserveTokens {
+  struct Tokens {
+    address aToken;
+    address debtToken;
+  }
+
+
+  /// @notice Reserve tokens of an asset, from the cache or else from the lending pool
+  /// @param cache Caller storage of the reserve tokens, asset => tokens
+  /// @param lp Lending pool
+  /// @param asset Reserve asset
+  function get(mapping(address => Tokens) storage cache, ILendingPool lp, address asset) internal view returns (Tokens memory tokens) {
+    tokens = cache[asset];
+    if (tokens.aToken == address(0x0)) tokens = load(lp, asset);
+  }
+
+
+  /// @notice Reserve tokens of an asset, cached on first use if the asset is listed
+  /// @param cache Caller storage of the reserve tokens, asset => tokens
+  /// @param lp Lending pool
+  /// @param asset Reserve asset
+  function getOrCache(mapping(address => Tokens) storage cache, ILendingPool lp, address asset) internal returns (Tokens memory tokens) {
+    tokens = cache[asset];
+    if (tokens.aToken == address(0x0)) {
+      tokens = load(lp, asset);
+      if (tokens.aToken != address(0x0)) cache[asset] = tokens;
+    }
+  }
+
+
+  /// @notice Overwrite the cached reserve tokens of an asset with the lending pool ones, cleared if the asset isn't listed
+  /// @param cache Caller storage of the reserve tokens, asset => tokens
+  /// @param lp Lending pool
+  /// @param asset Reserve asset
+  function sync(mapping(address => Tokens) storage cache, ILendingPool lp, address asset) internal returns (Tokens memory tokens) {
+    tokens = load(lp, asset);
+    if (tokens.aToken != address(0x0)) cache[asset] = tokens;
+    else delete cache[asset];
+  }
+
+
+  function load(ILendingPool lp, address asset) private view returns (Tokens memory tokens) {
+    DataTypes.ReserveData memory reserve = lp.getReserveData(asset);
+    tokens = Tokens(reserve.aTokenAddress, reserve.variableDebtTokenAddress);
+  }
+}
@@ -1,16 +1,74 @@
 // SPDX-License-Identifier: GPL-3.0
 pragma solidity 0.8.19;
 
-/// @title Sqrt function
+/// @title Sqrt function and the price conversions built on it
 library Sqrt {
-  /// @notice Babylonian method for sqrt
+  /// @notice Integer square root, rounded down
   /// @param x sqrt parameter
-  function sqrt(uint x) internal pure returns (uint y) {
-      uint z = (x + 1) / 2;
-      y = x;
-      while (z < y) {
-          y = z;
-          z = (x / z + z) / 2;
+  /// @dev Constant gas: a first estimate from the magnitude of x, then 7 unrolled Newton iterations, like solmate FixedPointMathLib.
+  /// Same result as the Babylonian loop for every input, which only differs by reverting on type(uint).max
+  function sqrt(uint x) internal pure returns (uint z) {
+    assembly {
+      let y := x
+      z := 181
+      // Scale y down to [256, 2**24) and z up by the square root of the removed factor
+      if iszero(lt(y, 0x10000000000000000000000000000000000)) {
+        y := shr(128, y)
+        z := shl(64, z)
       }
+      if iszero(lt(y, 0x1000000000000000000)) {
+        y := shr(64, y)
+        z := shl(32, z)
+      }
+      if iszero(lt(y, 0x10000000000)) {
+        y := shr(32, y)
+        z := shl(16, z)
+      }
+      if iszero(lt(y, 0x1000000)) {
+        y := shr(16, y)
+        z := shl(8, z)
+      }
+      // Linear estimate of sqrt(y) within a factor 2.84, 7 iterations are then enough for 256 bits
+      z := shr(18, mul(z, add(y, 65536)))
+      z := shr(1, add(z, div(x, z)))
+      z := shr(1, add(z, div(x, z)))
+      z := shr(1, add(z, div(x, z)))
+      z := shr(1, add(z, div(x, z)))
+      z := shr(1, add(z, div(x, z)))
+      z := shr(1, add(z, div(x, z)))
+      z := shr(1, add(z, div(x, z)))
+      // Newton cycles between floor and ceil when x + 1 is a perfect square, round down
+      z := sub(z, lt(div(x, z), z))
+    }
+  }
+
+
+  /// @notice Uniswap sqrt price X96 of token0 in token1 from the tokens USD prices
+  /// @param price0 Token0 price, in the oracle unit
+  /// @param price1 Token1 price, in the oracle unit
+  /// @param decimals0 Token0 decimals
+  /// @param decimals1 Token1 decimals
+  function oracleSqrtPriceX96(uint price0, uint price1, uint decimals0, uint decimals1) internal pure returns (uint160) {
+    return uint160( sqrt( (2 ** 192 * ((price0 * 10 ** decimals1) / price1)) / ( 10 ** decimals0 ) ) );
+  }
+
+
+  /// @notice Uniswap sqrt price X96 of a range bound
+  /// @param priceX10 Price of token1 in token0, scaled by 1e10
+  /// @param decimals0 Token0 decimals
+  /// @param decimals1 Token1 decimals
+  function rangeSqrtPriceX96(uint priceX10, uint decimals0, uint decimals1) internal pure returns (uint160) {
+    return uint160( 2**48 * sqrt( (2 ** 96 * (10 ** decimals1)) * 1e10 / (priceX10 * 10 ** decimals0) ) );
+  }
+
+
+  /// @notice Price of token0 in token1 with 8 decimals, from a Uniswap sqrt price X96
+  /// @param sqrtPriceX96 Uniswap sqrt price
+  /// @param decimals0 Token0 decimals
+  /// @param decimals1 Token1 decimals
+  function priceX8FromSqrtPriceX96(uint160 sqrtPriceX96, uint decimals0, uint decimals1) internal pure returns (uint priceX8) {
+    // Overflow if dont scale down the sqrtPrice before div 2*192
+    priceX8 = 10**decimals0 * uint(sqrtPriceX96 / 2 ** 12) ** 2 * 1e8 / 2**168;
+    priceX8 = priceX8 / 10**decimals1;
   }
 }
@@ -3,6 +3,9 @@ pragma solidity 0.8.19;
 
 import "../PositionManager/PositionManager.sol";
 import "../PositionManager/OptionsPositionManager.sol";
+import "../lib/LiquidityAmounts.sol";
+import "../lib/FullMath.sol";
+import "../lib/Sqrt.sol";
 
 
 /// @notice Extend PositionManager to test interal function inaccessible code branches
@@ -11,12 +14,9 @@ contract Test_PositionManager is PositionManager {
   /// @param roerouter address of the ROE pools router
   constructor(address roerouter) PositionManager(roerouter) {}
   
-  /// @notice test internal function getPoolAddresses
-  function test_getPoolAddresses(uint poolId) 
-    external view 
-    returns( ILendingPool lp, IPriceOracle oracle, IUniswapV2Router01 router, address token0, address token1) 
-  {
-    (lp, oracle, router, token0, token1) = getPoolAddresses(poolId);
+  /// @notice test internal function getPoolContext
+  function test_getPoolContext(uint poolId) external returns (PoolContext memory ctx) {
+    ctx = getPoolContext(poolId);
   }
   
   /// @notice test internal function checkSetAllowance
@@ -52,4 +52,76 @@ contract Test_OptionsPositionManager is OptionsPositionManager {
   function test_getTargetAmountFromOracle(IPriceOracle oracle, address assetA, uint amountA, address assetB)  external view returns (uint){
     return getTargetAmountFromOracle(oracle, assetA, amountA, assetB) ;
   }
-}
\ No newline at end of file
+  
+  /// @notice test internal function sumByAsset
+  function test_sumByAsset(address[] memory assets, uint[] memory amounts) external pure returns (address[] memory, uint[] memory) {
+    return sumByAsset(assets, amounts);
+  }
+}
+
+
+/// @notice Expose the internal math libraries of TokenisableRange, to check offchain ports against them
+contract Test_RangeMath {
+  function mulDiv(uint a, uint b, uint denominator) external pure returns (uint) {
+    return FullMath.mulDiv(a, b, denominator);
+  }
+  
+  function mulDivRoundingUp(uint a, uint b, uint denominator) external pure returns (uint) {
+    return FullMath.mulDivRoundingUp(a, b, denominator);
+  }
+
+  function getLiquidityForAmounts(uint160 sqrtRatioX96, uint160 sqrtRatioAX96, uint160 sqrtRatioBX96, uint amount0, uint amount1) external pure returns (uint128) {
+    return LiquidityAmounts.getLiquidityForAmounts(sqrtRatioX96, sqrtRatioAX96, sqrtRatioBX96, amount0, amount1);
+  }
+  
+  function getAmountsForLiquidity(uint160 sqrtRatioX96, uint160 sqrtRatioAX96, uint160 sqrtRatioBX96, uint128 liquidity) external pure returns (uint, uint) {
+    return LiquidityAmounts.getAmountsForLiquidity(sqrtRatioX96, sqrtRatioAX96, sqrtRatioBX96, liquidity);
+  }
+}
+
+
+/// @notice Compare the Sqrt library with the Babylonian loops it replaced
+contract Test_Sqrt {
+  /// @notice Babylonian method for sqrt, as previously used by TokenisableRange and LPOracle
+  function babylonian(uint x) public pure returns (uint y) {
+    uint z = (x + 1) / 2;
+    y = x;
+    while (z < y) {
+      y = z;
+      z = (x / z + z) / 2;
+    }
+  }
+  
+  function sqrt(uint x) public pure returns (uint) {
+    return Sqrt.sqrt(x);
+  }
+  
+  /// @notice Gas used by each implementation for the same input
+  function sqrtGas(uint x) external view returns (uint babylonianGas, uint sqrtGas_) {
+    uint gas = gasleft();
+    babylonian(x);
+    babylonianGas = gas - gasleft();
+    gas = gasleft();
+    sqrt(x);
+    sqrtGas_ = gas - gasleft();
+  }
+  
+  /// @notice Previous inline conversion of TokenisableRange.returnExpectedBalanceWithoutFees
+  function legacyOracleSqrtPriceX96(uint price0, uint price1, uint decimals0, uint decimals1) external pure returns (uint160) {
+    return uint160( babylonian( (2 ** 192 * ((price0 * 10 ** decimals1) / price1)) / ( 10 ** decimals0 ) ) );
+  }
+  
+  function oracleSqrtPriceX96(uint price0, uint price1, uint decimals0, uint decimals1) external pure returns (uint160) {
+    return Sqrt.oracleSqrtPriceX96(price0, price1, decimals0, decimals1);
+  }
+  
+  /// @notice Previous inline conversion of TokenisableRange.initProxy
+  function legacyRangeSqrtPriceX96(uint priceX10, uint decimals0, uint decimals1) external pure returns (uint160) {
+    return uint160( 2**48 * babylonian( (2 ** 96 * (10 ** decimals1)) * 1e10 / (priceX10 * 10 ** decimals0) ) );
+  }
+  
+  function rangeSqrtPriceX96(uint priceX10, uint decimals0, uint decimals1) external pure returns (uint160) {
+    return Sqrt.rangeSqrtPriceX96(priceX10, decimals0, decimals1);
+  }
+}
+
@@ -0,0 +1,256 @@
+# Vectorized model of GeVault: deposit, withdraw, deployAssets, getAdjustedBaseFee and getActiveTickIndex
+# Each row is an independent scenario (price path and user flows) and all scenarios advance together, step by step
+# Amounts are in raw token units, values in USD; 1 GEV is worth ~$1 at the first deposit, like 1e18 GEV in the contract
+# Simplifications: float math, oracle and pool prices are equal, swap fees are compounded in the vault idle balance
+from dataclasses import dataclass
+import numpy as np
+from scripts.liquidity_math import get_amounts_for_liquidity, get_liquidity_for_amounts, sqrt_price_from_prices, tick_ladder
+
+
+@dataclass
+class VaultConfig:
+  sqrt_lower: np.ndarray
+  sqrt_upper: np.ndarray
+  base_token_is_token0: bool
+  decimals0: int
+  decimals1: int
+  base_fee_x4: float = 20
+  tvl_cap: float = 1e4
+  idle_buffer0: float = 0
+  idle_buffer1: float = 0
+  pool_fee: float = 0.0005
+
+
+@dataclass
+class SimulationResult:
+  share_price: np.ndarray         # (scenarios, steps) USD value of 1 GEV
+  tvl: np.ndarray                 # (scenarios, steps) USD
+  deployed_ratio: np.ndarray      # (scenarios, steps) share of the TVL deployed in ticks
+  active_tick_index: np.ndarray   # (scenarios, steps)
+  tick_utilisation: np.ndarray    # (ticks,) share of scenario steps in which each tick is funded
+  treasury_fees: np.ndarray       # (scenarios,) USD collected by deposit and withdrawal fees
+  lp_fees: np.ndarray             # (scenarios,) USD earned by the ticks from swaps
+  rejected_deposits: np.ndarray   # (scenarios,) deposits over the TVL cap
+  failed_withdrawals: np.ndarray  # (scenarios,) withdrawals exceeding the vault reserves of that token
+
+
+class GeVaultModel:
+  def __init__(self, config, scenarios):
+    self.config = config
+    self.liquidity = np.zeros((scenarios, len(config.sqrt_lower)))
+    self.idle0 = np.zeros(scenarios)
+    self.idle1 = np.zeros(scenarios)
+    self.supply = np.zeros(scenarios)
+    self.treasury_fees = np.zeros(scenarios)
+    self.lp_fees = np.zeros(scenarios)
+
+
+  def tick_amounts(self, sqrt_price):
+    c = self.config
+    return get_amounts_for_liquidity(sqrt_price[:, None], c.sqrt_lower, c.sqrt_upper, self.liquidity)
+
+
+  def reserves(self, sqrt_price):
+    amounts0, amounts1 = self.tick_amounts(sqrt_price)
+    return amounts0.sum(axis=1) + self.idle0, amounts1.sum(axis=1) + self.idle1
+
+
+  def values(self, amount0, amount1, price0, price1):
+    c = self.config
+    return amount0 * price0 / 10**c.decimals0, amount1 * price1 / 10**c.decimals1
+
+
+  def tvl(self, sqrt_price, price0, price1):
+    value0, value1 = self.values(*self.reserves(sqrt_price), price0, price1)
+    return value0 + value1
+
+
+  def adjusted_base_fee(self, value0, value1, increase_token0):
+    # getAdjustedBaseFee, values are X8 in the contract hence 1e-8 for the +1
+    base = self.config.base_fee_x4
+    if increase_token0: fee = base * value0 / (value1 + 1e-8)
+    else: fee = base * value1 / (value0 + 1e-8)
+    return np.clip(fee, base / 2, base * 3 / 2)
+
+
+  def active_tick_index(self, sqrt_price):
+    # getActiveTickIndex: first tick holding some base token, active ticks start 2 ticks below
+    c = self.config
+    length = len(c.sqrt_lower)
+    if length < 5: return np.zeros(len(sqrt_price), dtype=int)
+    if c.base_token_is_token0: holds = sqrt_price[:, None] < c.sqrt_upper
+    else: holds = sqrt_price[:, None] > c.sqrt_lower
+    first = np.where(holds.any(axis=1), holds.argmax(axis=1), length)
+    return np.where((first >= 2) & (first < length), first - 2, length - 3)
+
+
+  def remove_from_all_ticks(self, rows, sqrt_price):
+    amounts0, amounts1 = self.tick_amounts(sqrt_price)
+    self.idle0 += np.where(rows, amounts0.sum(axis=1), 0)
+    self.idle1 += np.where(rows, amounts1.sum(axis=1), 0)
+    self.liquidity[rows] = 0
+
+
+  def deposit_in_tick(self, ticks, amount0, amount1, sqrt_price):
+    # Past the end of the ladder the contract reverts, here the amounts just stay idle
+    c = self.config
+    valid = ticks < len(c.sqrt_lower)
+    ticks = np.where(valid, ticks, 0)
+    amount0, amount1 = np.where(valid, amount0, 0), np.where(valid, amount1, 0)
+    lower, upper = c.sqrt_lower[ticks], c.sqrt_upper[ticks]
+    liquidity = get_liquidity_for_amounts(sqrt_price, lower, upper, amount0, amount1)
+    liquidity = np.where(np.isfinite(liquidity), liquidity, 0)
+    used0, used1 = get_amounts_for_liquidity(sqrt_price, lower, upper, liquidity)
+    self.liquidity[np.arange(len(sqrt_price)), ticks] += liquidity
+    self.idle0 = np.maximum(self.idle0 - used0, 0)
+    self.idle1 = np.maximum(self.idle1 - used1, 0)
+
+
+  def deploy_assets(self, rows, sqrt_price):
+    # deployAssets: idle balances above the buffers go evenly into the 2 ticks on each side of the price
+    c = self.config
+    index = self.active_tick_index(sqrt_price)
+    avail0 = np.where(rows, np.maximum(self.idle0 - c.idle_buffer0, 0), 0)
+    avail1 = np.where(rows, np.maximum(self.idle1 - c.idle_buffer1, 0), 0)
+    _, amount1ft = get_amounts_for_liquidity(sqrt_price, c.sqrt_lower[index], c.sqrt_upper[index], 1.0)
+    tick0 = np.where(amount1ft > 0, index + 2, index)
+    tick1 = np.where(amount1ft > 0, index, index + 2)
+    self.deposit_in_tick(tick0, avail0 / 2, 0, sqrt_price)
+    self.deposit_in_tick(tick0 + 1, avail0 / 2, 0, sqrt_price)
+    self.deposit_in_tick(tick1, 0, avail1 / 2, sqrt_price)
+    self.deposit_in_tick(tick1 + 1, 0, avail1 / 2, sqrt_price)
+
+
+  def rebalance(self, sqrt_price):
+    rows = np.ones(len(sqrt_price), dtype=bool)
+    self.remove_from_all_ticks(rows, sqrt_price)
+    self.deploy_assets(rows, sqrt_price)
+
+
+  def deposit(self, amount, is_token0, sqrt_price, price0, price1):
+    # Returns the rows whose deposit was rejected by the TVL cap
+    c = self.config
+    rows = amount > 0
+    value0, value1 = self.values(*self.reserves(sqrt_price), price0, price1)
+    tvl = value0 + value1
+    fee = amount * self.adjusted_base_fee(value0, value1, is_token0) / 1e4
+    price, decimals = (price0, c.decimals0) if is_token0 else (price1, c.decimals1)
+    value = price * (amount - fee) / 10**decimals
+    accepted = rows & (c.tvl_cap > value + tvl)
+    with np.errstate(divide="ignore", invalid="ignore"):
+      shares = np.where((self.supply == 0) | (tvl == 0), value, self.supply * value / tvl)
+    self.supply += np.where(accepted, shares, 0)
+    self.treasury_fees += np.where(accepted, fee * price / 10**decimals, 0)
+    if is_token0: self.idle0 += np.where(accepted, amount - fee, 0)
+    else: self.idle1 += np.where(accepted, amount - fee, 0)
+    self.remove_from_all_ticks(accepted, sqrt_price)
+    self.deploy_assets(accepted, sqrt_price)
+    return rows & ~accepted
+
+
+  def withdraw(self, share_fraction, is_token0, sqrt_price, price0, price1):
+    # Redeem a fraction of the GEV supply for one token; returns the rows that would revert for lack of that token
+    c = self.config
+    rows = (share_fraction > 0) & (self.supply > 0)
+    reserve0, reserve1 = self.reserves(sqrt_price)
+    value0, value1 = self.values(reserve0, reserve1, price0, price1)
+    price, decimals = (price0, c.decimals0) if is_token0 else (price1, c.decimals1)
+    amount = (value0 + value1) * share_fraction * 10**decimals / price
+    fee = amount * self.adjusted_base_fee(value0, value1, not is_token0) / 1e4
+    idle, reserve = (self.idle0, reserve0) if is_token0 else (self.idle1, reserve1)
+    # paid from the idle buffer, otherwise from all the ticks unwound
+    fast = rows & (amount <= idle)
+    slow = rows & ~fast & (amount <= reserve)
+    self.remove_from_all_ticks(slow, sqrt_price)
+    done = fast | slow
+    self.supply -= np.where(done, self.supply * share_fraction, 0)
+    if is_token0: self.idle0 -= np.where(done, amount, 0)
+    else: self.idle1 -= np.where(done, amount, 0)
+    self.treasury_fees += np.where(done, fee * price / 10**decimals, 0)
+    self.deploy_assets(slow, sqrt_price)
+    return rows & ~done
+
+
+  def move_price(self, old_sqrt_price, new_sqrt_price, price0, price1):
+    # Swappers pay the pool fee on the token they add to the ticks
+    c = self.config
+    old0, old1 = self.tick_amounts(old_sqrt_price)
+    new0, new1 = self.tick_amounts(new_sqrt_price)
+    fee0 = c.pool_fee * np.maximum(new0 - old0, 0).sum(axis=1)
+    fee1 = c.pool_fee * np.maximum(new1 - old1, 0).sum(axis=1)
+    self.idle0 += fee0
+    self.idle1 += fee1
+    value0, value1 = self.values(fee0, fee1, price0, price1)
+    self.lp_fees += value0 + value1
+
+
+def simulate(config, price0, price1, deposits0=None, deposits1=None, withdrawals0=None, withdrawals1=None, rebalance_every=1):
+  """
+  Run scenarios of (scenarios, steps) USD price paths and user flows
+  deposits0/1: raw token amounts deposited at each step
+  withdrawals0/1: fraction of the GEV supply redeemed for token0/1 at each step
+  rebalance_every: steps between keeper rebalances, 0 to never rebalance
+  """
+  flows = [np.zeros((1, 1)) if f is None else np.atleast_2d(np.asarray(f, dtype=float)) for f in (deposits0, deposits1, withdrawals0, withdrawals1)]
+  price0, price1, *flows = np.broadcast_arrays(np.atleast_2d(np.asarray(price0, dtype=float)), np.atleast_2d(np.asarray(price1, dtype=float)), *flows)
+  scenarios, steps = price0.shape
+  sqrt_price = sqrt_price_from_prices(price0, price1, config.decimals0, config.decimals1)
+
+  vault = GeVaultModel(config, scenarios)
+  tvl = np.zeros((scenarios, steps))
+  share_price = np.full((scenarios, steps), np.nan)
+  deployed_ratio = np.zeros((scenarios, steps))
+  active_tick_index = np.zeros((scenarios, steps), dtype=int)
+  funded = np.zeros(len(config.sqrt_lower))
+  rejected_deposits = np.zeros(scenarios, dtype=int)
+  failed_withdrawals = np.zeros(scenarios, dtype=int)
+
+  for t in range(steps):
+    p0, p1, sp = price0[:, t], price1[:, t], sqrt_price[:, t]
+    if t > 0: vault.move_price(sqrt_price[:, t-1], sp, p0, p1)
+    if rebalance_every and t % rebalance_every == 0: vault.rebalance(sp)
+    rejected_deposits += vault.deposit(flows[0][:, t], True, sp, p0, p1)
+    rejected_deposits += vault.deposit(flows[1][:, t], False, sp, p0, p1)
+    failed_withdrawals += vault.withdraw(flows[2][:, t], True, sp, p0, p1)
+    failed_withdrawals += vault.withdraw(flows[3][:, t], False, sp, p0, p1)
+
+    tvl[:, t] = vault.tvl(sp, p0, p1)
+    idle0, idle1 = vault.values(vault.idle0, vault.idle1, p0, p1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+      share_price[:, t] = np.where(vault.supply > 0, tvl[:, t] / vault.supply, np.nan)
+      deployed_ratio[:, t] = np.where(tvl[:, t] > 0, 1 - (idle0 + idle1) / tvl[:, t], 0)
+    active_tick_index[:, t] = vault.active_tick_index(sp)
+    funded += (vault.liquidity > 0).sum(axis=0)
+
+  return SimulationResult(share_price, tvl, deployed_ratio, active_tick_index, funded / (scenarios * steps),
+    vault.treasury_fees, vault.lp_fees, rejected_deposits, failed_withdrawals)
+
+
+def gbm_paths(start, volatility, steps, scenarios, seed=0):
+  # Geometric brownian motion price paths, volatility per step
+  rng = np.random.default_rng(seed)
+  shocks = rng.normal(-volatility**2 / 2, volatility, (scenarios, steps - 1))
+  return start * np.exp(np.concatenate([np.zeros((scenarios, 1)), np.cumsum(shocks, axis=1)], axis=1))
+
+
+def main():
+  # ETH-USDC vault like in tests/test_GeVault.py: USDC is token0, WETH token1 and the base token
+  scenarios, steps = 2000, 500
+  sqrt_lower, sqrt_upper = tick_ladder(np.arange(800, 2000, 50), 1.025, 6, 18, False)
+  config = VaultConfig(sqrt_lower, sqrt_upper, False, 6, 18, tvl_cap=1e7, idle_buffer0=1000e6, idle_buffer1=0.5e18)
+  eth = gbm_paths(1262, 0.01, steps, scenarios)
+  rng = np.random.default_rng(1)
+  deposits0 = np.where(rng.random((scenarios, steps)) < 0.05, 10000e6, 0)
+  deposits0[:, 0] = 500000e6
+  deposits1 = np.where(rng.random((scenarios, steps)) < 0.05, 5e18, 0)
+  deposits1[:, 0] = 400e18
+  withdrawals0 = np.where(rng.random((scenarios, steps)) < 0.05, 0.01, 0)
+  withdrawals1 = np.where(rng.random((scenarios, steps)) < 0.05, 0.01, 0)
+
+  result = simulate(config, 1.0, eth, deposits0, deposits1, withdrawals0, withdrawals1, rebalance_every=24)
+  print("Final share price: median", np.nanmedian(result.share_price[:, -1]), "p5", np.nanpercentile(result.share_price[:, -1], 5), "p95", np.nanpercentile(result.share_price[:, -1], 95))
+  print("Treasury fees: mean", result.treasury_fees.mean())
+  print("LP fees: mean", result.lp_fees.mean())
+  print("Deployed ratio: mean", result.deployed_ratio.mean())
+  print("Tick utilisation", np.round(result.tick_utilisation, 3))
+  print("Rejected deposits", result.rejected_deposits.sum(), "failed withdrawals", result.failed_withdrawals.sum())
@@ -0,0 +1,38 @@
+# Float model of the Uniswap v3 liquidity math used by TokenisableRange, vectorized with numpy
+# Sqrt prices are sqrt(token1 per token0) in raw token units, not X96 scaled; all functions broadcast over their arguments
+import numpy as np
+
+
+def sqrt_price_from_prices(price0, price1, decimals0, decimals1):
+  # USD oracle prices to pool sqrt price, like TokenisableRange.getTokenAmounts does from the oracle
+  return np.sqrt(np.asarray(price0, dtype=float) / np.asarray(price1, dtype=float) * 10 ** (decimals1 - decimals0))
+
+
+def tick_ladder(base_prices, width, decimals0, decimals1, base_token_is_token0):
+  # Ranges [p, p * width] of the base token priced in quote token, listed in the GeVault pushTick order (ascending base price)
+  # Returns the sqrt price bounds of each range as seen by the pool
+  base_prices = np.asarray(base_prices, dtype=float)
+  if base_token_is_token0:
+    sqrt_lower = np.sqrt(base_prices * 10 ** (decimals1 - decimals0))
+    sqrt_upper = np.sqrt(base_prices * width * 10 ** (decimals1 - decimals0))
+  else:
+    sqrt_lower = np.sqrt(10 ** (decimals1 - decimals0) / (base_prices * width))
+    sqrt_upper = np.sqrt(10 ** (decimals1 - decimals0) / base_prices)
+  return sqrt_lower, sqrt_upper
+
+
+def get_amounts_for_liquidity(sqrt_price, sqrt_lower, sqrt_upper, liquidity):
+  # Below range the position is all token0, above range all token1
+  sqrt_p = np.clip(sqrt_price, sqrt_lower, sqrt_upper)
+  amount0 = liquidity * (sqrt_upper - sqrt_p) / (sqrt_p * sqrt_upper)
+  amount1 = liquidity * (sqrt_p - sqrt_lower)
+  return amount0, amount1
+
+
+def get_liquidity_for_amounts(sqrt_price, sqrt_lower, sqrt_upper, amount0, amount1):
+  # Max liquidity that the amounts can fund; a side the position doesn't need at that price is ignored
+  sqrt_p = np.clip(sqrt_price, sqrt_lower, sqrt_upper)
+  with np.errstate(divide="ignore", invalid="ignore"):
+    liquidity0 = np.where(sqrt_p < sqrt_upper, amount0 * sqrt_p * sqrt_upper / (sqrt_upper - sqrt_p), np.inf)
+    liquidity1 = np.where(sqrt_p > sqrt_lower, amount1 / (sqrt_p - sqrt_lower), np.inf)
+  return np.minimum(liquidity0, liquidity1)
@@ -0,0 +1,240 @@
+# Event-sourced TokenisableRange state: liquidity, uncompounded fees and supply rebuilt from logs instead of eth_calls at historical blocks
+# Every value comes from logs the contracts already emit:
+#  - InitTR registers the range and its tokens
+#  - the ERC721 Transfer minting the Uniswap position to the range gives its tokenId, IncreaseLiquidity/DecreaseLiquidity of that tokenId the liquidity
+#  - Transfer of the range token from or to 0x0 gives the supply
+#  - fee0/fee1 move by the range token0/token1 balance change in each Deposit, Withdraw or ClaimFees segment of a transaction:
+#    collected fees in, treasury cut and compounding out, deposit fee share kept, withdrawal fee share out.
+#    The init segment and transfers outside of a range action (donations) leave fees unchanged, like in the contract
+# Logs must come in whole blocks. The state is checkpointed to a npz file of columns, uint256 values as 4 uint64 limbs,
+# and a run resumes after the last indexed block
+import os
+import numpy as np
+
+# keccak256 of the event signatures
+TRANSFER = 0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef            # Transfer(address,address,uint256), ERC721 when tokenId is indexed
+INIT_TR = 0xeb71465d71f7b18c376ba29f6edb7953dc29c7afb4fcaa4e1335c8827a8dd96e             # InitTR(address,address,uint128,uint128)
+DEPOSIT = 0xe1fffcc4923d04b559f4d29a8bfc6cda04eb5b0d3c460751c2402c5c5cc9109c             # Deposit(address,uint256)
+WITHDRAW = 0x884edad9ce6fa2440d8a54cc123490eb96d2768479d49ff9c7366125a9424364            # Withdraw(address,uint256)
+CLAIM_FEES = 0xcbf6196d7bebcbaaf53f321eecb5b4f39479879f3996f828f10012708a9442d7          # ClaimFees(uint256,uint256)
+INCREASE_LIQUIDITY = 0x3067048beee31b25b2f1681f88dac838c8bba36af25bfb2b7cf7473a5847e35f  # IncreaseLiquidity(uint256,uint128,uint256,uint256)
+DECREASE_LIQUIDITY = 0x26f6a048ee9138f2c0ce266f322cb99228e8d619ae2bff30c67f8dcf9d2377b4  # DecreaseLiquidity(uint256,uint128,uint256,uint256)
+
+POSITION_MANAGER = "0xc36442b4a4522e871399cd717abdd847ab11fe88"
+ZERO_ADDRESS = "0x" + "0" * 40
+STATE_COLUMNS = ("token_id", "liquidity", "fee0", "fee1", "supply")
+HISTORY_COLUMNS = ("liquidity", "fee0", "fee1", "supply")
+_LIMB = 2**64 - 1
+
+
+def _int(value):
+  # topics and data words, as hex strings or bytes (HexBytes from web3)
+  if isinstance(value, str): return int(value, 16)
+  return int.from_bytes(bytes(value), "big")
+
+
+def _address(value):
+  if isinstance(value, int): return "0x%040x" % (value & (2**160 - 1))
+  return str(value).lower()
+
+
+def _topic(value):
+  return "0x%064x" % (value if isinstance(value, int) else int(value, 16))
+
+
+def _checksum(w3, address):
+  # web3 v5, used by brownie, and v6 names
+  return (getattr(w3, "to_checksum_address", None) or w3.toChecksumAddress)(address)
+
+
+def _words(data):
+  data = bytes.fromhex(data[2:] if data.startswith("0x") else data) if isinstance(data, str) else bytes(data)
+  return [int.from_bytes(data[k:k + 32], "big") for k in range(0, len(data), 32)]
+
+
+def _tx_hash(value):
+  return value if isinstance(value, str) else "0x" + bytes(value).hex()
+
+
+def to_limbs(values):
+  # uint256 -> (n, 4) uint64, least significant limb first
+  values = np.asarray(values, dtype=object).reshape(-1)
+  return np.stack([(values >> (64 * k)) & _LIMB for k in range(4)], axis=-1).astype(np.uint64).reshape(-1, 4)
+
+
+def from_limbs(limbs):
+  limbs = np.asarray(limbs, dtype=np.uint64).reshape(-1, 4)
+  values = np.zeros(len(limbs), dtype=object)
+  for k in range(4): values = values + (limbs[:, k].astype(object) << (64 * k))
+  return values
+
+
+class RangeIndexer:
+  def __init__(self, position_manager=POSITION_MANAGER):
+    self.position_manager = _address(position_manager)
+    self.last_block = -1
+    self.ranges, self.token0, self.token1, self.start_x10, self.end_x10 = [], [], [], [], []
+    self.state = {c: [] for c in STATE_COLUMNS}
+    self._index, self._token_ids = {}, {}
+    # history rows, one per range touched by a transaction, loaded checkpoint first then new rows
+    self._saved_history = {"block": np.zeros(0, np.int64), "log_index": np.zeros(0, np.int64), "range": np.zeros(0, np.int32),
+      **{c: np.zeros((0, 4), np.uint64) for c in HISTORY_COLUMNS}}
+    self._history = {c: [] for c in self._saved_history}
+    self._tx = None
+    self._flows, self._touched, self._minted = {}, {}, set()
+
+
+  def register(self, range_, token0, token1, start_x10=0, end_x10=0):
+    range_ = _address(range_)
+    if range_ in self._index: return self._index[range_]
+    self._index[range_] = len(self.ranges)
+    self.ranges.append(range_)
+    self.token0.append(_address(token0))
+    self.token1.append(_address(token1))
+    self.start_x10.append(start_x10)
+    self.end_x10.append(end_x10)
+    for c in STATE_COLUMNS: self.state[c].append(0)
+    return self._index[range_]
+
+
+  def range_state(self, range_):
+    i = self._index[_address(range_)]
+    return {c: self.state[c][i] for c in STATE_COLUMNS}
+
+
+  def history(self, range_=None):
+    h = {c: np.concatenate([self._saved_history[c], np.array(self._history[c], dtype=self._saved_history[c].dtype)])
+      for c in ("block", "log_index", "range")}
+    h.update({c: np.concatenate([from_limbs(self._saved_history[c]), np.array(self._history[c], dtype=object)]) for c in HISTORY_COLUMNS})
+    if range_ is None: return h
+    rows = h["range"] == self._index[_address(range_)]
+    return {c: v[rows] for c, v in h.items()}
+
+
+  def ingest(self, logs):
+    # Logs of whole blocks, in any order. Blocks already indexed are skipped so that overlapping fetches are harmless
+    logs = sorted((l for l in logs if l["blockNumber"] > self.last_block), key=lambda l: (l["blockNumber"], l["logIndex"]))
+    for log in logs:
+      tx = (log["blockNumber"], _tx_hash(log["transactionHash"]))
+      if tx != self._tx: self._end_tx()
+      self._tx = tx
+      self._apply(_address(log["address"]), [_int(t) for t in log["topics"]], _words(log["data"]), log["logIndex"])
+    self._end_tx()
+    if logs: self.last_block = logs[-1]["blockNumber"]
+
+
+  def _apply(self, address, topics, words, log_index):
+    if not topics: return
+    event, i = topics[0], self._index.get(address)
+    if event == INIT_TR:
+      self.register(address, words[0], words[1], words[2], words[3])
+    elif event == TRANSFER and len(topics) == 4:
+      # Uniswap position minted to a range in init
+      to = self._index.get(_address(topics[2]))
+      if address == self.position_manager and topics[1] == 0 and to is not None and self.state["token_id"][to] == 0:
+        self.state["token_id"][to] = topics[3]
+        self._token_ids[topics[3]] = to
+        self._minted.add(to)
+    elif event == TRANSFER and len(topics) == 3:
+      sender, recipient, value = _address(topics[1]), _address(topics[2]), words[0]
+      if i is not None and ZERO_ADDRESS in (sender, recipient):
+        self.state["supply"][i] += value if sender == ZERO_ADDRESS else -value
+        self._touched[i] = log_index
+      for j, sign in ((self._index.get(recipient), 1), (self._index.get(sender), -1)):
+        if j is None: continue
+        if address == self.token0[j]: self._flows[(j, 0)] = self._flows.get((j, 0), 0) + sign * value
+        if address == self.token1[j]: self._flows[(j, 1)] = self._flows.get((j, 1), 0) + sign * value
+    elif event in (INCREASE_LIQUIDITY, DECREASE_LIQUIDITY) and address == self.position_manager:
+      j = self._token_ids.get(topics[1])
+      if j is None: return
+      self.state["liquidity"][j] += words[0] if event == INCREASE_LIQUIDITY else -words[0]
+      self._touched[j] = log_index
+    elif event in (DEPOSIT, WITHDRAW, CLAIM_FEES) and i is not None:
+      # End of a range action: its token balance change is the fee change, except in init which refunds everything left
+      flow0, flow1 = self._flows.pop((i, 0), 0), self._flows.pop((i, 1), 0)
+      if i in self._minted: self._minted.discard(i)
+      else:
+        self.state["fee0"][i] += flow0
+        self.state["fee1"][i] += flow1
+        if self.state["fee0"][i] < 0 or self.state["fee1"][i] < 0: raise ValueError(f"Negative fees for range {address}, logs are missing")
+      self._touched[i] = log_index
+
+
+  def _end_tx(self):
+    # Transfers not followed by a range action in the same transaction are donations
+    for i, log_index in sorted(self._touched.items()):
+      self._history["block"].append(self._tx[0])
+      self._history["log_index"].append(log_index)
+      self._history["range"].append(i)
+      for c in HISTORY_COLUMNS: self._history[c].append(self.state[c][i])
+    self._flows, self._touched, self._minted = {}, {}, set()
+
+
+  def fetch_logs(self, w3, from_block, to_block):
+    # InitTR first, so that the ranges created in this block span are known to the next filters
+    get_logs = lambda **params: w3.eth.get_logs({"fromBlock": from_block, "toBlock": to_block, **params})
+    logs = get_logs(topics=[_topic(INIT_TR)])
+    new_ranges = {_address(l["address"]) for l in logs} - set(self.ranges)
+    ranges = [_topic(r) for r in sorted(set(self.ranges) | new_ranges)]
+    if not ranges: return logs
+    logs += get_logs(address=[_checksum(w3, "0x" + r[-40:]) for r in ranges], topics=[[_topic(e) for e in (TRANSFER, DEPOSIT, WITHDRAW, CLAIM_FEES)]])
+    pm = _checksum(w3, self.position_manager)
+    minted = get_logs(address=pm, topics=[_topic(TRANSFER), _topic(ZERO_ADDRESS), ranges])
+    token_ids = [_topic(t) for t in self._token_ids] + [_topic(_int(l["topics"][3])) for l in minted]
+    if token_ids: logs += minted + get_logs(address=pm, topics=[[_topic(INCREASE_LIQUIDITY), _topic(DECREASE_LIQUIDITY)], token_ids])
+    tokens = sorted(set(self.token0 + self.token1) | {_address(_words(l["data"])[k]) for l in logs if _int(l["topics"][0]) == INIT_TR for k in (0, 1)})
+    tokens = [_checksum(w3, t) for t in tokens]
+    logs += get_logs(address=tokens, topics=[_topic(TRANSFER), ranges]) + get_logs(address=tokens, topics=[_topic(TRANSFER), None, ranges])
+    # a transfer between two ranges matches both token filters
+    unique = {(l["blockNumber"], l["logIndex"]): l for l in logs}
+    return list(unique.values())
+
+
+  def sync(self, w3, to_block=None, chunk_size=10000, from_block=0):
+    to_block = w3.eth.block_number if to_block is None else to_block
+    start = max(self.last_block + 1, from_block)
+    while start <= to_block:
+      end = min(start + chunk_size - 1, to_block)
+      self.ingest(self.fetch_logs(w3, start, end))
+      self.last_block = end
+      start = end + 1
+    return self
+
+
+  def save(self, path):
+    history = self.history()
+    np.savez_compressed(path, last_block=np.int64(self.last_block), position_manager=np.array(self.position_manager),
+      ranges=np.array(self.ranges, dtype="U42"), token0=np.array(self.token0, dtype="U42"), token1=np.array(self.token1, dtype="U42"),
+      start_x10=to_limbs(self.start_x10), end_x10=to_limbs(self.end_x10),
+      **{c: to_limbs(self.state[c]) for c in STATE_COLUMNS},
+      **{"history_" + c: history[c] for c in ("block", "log_index", "range")},
+      **{"history_" + c: to_limbs(history[c]) for c in HISTORY_COLUMNS})
+
+
+  @classmethod
+  def load(cls, path):
+    with np.load(path) as f:
+      indexer = cls(str(f["position_manager"]))
+      start_x10, end_x10 = from_limbs(f["start_x10"]), from_limbs(f["end_x10"])
+      for k, r in enumerate(f["ranges"]): indexer.register(str(r), str(f["token0"][k]), str(f["token1"][k]), start_x10[k], end_x10[k])
+      for c in STATE_COLUMNS: indexer.state[c] = list(from_limbs(f[c]))
+      indexer._token_ids = {t: k for k, t in enumerate(indexer.state["token_id"]) if t > 0}
+      indexer._saved_history = {c: f["history_" + c] for c in indexer._saved_history}
+      indexer.last_block = int(f["last_block"])
+    return indexer
+
+
+def index(w3, path, position_manager=POSITION_MANAGER, from_block=0, to_block=None, chunk_size=10000):
+  # Resume from the checkpoint at path if there is one, index up to to_block and save
+  indexer = RangeIndexer.load(path) if os.path.exists(path) else RangeIndexer(position_manager)
+  indexer.sync(w3, to_block, chunk_size, from_block)
+  indexer.save(path)
+  return indexer
+
+
+def main(path="tr_index.npz", from_block=0):
+  from brownie import web3
+  indexer = index(web3, path, from_block=int(from_block))
+  print("Indexed", len(indexer.ranges), "ranges up to block", indexer.last_block)
+  for k, r in enumerate(indexer.ranges):
+    print(r, {c: indexer.state[c][k] for c in STATE_COLUMNS})
@@ -0,0 +1,252 @@
+# Integer port of TickMath, FullMath, LiquidityAmounts and the TokenisableRange valuation, bit for bit equal to the contracts
+# Values are Python ints, so every function works on scalars and, through np.frompyfunc, broadcasts over object arrays
+# Checked arithmetic and require() reverts raise SolidityRevert, explicit Solidity downcasts truncate like the EVM does
+from dataclasses import dataclass
+from math import isqrt
+import numpy as np
+
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+Q96 = 2**96
+UINT256_MAX = 2**256 - 1
+FEE_TIER = 5
+
+# getSqrtRatioAtTick multipliers, for bits 0x2 to 0x80000 of abs(tick)
+_TICK_RATIOS = [
+  0xfff97272373d413259a46990580e213a, 0xfff2e50f5f656932ef12357cf3c7fdcc, 0xffe5caca7e10e4e61c3624eaa0941cd0,
+  0xffcb9843d60f6159c9db58835c926644, 0xff973b41fa98c081472e6896dfb254c0, 0xff2ea16466c96a3843ec78b326b52861,
+  0xfe5dee046a99a2a811c461f1969c3053, 0xfcbe86c7900a88aedcffc83b479aa3a4, 0xf987a7253ac413176f2b074cf7815e54,
+  0xf3392b0822b70005940c7a398e4b70f3, 0xe7159475a2c29b7443b29c7fa6e889d9, 0xd097f3bdfd2022b8845ad8f792aa5825,
+  0xa9f746462d870fdf8a65dc1f90e061e5, 0x70d869a156d2a1b890bb3df62baf32f7, 0x31be135f97d08fd981231505542fcfa6,
+  0x9aa508b5b7a84e1c677de54f3e99bc9, 0x5d6af8dedb81196699c329225ee604, 0x2216e584f5fa1ea926041bedfe98,
+  0x48a170391f7dc42444e8fa2,
+]
+
+
+class SolidityRevert(ValueError):
+  pass
+
+
+def _require(condition, message=""):
+  if not condition:
+    raise SolidityRevert(message)
+
+
+def _checked(x):
+  # uint256 checked arithmetic of solc >= 0.8
+  _require(0 <= x <= UINT256_MAX, "overflow")
+  return x
+
+
+def _sdiv(a, b):
+  # Solidity signed division rounds towards zero
+  q = abs(a) // abs(b)
+  return q if (a < 0) == (b < 0) else -q
+
+
+def _smod(a, b):
+  # Solidity signed modulo takes the sign of the dividend
+  return a - b * _sdiv(a, b)
+
+
+def _int24(x):
+  x &= 2**24 - 1
+  return x - 2**24 if x >= 2**23 else x
+
+
+### FullMath
+
+def _mul_div(a, b, denominator):
+  _require(denominator > 0)
+  return _checked(a * b // denominator)
+
+
+def _mul_div_rounding_up(a, b, denominator):
+  result = _mul_div(a, b, denominator)
+  if a * b % denominator > 0:
+    _require(result < UINT256_MAX)
+    result += 1
+  return result
+
+
+### TickMath
+
+def _get_sqrt_ratio_at_tick(tick):
+  abs_tick = abs(int(tick))
+  _require(abs_tick <= MAX_TICK, "T")
+  ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if abs_tick & 0x1 else 0x100000000000000000000000000000000
+  for bit, multiplier in enumerate(_TICK_RATIOS, 1):
+    if abs_tick & (1 << bit):
+      ratio = (ratio * multiplier) >> 128
+  if tick > 0:
+    ratio = UINT256_MAX // ratio
+  return (ratio >> 32) + (0 if ratio % (1 << 32) == 0 else 1)
+
+
+def _get_tick_at_sqrt_ratio(sqrt_price_x96):
+  sqrt_price_x96 = int(sqrt_price_x96)
+  _require(MIN_SQRT_RATIO <= sqrt_price_x96 < MAX_SQRT_RATIO, "R")
+  ratio = sqrt_price_x96 << 32
+  msb = ratio.bit_length() - 1
+  r = ratio >> (msb - 127) if msb >= 128 else ratio << (127 - msb)
+  log_2 = (msb - 128) << 64
+  # 14 bits of the fractional part, by repeated squaring
+  for bit in range(63, 49, -1):
+    r = (r * r) >> 127
+    f = r >> 128
+    log_2 |= f << bit
+    r >>= f
+  log_sqrt10001 = log_2 * 255738958999603826347141
+  tick_low = _int24((log_sqrt10001 - 3402992956809132418596140100660247210) >> 128)
+  tick_hi = _int24((log_sqrt10001 + 291339464771989622907027621153398088495) >> 128)
+  if tick_low == tick_hi:
+    return tick_low
+  return tick_hi if _get_sqrt_ratio_at_tick(tick_hi) <= sqrt_price_x96 else tick_low
+
+
+### LiquidityAmounts
+
+def _to_uint128(x):
+  _require(x < 2**128)
+  return x
+
+
+def _sorted(sqrt_ratio_a, sqrt_ratio_b):
+  return (sqrt_ratio_b, sqrt_ratio_a) if sqrt_ratio_a > sqrt_ratio_b else (sqrt_ratio_a, sqrt_ratio_b)
+
+
+def _get_liquidity_for_amount0(sqrt_ratio_a, sqrt_ratio_b, amount0):
+  sqrt_ratio_a, sqrt_ratio_b = _sorted(sqrt_ratio_a, sqrt_ratio_b)
+  intermediate = _mul_div(sqrt_ratio_a, sqrt_ratio_b, Q96)
+  return _to_uint128(_mul_div(amount0, intermediate, sqrt_ratio_b - sqrt_ratio_a))
+
+
+def _get_liquidity_for_amount1(sqrt_ratio_a, sqrt_ratio_b, amount1):
+  sqrt_ratio_a, sqrt_ratio_b = _sorted(sqrt_ratio_a, sqrt_ratio_b)
+  return _to_uint128(_mul_div(amount1, Q96, sqrt_ratio_b - sqrt_ratio_a))
+
+
+def _get_liquidity_for_amounts(sqrt_ratio, sqrt_ratio_a, sqrt_ratio_b, amount0, amount1):
+  sqrt_ratio_a, sqrt_ratio_b = _sorted(sqrt_ratio_a, sqrt_ratio_b)
+  if sqrt_ratio < sqrt_ratio_a:
+    return _get_liquidity_for_amount0(sqrt_ratio_a, sqrt_ratio_b, amount0)
+  if sqrt_ratio < sqrt_ratio_b:
+    return min(_get_liquidity_for_amount0(sqrt_ratio, sqrt_ratio_b, amount0), _get_liquidity_for_amount1(sqrt_ratio_a, sqrt_ratio, amount1))
+  return _get_liquidity_for_amount1(sqrt_ratio_a, sqrt_ratio_b, amount1)
+
+
+def _get_amount0_for_liquidity(sqrt_ratio_a, sqrt_ratio_b, liquidity):
+  sqrt_ratio_a, sqrt_ratio_b = _sorted(sqrt_ratio_a, sqrt_ratio_b)
+  return _mul_div(liquidity << 96, sqrt_ratio_b - sqrt_ratio_a, sqrt_ratio_b) // sqrt_ratio_a
+
+
+def _get_amount1_for_liquidity(sqrt_ratio_a, sqrt_ratio_b, liquidity):
+  sqrt_ratio_a, sqrt_ratio_b = _sorted(sqrt_ratio_a, sqrt_ratio_b)
+  return _mul_div(liquidity, sqrt_ratio_b - sqrt_ratio_a, Q96)
+
+
+def _get_amounts_for_liquidity(sqrt_ratio, sqrt_ratio_a, sqrt_ratio_b, liquidity):
+  sqrt_ratio, sqrt_ratio_a, sqrt_ratio_b, liquidity = int(sqrt_ratio), int(sqrt_ratio_a), int(sqrt_ratio_b), int(liquidity)
+  sqrt_ratio_a, sqrt_ratio_b = _sorted(sqrt_ratio_a, sqrt_ratio_b)
+  if sqrt_ratio < sqrt_ratio_a:
+    return _get_amount0_for_liquidity(sqrt_ratio_a, sqrt_ratio_b, liquidity), 0
+  if sqrt_ratio < sqrt_ratio_b:
+    return _get_amount0_for_liquidity(sqrt_ratio, sqrt_ratio_b, liquidity), _get_amount1_for_liquidity(sqrt_ratio_a, sqrt_ratio, liquidity)
+  return 0, _get_amount1_for_liquidity(sqrt_ratio_a, sqrt_ratio_b, liquidity)
+
+
+### TokenisableRange
+
+def _range_ticks(start_x10, end_x10, decimals0, decimals1, is_ticker):
+  # initProxy, TokenisableRange.sqrt is the Babylonian method which returns floor(sqrt(x)) like isqrt
+  upper_tick = _get_tick_at_sqrt_ratio(_checked(2**48 * isqrt(_checked(2**96 * 10**decimals1 * 10**10) // _checked(int(start_x10) * 10**decimals0))) % 2**160)
+  lower_tick = _get_tick_at_sqrt_ratio(_checked(2**48 * isqrt(_checked(2**96 * 10**decimals1 * 10**10) // _checked(int(end_x10) * 10**decimals0))) % 2**160)
+  if is_ticker:
+    middle_tick = _sdiv(upper_tick + lower_tick, 2)
+    upper_tick = (middle_tick + FEE_TIER) - _smod(middle_tick + FEE_TIER, FEE_TIER * 2)
+    lower_tick = upper_tick - FEE_TIER - FEE_TIER
+  else:
+    lower_tick = (lower_tick + FEE_TIER) - _smod(lower_tick + FEE_TIER, FEE_TIER * 2)
+    upper_tick = (upper_tick + FEE_TIER) - _smod(upper_tick + FEE_TIER, FEE_TIER * 2)
+  return lower_tick, upper_tick
+
+
+def _oracle_sqrt_price(price0, price1, decimals0, decimals1):
+  # returnExpectedBalanceWithoutFees: pool sqrt price implied by the oracle prices
+  return isqrt(_checked(2**192 * (_checked(price0 * 10**decimals1) // price1)) // 10**decimals0) % 2**160
+
+
+@dataclass
+class RangeState:
+  lower_tick: int
+  upper_tick: int
+  liquidity: int
+  total_supply: int
+  decimals0: int
+  decimals1: int
+  fee0: int = 0
+  fee1: int = 0
+
+  @classmethod
+  def from_contract(cls, tr):
+    # Snapshot of a deployed TokenisableRange, to value it offchain at many prices
+    (_, decimals0), (_, decimals1) = tr.TOKEN0(), tr.TOKEN1()
+    return cls(tr.lowerTick(), tr.upperTick(), tr.liquidity(), tr.totalSupply(), decimals0, decimals1, tr.fee0(), tr.fee1())
+
+  @property
+  def sqrt_ratios(self):
+    return _get_sqrt_ratio_at_tick(self.lower_tick), _get_sqrt_ratio_at_tick(self.upper_tick)
+
+  def _expected_balance_without_fees(self, price0, price1):
+    sqrt_ratio_a, sqrt_ratio_b = self.sqrt_ratios
+    sqrt_price = _oracle_sqrt_price(int(price0), int(price1), self.decimals0, self.decimals1)
+    return _get_amounts_for_liquidity(sqrt_price, sqrt_ratio_a, sqrt_ratio_b, self.liquidity)
+
+  def _expected_balance(self, price0, price1):
+    amount0, amount1 = self._expected_balance_without_fees(price0, price1)
+    return _checked(amount0 + self.fee0), _checked(amount1 + self.fee1)
+
+  def _value_per_lp(self, price0, price1):
+    if self.total_supply == 0:
+      return 0
+    price0, price1 = int(price0), int(price1)
+    amount0, amount1 = self._expected_balance(price0, price1)
+    total_value = _checked(_checked(price0 * amount0) // 10**self.decimals0 + _checked(amount1 * price1) // 10**self.decimals1)
+    return _checked(total_value * 10**18) // self.total_supply
+
+  def _token_amounts_excluding_fees(self, amount, sqrt_price_x96):
+    sqrt_ratio_a, sqrt_ratio_b = self.sqrt_ratios
+    liquidity = (_checked(self.liquidity * int(amount)) // self.total_supply) % 2**128
+    return _get_amounts_for_liquidity(sqrt_price_x96, sqrt_ratio_a, sqrt_ratio_b, liquidity)
+
+  def _token_amounts(self, amount, sqrt_price_x96):
+    amount0, amount1 = self._token_amounts_excluding_fees(amount, sqrt_price_x96)
+    return amount0 + _checked(self.fee0 * int(amount)) // self.total_supply, amount1 + _checked(self.fee1 * int(amount)) // self.total_supply
+
+  def return_expected_balance_without_fees(self, price0, price1):
+    return np.frompyfunc(self._expected_balance_without_fees, 2, 2)(price0, price1)
+
+  def return_expected_balance(self, price0, price1):
+    return np.frompyfunc(self._expected_balance, 2, 2)(price0, price1)
+
+  def get_value_per_lp_at_price(self, price0, price1):
+    return np.frompyfunc(self._value_per_lp, 2, 1)(price0, price1)
+
+  def get_token_amounts_excluding_fees(self, amount, sqrt_price_x96):
+    # sqrt_price_x96 is the pool slot0 price, which the contract reads onchain
+    return np.frompyfunc(self._token_amounts_excluding_fees, 2, 2)(amount, sqrt_price_x96)
+
+  def get_token_amounts(self, amount, sqrt_price_x96):
+    return np.frompyfunc(self._token_amounts, 2, 2)(amount, sqrt_price_x96)
+
+
+# Vectorized entry points, inputs are ints or arrays of ints and outputs object arrays of ints
+mul_div = np.frompyfunc(lambda a, b, d: _mul_div(int(a), int(b), int(d)), 3, 1)
+mul_div_rounding_up = np.frompyfunc(lambda a, b, d: _mul_div_rounding_up(int(a), int(b), int(d)), 3, 1)
+get_sqrt_ratio_at_tick = np.frompyfunc(_get_sqrt_ratio_at_tick, 1, 1)
+get_tick_at_sqrt_ratio = np.frompyfunc(_get_tick_at_sqrt_ratio, 1, 1)
+get_liquidity_for_amounts = np.frompyfunc(lambda p, a, b, x, y: _get_liquidity_for_amounts(int(p), int(a), int(b), int(x), int(y)), 5, 1)
+get_amounts_for_liquidity = np.frompyfunc(_get_amounts_for_liquidity, 4, 2)
+range_ticks = np.frompyfunc(_range_ticks, 5, 2)
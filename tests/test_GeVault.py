@@ -557,3 +557,252 @@ def test_fees(accounts, weth, usdc, owner, lendingPool, gevault, oracle, Tokenis
   print("fees", gevault.getAdjustedBaseFee(False), baseFee, baseFee / 1.2)
   assert gevault.getAdjustedBaseFee(False) == baseFee / 1.2
 
+  
+  
+def test_funded_ticks(accounts, weth, usdc, owner, lendingPool, gevault, oracle, TokenisableRange):
+  # only the ticks holding assets are tracked, unwound and valued
+  usdc.approve(gevault, 2**256-1, {"from": owner})
+  gevault.deposit(usdc, 1000e6, {"from": owner})
+  funded = gevault.getFundedTicks()
+  assert len(funded) == 2
+  for k in range(gevault.getTickLength()):
+    assert (gevault.ticks(k) in funded) == (gevault.getTickBalance(k) > 0)
+  
+  weth.approve(gevault, 2**256-1, {"from": owner})
+  gevault.deposit(weth, 1e18, {"from": owner})
+  assert len(gevault.getFundedTicks()) == 4
+  
+  # when disabled, a withdrawal unwinds all ticks and leaves no funded tick behind
+  gevault.setEnabled(False, {"from": owner})
+  gevault.withdraw(gevault.balanceOf(owner) / 4, usdc, {"from": owner})
+  assert len(gevault.getFundedTicks()) == 0
+  # remaining assets sit idle in the vault and are still valued
+  assert gevault.getTVL() > 0
+
+
+def test_batched_orders(accounts, weth, usdc, owner, user, lendingPool, gevault, oracle, TokenisableRange):
+  # orders are queued, then settled together against a single snapshot
+  usdc.approve(gevault, 2**256-1, {"from": owner})
+  gevault.queueDeposit(usdc, 1000e6, {"from": owner})
+  assert gevault.reserved0() + gevault.reserved1() == 1000e6
+  assert gevault.getTVL() == 0
+  with brownie.reverts("GEV: Epoch Not Settled"): gevault.claim(0, {"from": owner})
+  
+  gevault.settle({"from": user})
+  assert gevault.currentEpoch() == 1
+  assert gevault.reserved0() + gevault.reserved1() == 0
+  assert nearlyEqual(gevault.getTVL(), 1000 * oracle.getAssetPrice(usdc))
+  liquidity = gevault.balanceOf(gevault)
+  gevault.claim(0, {"from": owner})
+  assert gevault.balanceOf(owner) == liquidity and gevault.balanceOf(gevault) == 0
+  
+  # withdrawal and deposit in the same epoch share one unwind and one redeploy
+  weth.approve(gevault, 2**256-1, {"from": owner})
+  gevault.queueDeposit(weth, 1e18, {"from": owner})
+  gevault.queueWithdraw(liquidity / 2, usdc, {"from": owner})
+  assert gevault.balanceOf(owner) == liquidity - liquidity / 2
+  gevault.settle({"from": user})
+  usdcBal = usdc.balanceOf(owner)
+  (shares, amount0, amount1) = gevault.claim(1, {"from": owner}).return_value
+  assert shares > 0
+  assert nearlyEqual(usdc.balanceOf(owner) - usdcBal, 500e6)
+  assert gevault.reserved0() + gevault.reserved1() == 0
+  
+  # empty epoch can't be settled
+  with brownie.reverts("GEV: Empty Epoch"): gevault.settle({"from": user})
+  
+  # orders of the current epoch can be cancelled, e.g. while settlement reverts
+  with brownie.reverts("GEV: No Deposit"): gevault.cancelDeposit({"from": owner})
+  with brownie.reverts("GEV: No Withdrawal"): gevault.cancelWithdraw({"from": owner})
+  usdcBal = usdc.balanceOf(owner)
+  liquidity = gevault.balanceOf(owner)
+  gevault.queueDeposit(usdc, 1000e6, {"from": owner})
+  gevault.queueWithdraw(liquidity, weth, {"from": owner})
+  gevault.cancelDeposit({"from": owner})
+  gevault.cancelWithdraw({"from": owner})
+  assert usdc.balanceOf(owner) == usdcBal and gevault.balanceOf(owner) == liquidity
+  assert gevault.reserved0() + gevault.reserved1() == 0
+  epoch = gevault.epochs(2)
+  assert epoch['deposit0'] + epoch['deposit1'] + epoch['withdrawLiquidity0'] + epoch['withdrawLiquidity1'] == 0
+  with brownie.reverts("GEV: Empty Epoch"): gevault.settle({"from": user})
+  
+  # deposits exceeding the cap are refunded
+  gevault.setTvlCap(1e11, {"from": owner})
+  gevault.queueDeposit(usdc, 1000e6, {"from": owner})
+  gevault.settle({"from": user})
+  epoch = gevault.epochs(2)
+  assert epoch['isSettled'] and epoch['isRefunded']
+  usdcBal = usdc.balanceOf(owner)
+  gevault.claim(2, {"from": owner})
+  assert usdc.balanceOf(owner) - usdcBal == 1000e6
+
+
+def test_batched_orders_gas(accounts, chain, usdc, owner, gevault):
+  # settlement cost is shared: gas per user drops as the batch grows, and below direct deposits
+  usdc.approve(gevault, 2**256-1, {"from": owner})
+  gevault.deposit(usdc, 1000e6, {"from": owner})
+  users = accounts[1:6]
+  for u in users:
+    usdc.transfer(u, 200e6, {"from": owner})
+    usdc.approve(gevault, 2**256-1, {"from": u})
+  
+  chain.snapshot()
+  directGas = sum(gevault.deposit(usdc, 100e6, {"from": u}).gas_used for u in users)
+  chain.revert()
+  
+  queueGas = gevault.queueDeposit(usdc, 100e6, {"from": users[0]}).gas_used
+  singleGas = gevault.settle({"from": owner}).gas_used + queueGas
+  queueGas = sum(gevault.queueDeposit(usdc, 100e6, {"from": u}).gas_used for u in users)
+  batchGas = gevault.settle({"from": owner}).gas_used + queueGas
+  print('gas per user: direct', directGas / len(users), 'batch of 1', singleGas, 'batch of', len(users), batchGas / len(users))
+  assert batchGas / len(users) < singleGas
+  assert batchGas < directGas
+
+
+def test_idle_buffer(accounts, weth, usdc, owner, lendingPool, gevault, oracle, TokenisableRange):
+  with brownie.reverts("Ownable: caller is not the owner"): gevault.setIdleBuffer(100e6, 1e17, {"from": accounts[1]})
+  gevault.setIdleBuffer(100e6, 1e17, {"from": owner})
+  
+  usdc.approve(gevault, 2**256-1, {"from": owner})
+  gevault.deposit(usdc, 1000e6, {"from": owner})
+  # buffer is kept in the vault and still counted in the TVL
+  assert nearlyEqual(usdc.balanceOf(gevault), 100e6)
+  assert nearlyEqual(gevault.getTVL(), 999 * oracle.getAssetPrice(usdc))
+  tickBalance = gevault.getTickBalance(1)
+  
+  # small withdrawal is paid from the buffer, ticks aren't touched
+  liquidity = gevault.balanceOf(owner)
+  gevault.withdraw(liquidity / 20, usdc, {"from": owner})
+  assert gevault.getTickBalance(1) == tickBalance
+  assert usdc.balanceOf(gevault) < 100e6
+  
+  # large withdrawal unwinds and tops up the buffer
+  gevault.withdraw(liquidity / 2, usdc, {"from": owner})
+  assert nearlyEqual(usdc.balanceOf(gevault), 100e6)
+  assert gevault.getTickBalance(1) < tickBalance
+
+
+def test_shift_tick(accounts, weth, usdc, owner, lendingPool, gevault, oracle, TokenisableRange):
+  assert gevault.tickIndex() == 1
+  length = gevault.getTickLength()
+  first_tick = gevault.ticks(0)
+  with brownie.reverts("GEV: Invalid Tick Index"): gevault.ticks(length)
+  
+  t = TokenisableRange.deploy({"from": owner})
+  t.initProxy(oracle, usdc, weth, 900e10, 900 * 1.0001 * 1e10, 900, 900 * 1.0001, True, {"from": owner})
+  gevault.shiftTick(t, {"from": owner})
+  
+  # new tick is first, others are offset by one and the active tick follows
+  assert gevault.getTickLength() == length + 1
+  assert gevault.ticks(0) == t and gevault.ticks(1) == first_tick
+  assert gevault.tickIndex() == 2
+  assert gevault.getActiveTickIndex() == 2
+
+
+def test_share_price_checkpoint(accounts, chain, weth, usdc, owner, lendingPool, gevault, oracle, TokenisableRange):
+  # disabled by default: deposits don't pay for a checkpoint
+  usdc.approve(gevault, 2**256-1, {"from": owner})
+  gevault.deposit(usdc, 1000e6, {"from": owner})
+  assert gevault.checkpoint()[1] == 0
+  
+  with brownie.reverts("Ownable: caller is not the owner"): gevault.setCheckpointBounds(100, 10, {"from": accounts[1]})
+  with brownie.reverts("GEV: Invalid Deviation"): gevault.setCheckpointBounds(100, 1e4, {"from": owner})
+  gevault.setCheckpointBounds(100, 10, {"from": owner})
+  
+  gevault.deposit(usdc, 1000e6, {"from": owner})
+  (sharePriceX8, blockNumber, price0, price1) = gevault.checkpoint()
+  assert blockNumber == chain.height
+  assert price0 == oracle.getAssetPrice(usdc) and price1 == oracle.getAssetPrice(weth)
+  
+  # served while fresh, close to the share price after the deposit
+  assert gevault.latestAnswer() == sharePriceX8
+  assert nearlyEqual(sharePriceX8, gevault.getTVL() * 1e18 // gevault.totalSupply())
+  chain.mine(101)
+  assert nearlyEqual(gevault.latestAnswer(), sharePriceX8)
+  
+  # withdrawals checkpoint too, disabling stops serving it
+  gevault.withdraw(gevault.balanceOf(owner) / 2, usdc, {"from": owner})
+  assert gevault.checkpoint()[1] == chain.height
+  gevault.setCheckpointBounds(0, 10, {"from": owner})
+  assert gevault.latestAnswer() == gevault.getTVL() * 10**18 // gevault.totalSupply()
+
+
+def test_push_ticks(accounts, owner, gevault, roerouter, contracts, GeVault):
+  tr, trb, r = contracts
+  g = GeVault.deploy(TREASURY, roerouter, UNISWAPPOOLV3, 0, "GeVault WETHUSDC", "GEV-ETHUSDC", WETH, False, {"from": owner})
+  addresses = [gevault.ticks(k) for k in range(gevault.getTickLength())]
+  with brownie.reverts("Ownable: caller is not the owner"): g.pushTicks(addresses, {"from": accounts[1]})
+  with brownie.reverts("GEV: Push Tick Overlap"): g.pushTicks(addresses[::-1], {"from": owner})
+  
+  g.pushTicks(addresses[:2], {"from": owner})
+  g.pushTicks(addresses[2:], {"from": owner})
+  assert [g.ticks(k) for k in range(g.getTickLength())] == addresses
+  assert g.getActiveTickIndex() == gevault.getActiveTickIndex()
+  
+  
+def test_import_ticks(accounts, owner, roerouter, contracts, GeVault):
+  tr, trb, r = contracts
+  for price in [1200, 1300, 1400]:
+    r.generateRange(price * 1e10, (price + 100) * 1e10, str(price), str(price + 100), trb, {"from": owner})
+  g = GeVault.deploy(TREASURY, roerouter, UNISWAPPOOLV3, 0, "GeVault WETHUSDC", "GEV-ETHUSDC", WETH, False, {"from": owner})
+  with brownie.reverts("Ownable: caller is not the owner"): g.importTicks(r, 0, 3, {"from": accounts[1]})
+  
+  g.importTicks(r, 0, 2, {"from": owner})
+  g.importTicks(r, 2, 3, {"from": owner})
+  assert g.getTickLength() == 3
+  assert [g.ticks(k) for k in range(3)] == [r.tokenisedTicker(k) for k in range(3)]
+  # already imported tickers are out of order
+  with brownie.reverts("GEV: Push Tick Overlap"): g.importTicks(r, 0, 1, {"from": owner})
+
+
+def test_reserve_tokens(accounts, owner, interface, lendingPool, gevault, contracts, GeVault, roerouter):
+  tr, trb, r = contracts
+  tick = gevault.ticks(0)
+  aToken = lendingPool.getReserveData(tick)[7]
+  # ticks listed before being pushed are cached, the views read the cache
+  assert gevault.getTickBalance(0) == interface.ERC20(aToken).balanceOf(gevault)
+  with brownie.reverts("Ownable: caller is not the owner"): gevault.syncReserveTokens(tick, {"from": accounts[1]})
+  tx = gevault.syncReserveTokens(tick, {"from": owner})
+  assert tx.events["SyncReserveTokens"]["aToken"] == aToken
+  assert tx.events["SyncReserveTokens"]["debtToken"] == lendingPool.getReserveData(tick)[9]
+
+  # a tick that isn't listed isn't cached
+  r.generateRange(1200e10, 1300e10, "1200", "1300", trb, {"from": owner})
+  g = GeVault.deploy(TREASURY, roerouter, UNISWAPPOOLV3, 0, "GeVault WETHUSDC", "GEV-ETHUSDC", WETH, False, {"from": owner})
+  g.importTicks(r, 0, 1, {"from": owner})
+  tx = g.syncReserveTokens(r.tokenisedTicker(0), {"from": owner})
+  assert tx.events["SyncReserveTokens"]["aToken"] == NULL
+  with brownie.reverts(): g.getTickBalance(0)
+
+
+def test_deposit_pair(accounts, weth, usdc, owner, lendingPool, gevault, oracle, TokenisableRange):
+  usdc.approve(gevault, 2**256-1, {"from": owner})
+  weth.approve(gevault, 2**256-1, {"from": owner})
+  with brownie.reverts("GEV: Deposit Zero"): gevault.depositPair(0, 0, {"from": owner})
+  
+  # both legs pay the fee against the empty vault snapshot: 0.1%
+  gevault.depositPair(1000e6, 1e18, {"from": owner})
+  assert usdc.balanceOf(TREASURY) == 1e6 and weth.balanceOf(TREASURY) == 1e15
+  assert len(gevault.getFundedTicks()) == 4
+  value = 1000 * oracle.getAssetPrice(usdc) + oracle.getAssetPrice(weth)
+  assert nearlyEqual(gevault.getTVL(), value * 0.999)
+  assert nearlyEqual(gevault.balanceOf(owner), value * 0.999 * 1e10)
+  
+  # single token legs behave like deposit
+  liquidity = gevault.balanceOf(owner)
+  gevault.depositPair(0, 1e18, {"from": owner})
+  assert gevault.balanceOf(owner) > liquidity
+
+
+def test_deploy_assets(accounts, weth, usdc, owner, lendingPool, gevault, oracle, TokenisableRange):
+  usdc.approve(gevault, 2**256-1, {"from": owner})
+  weth.approve(gevault, 2**256-1, {"from": owner})
+  tx = gevault.depositPair(1000e6, 1e18, {"from": owner})
+  # each of the 4 active ticks gets a single deposit, all minted tickers are stashed in the lending pool
+  assert len(tx.events["Deposit"]) >= 4
+  index = gevault.getActiveTickIndex()
+  for k in range(index, index + 4):
+    t = TokenisableRange.at(gevault.ticks(k))
+    assert gevault.getTickBalance(k) > 0 and t.balanceOf(gevault) == 0
+
+
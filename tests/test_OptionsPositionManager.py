@@ -224,6 +224,11 @@ def test_unallowed_flashloan_call(pm, owner, roerouter):
   with brownie.reverts("OPM: Call Unallowed"):
     pm.executeOperation([], [], [], owner, calldata, {"from": owner})
 
+  # batch liquidation direct call unallowed
+  calldata = encode_abi(['uint8', 'uint', 'address[]', 'address[]', 'uint[]', 'address'], [2, poolId, [], [], [], NULL])
+  with brownie.reverts("OPM: Call Unallowed"):
+    pm.executeOperation([], [], [], owner, calldata, {"from": owner})
+
 
 
 def test_swap(accounts, chain, pm, owner, timelock, lendingPool, weth, usdc, user, interface, router, oracle, contracts, TokenisableRange, config, OptionsPositionManager, roerouter):
@@ -438,6 +443,89 @@ def test_reduce(accounts, chain, pm, owner, timelock, lendingPool, weth, usdc, u
   liquidationAmount = 1e16
   l = pm.liquidate(poolId, user, [ticker0, ticker1], [liquidationAmount, liquidationAmount], usdc, {"from": liquidator} )
 
+  # liquidate in batch: same tickers are flashloaned and recreated once
+  with brownie.reverts("ARRAY_LEN_MISMATCH"): pm.liquidateMany(poolId, [user], [ticker0, ticker1], [liquidationAmount], usdc, {"from": liquidator} )
+  debt0 = interface.ERC20(lendingPool.getReserveData(ticker0)[9])
+  debt1 = interface.ERC20(lendingPool.getReserveData(ticker1)[9])
+  roeUsdc = interface.ERC20(lendingPool.getReserveData(usdc)[7])
+  legs = [ticker1, ticker0, ticker1]
+  debt0bef, debt1bef, liqbef = debt0.balanceOf(user), debt1.balanceOf(user), roeUsdc.balanceOf(liquidator)
+
+  # reference: the same legs as single liquidations
+  chain.snapshot()
+  singleGas = sum(pm.liquidate(poolId, user, [t], [liquidationAmount], usdc, {"from": liquidator}).gas_used for t in legs)
+  singleFees = roeUsdc.balanceOf(liquidator) - liqbef
+  chain.revert()
+
+  l = pm.liquidateMany(poolId, [user] * 3, legs, [liquidationAmount] * 3, usdc, {"from": liquidator} )
+  assert len(l.events["LiquidatePosition"]) == 3 and len(l.events["ClosePosition"]) == 2
+  # each leg repays its debt, interest accrued meanwhile is negligible
+  assert debt0bef - debt0.balanceOf(user) == pytest.approx(liquidationAmount, rel=1e-3)
+  assert debt1bef - debt1.balanceOf(user) == pytest.approx(2 * liquidationAmount, rel=1e-3)
+  # liquidator takes no debt and earns the same fees as with single liquidations
+  assert debt0.balanceOf(liquidator) == 0 and debt1.balanceOf(liquidator) == 0
+  batchFees = roeUsdc.balanceOf(liquidator) - liqbef
+  assert batchFees > 0 and batchFees == pytest.approx(singleFees, rel=1e-2)
+  print('liquidate gas: batch', l.gas_used, 'singles', singleGas)
+  assert l.gas_used < singleGas
+
+
+
+def test_v3_swap_route(accounts, chain, pm, owner, timelock, lendingPool, weth, usdc, user, interface, oracle, contracts, TokenisableRange, prep_ranger, roerouter):
+  tr, trb, r = contracts
+  lendingPool.PMAssign(pm, {"from": timelock })
+  poolId = roerouter.getPoolsLength() - 1
+  roerouter.setSwapRoute(poolId, ROUTERV3, 500, {"from": owner})
+  ticker1 = TokenisableRange.at(r.tokenisedTicker(2))
+  borrowAmount = 1e17
+  interface.ICreditDelegationToken( lendingPool.getReserveData(ticker1)[9] ).approveDelegation(pm, 2**256-1, {"from": user})
+  wbalbef = interface.ERC20(lendingPool.getReserveData(weth)[7]).balanceOf(user)
+  ubalbef = interface.ERC20(lendingPool.getReserveData(usdc)[7]).balanceOf(user)
+
+  # buy OTM call, swap to ITM put through the V3 pool: all in USDC
+  pm.buyOptions(poolId, [ticker1], [borrowAmount], [weth], {"from": user})
+  assert interface.ERC20(lendingPool.getReserveData(weth)[7]).balanceOf(user) == wbalbef
+  assert interface.ERC20(lendingPool.getReserveData(usdc)[7]).balanceOf(user) - ubalbef > ticker1.latestAnswer() * borrowAmount / 1e18 / 100 * 0.98
+  
+  # close repays with an exact output V3 swap
+  pm.close(poolId, user, ticker1, 0, usdc, {"from": user})
+  assert interface.ERC20(lendingPool.getReserveData(ticker1)[9]).balanceOf(user) == 0
+
+
+
+def test_close_many(accounts, chain, pm, owner, timelock, lendingPool, weth, usdc, user, interface, oracle, contracts, TokenisableRange, prep_ranger, roerouter):
+  tr, trb, r = contracts
+  lendingPool.PMAssign(pm, {"from": timelock })
+  poolId = roerouter.getPoolsLength() - 1
+  ticker0 = TokenisableRange.at(r.tokenisedTicker(0))
+  ticker1 = TokenisableRange.at(r.tokenisedTicker(2))
+  borrowAmount = 1e17
+  debt0 = interface.ERC20(lendingPool.getReserveData(ticker0)[9])
+  debt1 = interface.ERC20(lendingPool.getReserveData(ticker1)[9])
+  interface.ICreditDelegationToken(debt0).approveDelegation(pm, 2**256-1, {"from": user})
+  interface.ICreditDelegationToken(debt1).approveDelegation(pm, 2**256-1, {"from": user})
+  # strangle: buy a put and a call
+  pm.buyOptions(poolId, [ticker0, ticker1], [borrowAmount, borrowAmount], [NULL, NULL], {"from": user})
+
+  # legs are sorted by address
+  legs = sorted([ticker0, ticker1], key=lambda t: int(t.address, 16))
+
+  with brownie.reverts("OPM: Array Length Mismatch"): pm.closeMany(poolId, user, legs, [0], usdc, {"from": user})
+  with brownie.reverts("OPM: Invalid Collateral Asset"): pm.closeMany(poolId, user, legs, [0, 0], ROUTER, {"from": user})
+  with brownie.reverts("OPM: No Debt"): pm.closeMany(poolId, owner, [ticker0], [0], usdc, {"from": user})
+  # repeated or unsorted legs would count the token needs twice
+  with brownie.reverts("OPM: Unsorted Debt Assets"): pm.closeMany(poolId, user, [ticker0, ticker0], [0, 0], usdc, {"from": user})
+  with brownie.reverts("OPM: Unsorted Debt Assets"): pm.closeMany(poolId, user, legs[::-1], [0, 0], usdc, {"from": user})
+
+  # partial then full close of both legs
+  tx = pm.closeMany(poolId, user, legs, [borrowAmount / 2, borrowAmount / 2], usdc, {"from": user})
+  assert len(tx.events["ReducedPosition"]) == 2
+  assert nearlyEqual(debt0.balanceOf(user), borrowAmount / 2) and nearlyEqual(debt1.balanceOf(user), borrowAmount / 2)
+  pm.closeMany(poolId, user, legs, [0, 0], usdc, {"from": user})
+  assert debt0.balanceOf(user) == 0 and debt1.balanceOf(user) == 0
+  # remaining WETH was swapped back to the USDC collateral
+  assert interface.ERC20(lendingPool.getReserveData(weth)[7]).balanceOf(user) == 0
+
 
 
 def test_sandwich(accounts, chain, pm, owner, timelock, lendingPool, weth, usdc, user, interface, router, oracle, contracts, TokenisableRange, prep_ranger, config, OptionsPositionManager, roerouter):
@@ -515,6 +603,13 @@ def test_swapTokensForExactTokens(owner, accounts, Test_OptionsPositionManager,
   assert weth.balanceOf(t) == 1e15
   
   
+def test_sumByAsset(owner, Test_OptionsPositionManager, roerouter, usdc, weth):
+  t = Test_OptionsPositionManager.deploy(roerouter, {"from": owner})
+  assert t.test_sumByAsset([usdc, weth, usdc], [1, 2, 3]) == ([usdc, weth], [4, 2])
+  assert t.test_sumByAsset([], []) == ([], [])
+
+
+
 def test_getTargetAmountFromOracle(owner, accounts, Test_OptionsPositionManager, usdc, weth, contracts, TokenisableRange, roerouter, router, NullOracle, oracle):
   t = Test_OptionsPositionManager.deploy(roerouter, {"from": owner})
   nullOracleUsd = NullOracle.deploy(usdc, {"from": owner})
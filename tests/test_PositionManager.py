@@ -6,6 +6,7 @@ LENDING_POOL_ADDRESSES_PROVIDER = "0x01b76559D512Fa28aCc03630E8954405BcBB1E02"
 USDC = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
 WETH = "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"
 ROUTER="0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D"
+ROUTERV3="0xE592427A0AEce92De3Edee1F18E0157C05861564"
 
 
 @pytest.fixture(scope="module", autouse=True)
@@ -22,3 +23,29 @@ def test_deployment(owner, roerouter, PositionManager):
   pm = PositionManager.deploy(roerouter, {"from": owner})
   
 
+
+# Pool records are snapshotted on first use and reloaded on RoeRouter changes, deprecated pools are resolved from RoeRouter on each use
+def test_pool_context(owner, user, roerouter, interface, Test_PositionManager):
+  pm = Test_PositionManager.deploy(roerouter, {"from": owner})
+  lpap = interface.ILendingPoolAddressesProvider(LENDING_POOL_ADDRESSES_PROVIDER)
+  context = lambda tx: [str(a).lower() for a in tx.return_value]
+  expected = [a.lower() for a in (lpap.getLendingPool(), lpap.getPriceOracle(), ROUTER, USDC, WETH, NULL)] + ["0"]
+  first = pm.test_getPoolContext(0, {"from": user})
+  assert context(first) == expected
+  second = pm.test_getPoolContext(0, {"from": user})
+  assert context(second) == expected
+  assert second.gas_used < first.gas_used - 20000
+  
+  # RoeRouter changes bump the pool version, which reloads the snapshot
+  roerouter.setSwapRoute(0, ROUTERV3, 500, {"from": owner})
+  expected = expected[:5] + [ROUTERV3.lower(), "500"]
+  reloaded = pm.test_getPoolContext(0, {"from": user})
+  assert context(reloaded) == expected
+  assert reloaded.gas_used > second.gas_used
+  assert pm.test_getPoolContext(0, {"from": user}).gas_used < reloaded.gas_used
+  
+  roerouter.deprecatePool(0, {"from": owner})
+  deprecated = pm.test_getPoolContext(0, {"from": user})
+  assert context(deprecated) == expected
+  assert pm.test_getPoolContext(0, {"from": user}).gas_used > second.gas_used
+  with brownie.reverts(): pm.test_getPoolContext(1, {"from": user})
@@ -241,6 +241,196 @@ def test_TR(accounts, owner, lendingPool, weth, usdc, user, interface, router, r
 
 
 
+# Pool address and range sqrt prices are cached at initialization
+def test_TR_cached_parameters(owner, weth, usdc, interface, oracle, TokenisableRange, TickMath):
+  tr = TokenisableRange.deploy({"from": owner})
+  with brownie.reverts("!InitProxy"): tr.cacheRangeParameters({"from": owner})
+  tr.initProxy(oracle, usdc, weth, RANGE_LIMITS[0]*1e10, RANGE_LIMITS[4]*1e10, "500", "5000", False)
+  
+  pool = interface.IUniswapV3Factory("0x1F98431c8aD98523631AE4a59f267346ea31F984").getPool(usdc, weth, tr.feeTier() * 100)
+  assert tr.pool() == pool
+  assert tr.sqrtRatioLowerX96() == TickMath[-1].getSqrtRatioAtTick(tr.lowerTick())
+  assert tr.sqrtRatioUpperX96() == TickMath[-1].getSqrtRatioAtTick(tr.upperTick())
+  with brownie.reverts("TR: Already Cached"): tr.cacheRangeParameters({"from": owner})
+
+
+# Uniswap position manager is approved once, for the max amount
+def test_TR_approvals(owner, weth, usdc, oracle, TokenisableRange, liquidityRatio):
+  usdAmount, ethAmount = liquidityRatio(RANGE_LIMITS[0], RANGE_LIMITS[4]) 
+  tr = TokenisableRange.deploy({"from": owner})
+  tr.initProxy(oracle, usdc, weth, RANGE_LIMITS[0]*1e10, RANGE_LIMITS[4]*1e10, "500", "5000", False, {"from": owner})
+  usdc.approve(tr, 2**256-1, {"from": owner})  
+  weth.approve(tr, 2**256-1, {"from": owner})
+  tr.init(usdAmount, ethAmount, {"from": owner})
+  posMgr = tr.POS_MGR()
+  assert usdc.allowance(tr, posMgr) > 2**255 and weth.allowance(tr, posMgr) > 2**255
+  tx = tr.deposit(usdAmount, ethAmount, {"from": owner})
+  assert not any(e.address == usdc.address and e["owner"] == tr for e in (tx.events["Approval"] if "Approval" in tx.events else []))
+  assert usdc.allowance(tr, posMgr) > 2**255 and weth.allowance(tr, posMgr) > 2**255
+
+
+# Cached LP price is served while fresh and refreshed on deposit and withdraw
+def test_TR_price_cache(chain, owner, user, weth, usdc, oracle, TokenisableRange, liquidityRatio):
+  usdAmount, ethAmount = liquidityRatio(RANGE_LIMITS[0], RANGE_LIMITS[4]) 
+  tr = TokenisableRange.deploy({"from": owner})
+  tr.initProxy(oracle, usdc, weth, RANGE_LIMITS[0]*1e10, RANGE_LIMITS[4]*1e10, "500", "5000", False, {"from": owner})
+  usdc.approve(tr, 2**256-1, {"from": owner})  
+  weth.approve(tr, 2**256-1, {"from": owner})
+  tr.init(usdAmount, ethAmount, {"from": owner})
+  
+  with brownie.reverts("TR: Price Cache Disabled"): tr.poke({"from": user})
+  with brownie.reverts("Unallowed call"): tr.setPriceCacheAge(10, {"from": user})
+  tr.setPriceCacheAge(10, {"from": owner})
+  (priceX8, blockNumber, token0Price, token1Price) = tr.priceCache()
+  assert blockNumber == chain.height and priceX8 == tr.latestAnswer()
+  assert token0Price == oracle.getAssetPrice(usdc) and token1Price == oracle.getAssetPrice(weth)
+  
+  tr.deposit(usdAmount, ethAmount, {"from": owner})
+  assert tr.priceCache()[1] == chain.height
+  tr.withdraw(tr.balanceOf(owner) / 2, 0, 0, {"from": owner})
+  assert tr.priceCache()[1] == chain.height
+  assert nearlyEqual(tr.latestAnswer(), priceX8)
+  
+  # stale cache is recomputed, poke refreshes it
+  chain.mine(11)
+  assert nearlyEqual(tr.latestAnswer(), priceX8)
+  tr.poke({"from": user})
+  assert tr.priceCache()[1] == chain.height
+  
+  tr.setPriceCacheAge(0, {"from": owner})
+  assert tr.priceCache()[1] == 0
+
+
+# Deposits skip fee collection until the harvest interval has passed, accounting for pending fees
+def test_TR_lazy_harvest(chain, owner, user, weth, usdc, oracle, routerV3, TokenisableRange, liquidityRatio):
+  usdAmount, ethAmount = liquidityRatio(RANGE_LIMITS[0], RANGE_LIMITS[4]) 
+  tr = TokenisableRange.deploy({"from": owner})
+  tr.initProxy(oracle, usdc, weth, RANGE_LIMITS[0]*1e10, RANGE_LIMITS[4]*1e10, "500", "5000", False, {"from": owner})
+  usdc.approve(tr, 2**256-1, {"from": owner})  
+  weth.approve(tr, 2**256-1, {"from": owner})
+  tr.init(usdAmount, ethAmount, {"from": owner})
+  # harvest time isn't tracked without thresholds
+  tr.claimFee({"from": owner})
+  assert tr.lastHarvest() == 0
+  with brownie.reverts("Unallowed call"): tr.setHarvestThresholds(86400, 0, {"from": user})
+  tr.setHarvestThresholds(86400, 0, {"from": owner})
+  tr.claimFee({"from": owner})
+  lastHarvest = tr.lastHarvest()
+  
+  # create fees by swapping
+  usdc.approve(routerV3, 2**256-1, {"from": owner} )
+  weth.approve(routerV3, 2**256-1, {"from": owner} )
+  routerV3.exactInputSingle([usdc, weth, 500, owner, 2e20, 1e10, 0, 0], {"from": owner})
+  routerV3.exactInputSingle([weth, usdc, 500, owner, 2e20, 1e15, 0, 0], {"from": owner})
+  (pending0, pending1) = tr.getPendingFees()
+  assert pending0 > 0 and pending1 > 0
+  
+  # fees stay in the position, depositor pays its share of pending fees
+  supply = tr.totalSupply()
+  tr.deposit(usdAmount, ethAmount, {"from": owner})
+  assert tr.lastHarvest() == lastHarvest
+  assert tr.getPendingFees()[0] >= pending0
+  assert tr.totalSupply() < 2 * supply
+  
+  # once the interval has passed, deposit collects
+  chain.sleep(86401)
+  tr.deposit(usdAmount, ethAmount, {"from": owner})
+  assert tr.lastHarvest() > lastHarvest
+  assert tr.getPendingFees() == (0, 0)
+
+  # value threshold only: deposits collect once pending fees are worth it, regardless of time
+  tr.setHarvestThresholds(0, 1e12, {"from": owner})
+  routerV3.exactInputSingle([usdc, weth, 500, owner, 2e20, 1e10, 0, 0], {"from": owner})
+  routerV3.exactInputSingle([weth, usdc, 500, owner, 2e20, 1e15, 0, 0], {"from": owner})
+  (pending0, pending1) = tr.getPendingFees()
+  assert pending0 > 0 and pending1 > 0
+  tr.deposit(usdAmount, ethAmount, {"from": owner})
+  assert tr.getPendingFees()[0] >= pending0
+  tr.setHarvestThresholds(0, 1, {"from": owner})
+  tr.deposit(usdAmount, ethAmount, {"from": owner})
+  assert tr.getPendingFees() == (0, 0)
+
+
+# Offchain port of the range math matches the contracts bit for bit
+def test_TR_math_port(owner, weth, usdc, oracle, routerV3, interface, TickMath, Test_RangeMath, TokenisableRange, liquidityRatio):
+  tr_math = pytest.importorskip("scripts.tr_math")
+  harness = Test_RangeMath.deploy({"from": owner})
+  ticks = [tr_math.MIN_TICK, -201234, -1, 0, 1, 76543, tr_math.MAX_TICK]
+  for tick in ticks:
+    sqrtRatio = TickMath[-1].getSqrtRatioAtTick(tick)
+    assert sqrtRatio == tr_math.get_sqrt_ratio_at_tick(tick)
+    if tick < tr_math.MAX_TICK: 
+      assert TickMath[-1].getTickAtSqrtRatio(sqrtRatio + 12345) == tr_math.get_tick_at_sqrt_ratio(sqrtRatio + 12345)
+  assert harness.mulDiv(2**200, 3**50, 7**40) == tr_math.mul_div(2**200, 3**50, 7**40)
+  assert harness.mulDivRoundingUp(2**200, 3**50, 7**40) == tr_math.mul_div_rounding_up(2**200, 3**50, 7**40)
+  sqrtRatios = [tr_math.get_sqrt_ratio_at_tick(t) for t in [-202000, -201000, -200000]]
+  for sqrtPrice in [tr_math.get_sqrt_ratio_at_tick(t) for t in [-203000, -201337, -199000]]:
+    liquidity = harness.getLiquidityForAmounts(sqrtPrice, sqrtRatios[0], sqrtRatios[2], 1000e6, 1e18)
+    assert liquidity == tr_math.get_liquidity_for_amounts(sqrtPrice, sqrtRatios[0], sqrtRatios[2], 10**9, 10**18)
+    assert harness.getAmountsForLiquidity(sqrtPrice, sqrtRatios[2], sqrtRatios[0], liquidity) == tr_math.get_amounts_for_liquidity(sqrtPrice, sqrtRatios[2], sqrtRatios[0], liquidity)
+  
+  # range and ticker valuation, with uncompounded fees
+  usdAmount, ethAmount = liquidityRatio(RANGE_LIMITS[0], RANGE_LIMITS[4]) 
+  tr = TokenisableRange.deploy({"from": owner})
+  tr.initProxy(oracle, usdc, weth, RANGE_LIMITS[0]*1e10, RANGE_LIMITS[4]*1e10, "500", "5000", False, {"from": owner})
+  assert (tr.lowerTick(), tr.upperTick()) == tr_math.range_ticks(RANGE_LIMITS[0]*10**10, RANGE_LIMITS[4]*10**10, 6, 18, False)
+  assert (tr.lowerTick(), tr.upperTick()) != tr_math.range_ticks(RANGE_LIMITS[0]*10**10, RANGE_LIMITS[4]*10**10, 6, 18, True)
+  usdc.approve(tr, 2**256-1, {"from": owner})  
+  weth.approve(tr, 2**256-1, {"from": owner})
+  tr.init(usdAmount, ethAmount, {"from": owner})
+  usdc.approve(routerV3, 2**256-1, {"from": owner} )
+  weth.approve(routerV3, 2**256-1, {"from": owner} )
+  routerV3.exactInputSingle([usdc, weth, 500, owner, 2e20, 1e10, 0, 0], {"from": owner})
+  routerV3.exactInputSingle([weth, usdc, 500, owner, 2e20, 1e15, 0, 0], {"from": owner})
+  tr.claimFee({"from": owner})
+  
+  state = tr_math.RangeState.from_contract(tr)
+  sqrtPrice = interface.IUniswapV3Pool(tr.pool()).slot0()[0]
+  for price0, price1 in [(1e8, 400e8), (99999123, 1234567890123), (1e8, 6000e8), (oracle.getAssetPrice(usdc), oracle.getAssetPrice(weth))]:
+    assert tr.returnExpectedBalance(price0, price1) == state.return_expected_balance(int(price0), int(price1))
+    assert tr.getValuePerLPAtPrice(price0, price1) == state.get_value_per_lp_at_price(int(price0), int(price1))
+  for amount in [1, 12345678, tr.totalSupply() // 3, tr.totalSupply()]:
+    assert tr.getTokenAmounts(amount) == state.get_token_amounts(amount, sqrtPrice)
+
+
+# Range state rebuilt from logs matches the contract, and resuming from a checkpoint gives the same result
+def test_TR_indexer(tmp_path, web3, chain, owner, user, weth, usdc, oracle, routerV3, TokenisableRange, liquidityRatio):
+  tr_indexer = pytest.importorskip("scripts.tr_indexer")
+  start = chain.height + 1
+  usdAmount, ethAmount = liquidityRatio(RANGE_LIMITS[0], RANGE_LIMITS[4])
+  tr = TokenisableRange.deploy({"from": owner})
+  tr.initProxy(oracle, usdc, weth, RANGE_LIMITS[0]*1e10, RANGE_LIMITS[4]*1e10, "500", "5000", False, {"from": owner})
+  usdc.approve(tr, 2**256-1, {"from": owner})
+  weth.approve(tr, 2**256-1, {"from": owner})
+  tr.init(usdAmount, ethAmount, {"from": owner})
+  usdc.approve(routerV3, 2**256-1, {"from": owner} )
+  weth.approve(routerV3, 2**256-1, {"from": owner} )
+  routerV3.exactInputSingle([usdc, weth, 500, owner, 2e20, 1e10, 0, 0], {"from": owner})
+  routerV3.exactInputSingle([weth, usdc, 500, owner, 2e20, 1e15, 0, 0], {"from": owner})
+  tr.claimFee({"from": owner})
+
+  path = str(tmp_path / "tr_index.npz")
+  indexer = tr_indexer.index(web3, path, tr.POS_MGR(), from_block=start)
+  expected = (tr.tokenId(), tr.liquidity(), tr.fee0(), tr.fee1(), tr.totalSupply())
+  assert tuple(indexer.range_state(tr).values()) == expected and indexer.last_block == chain.height
+
+  # donations aren't fees, transfers between holders don't change the supply
+  usdc.transfer(tr, 1e6, {"from": owner})
+  routerV3.exactInputSingle([usdc, weth, 500, owner, 2e20, 1e10, 0, 0], {"from": owner})
+  tr.deposit(usdAmount, ethAmount, {"from": owner})
+  tr.transfer(user, tr.balanceOf(owner) / 3, {"from": owner})
+  tr.withdraw(tr.balanceOf(user), 0, 0, {"from": user})
+
+  resumed = tr_indexer.index(web3, path, from_block=start)
+  assert tuple(resumed.range_state(tr).values()) == (tr.tokenId(), tr.liquidity(), tr.fee0(), tr.fee1(), tr.totalSupply())
+  history = resumed.history(tr)
+  assert tuple(history[c][-1] for c in tr_indexer.HISTORY_COLUMNS) == (tr.liquidity(), tr.fee0(), tr.fee1(), tr.totalSupply())
+  # init, claim, deposit and withdraw rows
+  assert len(history["block"]) == 4 and tuple(history[c][1] for c in tr_indexer.HISTORY_COLUMNS) == expected[1:]
+  single = tr_indexer.RangeIndexer(tr.POS_MGR()).sync(web3, from_block=start)
+  assert single.range_state(tr) == resumed.range_state(tr)
+
+
 # Check that token inflation isnt possible by depositing assets in the underlying NFT
 def test_TR_inflation(accounts, owner, lendingPool, weth, usdc, user, interface, router, routerV3, oracle, TokenisableRange, liquidityRatio):
   usdAmount, ethAmount = liquidityRatio(RANGE_LIMITS[0], RANGE_LIMITS[4]) 
@@ -460,4 +650,83 @@ def test_proxy_upgrade(owner, timelock, lendingPool, weth, usdc, user, interface
   usdc.approve(t, 2**256-1, {"from": owner})
   weth.approve(t, 2**256-1, {"from": owner})
   TokenisableRange.at(r.tokenisedRanges(1)).deposit(usdAmount, ethAmount, {"from": owner})
-  assert TokenisableRange.at(r.tokenisedRanges(1)).balanceOf(owner) == ownerBal * 2
\ No newline at end of file
+  assert TokenisableRange.at(r.tokenisedRanges(1)).balanceOf(owner) == ownerBal * 2
+
+# Ranges created with the V1 storage layout keep their state through the beacon upgrade and migrate lazily
+def test_TR_upgrade_packed_layout(owner, user, weth, usdc, oracle, routerV3, TokenisableRange, TokenisableRangeV1, UpgradeableBeacon, BeaconProxy, liquidityRatio):
+  usdAmount, ethAmount = liquidityRatio(RANGE_LIMITS[0], RANGE_LIMITS[4]) 
+  beacon = UpgradeableBeacon.deploy(TokenisableRangeV1.deploy({"from": owner}), {"from": owner})
+  proxy = BeaconProxy.deploy(beacon, b"", {"from": owner})
+  t = TokenisableRangeV1.at(proxy)
+  t.initProxy(oracle, usdc, weth, RANGE_LIMITS[0]*1e10, RANGE_LIMITS[4]*1e10, "500", "5000", False, {"from": owner})
+  usdc.approve(t, 2**256-1, {"from": owner})  
+  weth.approve(t, 2**256-1, {"from": owner})
+  t.init(usdAmount, ethAmount, {"from": owner})
+  # create uncompounded fees
+  usdc.approve(routerV3, 2**256-1, {"from": owner} )
+  weth.approve(routerV3, 2**256-1, {"from": owner} )
+  routerV3.exactInputSingle([usdc, weth, 500, owner, 2e20, 1e10, 0, 0], {"from": owner})
+  routerV3.exactInputSingle([weth, usdc, 500, owner, 2e20, 1e15, 0, 0], {"from": owner})
+  t.claimFee({"from": owner})
+  
+  getters = ["lowerTick", "upperTick", "feeTier", "status", "liquidity", "fee0", "fee1", "tokenId", "TOKEN0", "TOKEN1", "ORACLE", "name", "symbol", "totalSupply"]
+  state = [getattr(t, g)() for g in getters]
+  price = t.latestAnswer()
+  assert state[5] > 0 and state[6] > 0
+  
+  beacon.upgradeTo(TokenisableRange.deploy({"from": owner}), {"from": owner})
+  t = TokenisableRange.at(proxy)
+  assert [getattr(t, g)() for g in getters] == state
+  assert t.latestAnswer() == price
+  assert t.pool() == NULL
+  t.cacheRangeParameters({"from": user})
+  assert t.latestAnswer() == price
+  
+  # first state changing call moves the storage, later ones don't
+  tx = t.deposit(usdAmount, ethAmount, {"from": owner})
+  assert "Migrate" in tx.events
+  assert [getattr(t, g)() for g in getters[:4]] == state[:4]
+  assert "Migrate" not in t.migrate({"from": user}).events
+  assert t.liquidity() > state[4] and t.totalSupply() > state[-1]
+  t.withdraw(t.balanceOf(owner), 0, 0, {"from": owner})
+  assert t.liquidity() == 0 and t.fee0() == 0 and t.fee1() == 0
+
+
+# Lens reads the state of all ranges and tickers in one call
+def test_lens(owner, lendingPool, contracts, prep_ranger, TokenisableRange, TokenisableRangeLens, interface):
+  tr, trb, r = contracts
+  lens = TokenisableRangeLens.deploy({"from": owner})
+  data = lens.getRangeManagerData(r)
+  n = r.getStepListLength()
+  assert len(data) == 2 * n
+  for k, d in enumerate(data):
+    t = TokenisableRange.at(r.tokenisedRanges(k) if k < n else r.tokenisedTicker(k - n))
+    reserve = lendingPool.getReserveData(t)
+    assert d[0] == t and d[1] == t.TOKEN0()[0] and d[2] == t.TOKEN1()[0]
+    assert (d[3], d[4], d[5], d[6], d[7], d[8]) == (t.lowerTick(), t.upperTick(), t.liquidity(), t.totalSupply(), t.fee0(), t.fee1())
+    assert (d[9], d[10]) == t.getTokenAmounts(t.totalSupply()) and d[11] == t.latestAnswer()
+    assert d[12] == reserve[7] and d[13] == reserve[9]
+    assert d[14] == interface.ERC20(reserve[7]).totalSupply() and d[15] == interface.ERC20(reserve[9]).totalSupply()
+  
+  # ranges not listed in the lending pool have no reserve data
+  fresh = TokenisableRange.deploy({"from": owner})
+  assert lens.getRangesData(lendingPool, [r.tokenisedRanges(0), fresh])[1][12:] == (NULL, NULL, 0, 0)
+
+
+# Seed several ranges in one call
+def test_init_ranges(owner, user, weth, usdc, contracts, TokenisableRange, prep_ranger, liquidityRatio):
+  tr, trb, r = contracts
+  first = r.getStepListLength()
+  ranges = [[RANGE_LIMITS[4], 6000], [6000, 7000]]
+  for i in ranges:
+    r.generateRange(i[0]*1e10, i[1]*1e10, i[0], i[1], trb, {"from": owner})
+  trs = [r.tokenisedRanges(first + i) for i in range(2)]
+  amounts = [liquidityRatio(i[0], i[1]) for i in ranges]
+  
+  with brownie.reverts("Ownable: caller is not the owner"): r.initRanges(trs, [a[0] for a in amounts], [a[1] for a in amounts], {"from": user})
+  with brownie.reverts("RM: Invalid Length"): r.initRanges(trs, [a[0] for a in amounts], [0], {"from": owner})
+  r.initRanges(trs, [a[0] for a in amounts], [a[1] for a in amounts], {"from": owner})
+  for t in trs:
+    assert TokenisableRange.at(t).balanceOf(owner) == 1e18
+  # nothing left in the manager
+  assert usdc.balanceOf(r) == 0 and weth.balanceOf(r) == 0
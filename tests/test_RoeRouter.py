@@ -7,6 +7,7 @@ USDC = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
 WETH = "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"
 WETHUSDC = "0xb4e16d0168e52d35cacd2c6185b44281ec28c9dc"
 AMMROUTER="0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D"
+ROUTERV3="0xE592427A0AEce92De3Edee1F18E0157C05861564"
 LENDING_POOL_ADDRESSES_PROVIDER = "0x01b76559D512Fa28aCc03630E8954405BcBB1E02"
 
 
@@ -59,8 +60,30 @@ def test_deprecate_pool(accounts, user, owner, roerouter):
   roerouter.addPool(LENDING_POOL_ADDRESSES_PROVIDER, USDC, WETH, AMMROUTER, {"from": owner})
   poollength = roerouter.getPoolsLength()
 
+  assert roerouter.poolVersions(poollength - 1) == 0
   roerouter.deprecatePool(poollength - 1)
   assert roerouter.pools(poollength - 1)[4] == True
+  assert roerouter.poolVersions(poollength - 1) == 1
+
+
+def test_swap_route(accounts, user, owner, roerouter):
+  with brownie.reverts("Invalid Pool"):
+    roerouter.setSwapRoute(0, ROUTERV3, 500, {"from": owner})
+  roerouter.addPool(LENDING_POOL_ADDRESSES_PROVIDER, USDC, WETH, AMMROUTER, {"from": owner})
+  assert roerouter.swapRoutes(0) == (NULL, 0)
+
+  with brownie.reverts("Ownable: caller is not the owner"):
+    roerouter.setSwapRoute(0, ROUTERV3, 500, {"from": user})
+  with brownie.reverts("Invalid Fee Tier"):
+    roerouter.setSwapRoute(0, ROUTERV3, 0, {"from": owner})
+
+  tx = roerouter.setSwapRoute(0, ROUTERV3, 500, {"from": owner})
+  assert tx.events["SetSwapRoute"]["feeTier"] == 500
+  assert roerouter.swapRoutes(0) == (ROUTERV3, 500)
+  assert roerouter.poolVersions(0) == 1
+  # back to the AMM router
+  roerouter.setSwapRoute(0, NULL, 0, {"from": owner})
+  assert roerouter.swapRoutes(0) == (NULL, 0)
 
 
 def test_update_treasury(accounts, user, owner, roerouter):
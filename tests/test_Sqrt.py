@@ -0,0 +1,62 @@
+import pytest, brownie
+import math
+from brownie.test import given, strategy
+
+
+@pytest.fixture(scope="module", autouse=True)
+def sqrt_lib(owner, Test_Sqrt):
+  yield Test_Sqrt.deploy({"from": owner})
+
+
+# Both implementations revert together or return the same value
+def same_result(legacy, new, *args):
+  try:
+    expected = legacy(*args)
+  except brownie.exceptions.VirtualMachineError:
+    with brownie.reverts(): new(*args)
+    return
+  assert new(*args) == expected
+
+
+@given(x=strategy("uint256", max_value=2**256-2))
+def test_sqrt_fuzz(sqrt_lib, x):
+  assert sqrt_lib.sqrt(x) == sqrt_lib.babylonian(x)
+
+
+@given(bits=strategy("uint8"), offset=strategy("int8"))
+def test_sqrt_fuzz_squares(sqrt_lib, bits, offset):
+  # values around perfect squares are where rounding goes wrong
+  x = min(max((2**(bits // 2) + offset) ** 2 + offset, 0), 2**256-2)
+  assert sqrt_lib.sqrt(x) == sqrt_lib.babylonian(x) == math.isqrt(x)
+
+
+def test_sqrt_edges(sqrt_lib):
+  for x in [0, 1, 2, 3, 4, 15, 16, 17, 255, 256, 2**128-1, 2**128, (2**128-1)**2, 2**255]:
+    assert sqrt_lib.sqrt(x) == sqrt_lib.babylonian(x) == math.isqrt(x)
+  # the Babylonian loop overflows on x + 1
+  assert sqrt_lib.sqrt(2**256-1) == 2**128-1
+  with brownie.reverts(): sqrt_lib.babylonian(2**256-1)
+
+
+@given(price0=strategy("uint256", min_value=1, max_value=1e16), price1=strategy("uint256", min_value=1, max_value=1e16),
+       decimals0=strategy("uint8", max_value=24), decimals1=strategy("uint8", max_value=24))
+def test_oracle_sqrt_price_fuzz(sqrt_lib, price0, price1, decimals0, decimals1):
+  same_result(sqrt_lib.legacyOracleSqrtPriceX96, sqrt_lib.oracleSqrtPriceX96, price0, price1, decimals0, decimals1)
+
+
+@given(priceX10=strategy("uint256", min_value=1, max_value=1e24), decimals0=strategy("uint8", max_value=24), decimals1=strategy("uint8", max_value=24))
+def test_range_sqrt_price_fuzz(sqrt_lib, priceX10, decimals0, decimals1):
+  same_result(sqrt_lib.legacyRangeSqrtPriceX96, sqrt_lib.rangeSqrtPriceX96, priceX10, decimals0, decimals1)
+
+
+# Gas benchmark, run with -s to see the table
+def test_sqrt_gas(sqrt_lib):
+  print("\ninput bits | babylonian gas | sqrt gas")
+  sqrtGas = set()
+  for bits in [8, 32, 64, 96, 128, 160, 192, 224, 255]:
+    gas = sqrt_lib.sqrtGas(2**bits - 12345 if bits > 16 else 2**bits - 1)
+    print(f"{bits:10} | {gas[0]:14} | {gas[1]:8}")
+    sqrtGas.add(gas[1])
+    if bits >= 32: assert gas[1] < gas[0]
+  # constant gas, up to the branches of the first estimate
+  assert max(sqrtGas) - min(sqrtGas) < 50
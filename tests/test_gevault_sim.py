@@ -0,0 +1,57 @@
+import pytest
+np = pytest.importorskip("numpy")
+from scripts.liquidity_math import get_amounts_for_liquidity, get_liquidity_for_amounts, sqrt_price_from_prices, tick_ladder
+from scripts.gevault_sim import VaultConfig, GeVaultModel, simulate, gbm_paths
+
+# same ladder as tests/test_GeVault.py: USDC is token0, WETH is token1 and the base token
+TICKS = [1000, 1100, 1200, 1300, 1400, 1500]
+
+
+def ladder_config(**kwargs):
+  sqrt_lower, sqrt_upper = tick_ladder(TICKS, 1.0001, 6, 18, False)
+  return VaultConfig(sqrt_lower, sqrt_upper, False, 6, 18, **kwargs)
+
+
+def test_liquidity_round_trip():
+  sqrt_lower, sqrt_upper = tick_ladder(TICKS, 1.05, 6, 18, False)
+  sqrt_price = sqrt_price_from_prices(1, 1262, 6, 18)
+  liquidity = get_liquidity_for_amounts(sqrt_price, sqrt_lower, sqrt_upper, 1000e6, 1e18)
+  amount0, amount1 = get_amounts_for_liquidity(sqrt_price, sqrt_lower, sqrt_upper, liquidity)
+  # ticks below the ETH price hold USDC only, ticks above hold ETH only
+  assert np.allclose(amount0[:3], 1000e6) and np.all(amount1[:3] == 0)
+  assert np.allclose(amount1[3:], 1e18) and np.all(amount0[3:] == 0)
+  
+
+def test_active_tick_index():
+  vault = GeVaultModel(ladder_config(), 3)
+  sqrt_price = sqrt_price_from_prices(1, np.array([1262, 1150, 2000]), 6, 18)
+  # at 1262 the active ticks are 1100, 1200, 1300, 1400 like in the contract tests
+  assert list(vault.active_tick_index(sqrt_price)) == [1, 0, 3]
+
+
+def test_flat_price():
+  config = ladder_config(base_fee_x4=0, tvl_cap=1e6)
+  deposits0 = np.zeros((4, 3))
+  deposits0[:, 0] = 1000e6
+  withdrawals0 = np.zeros((4, 3))
+  withdrawals0[:, 2] = 0.5
+  result = simulate(config, 1.0, 1262.0, deposits0=deposits0, withdrawals0=withdrawals0)
+  assert np.allclose(result.share_price, 1)
+  assert np.allclose(result.tvl[:, -1], 500)
+  assert np.all(result.treasury_fees == 0) and np.all(result.lp_fees == 0)
+  assert np.allclose(result.deployed_ratio, 1)
+  # USDC goes in the 2 ticks below the price
+  assert np.allclose(result.tick_utilisation, [0, 1, 1, 0, 0, 0])
+
+
+def test_fees_and_cap():
+  config = ladder_config(tvl_cap=1500)
+  eth = gbm_paths(1262, 0.001, 50, 100)
+  deposits0 = np.zeros((100, 50))
+  deposits0[:, 0] = 1000e6
+  deposits0[:, 10] = 1000e6
+  result = simulate(config, 1.0, eth, deposits0=deposits0)
+  # first deposit pays the minimum fee of 0.1%, second one is over the cap
+  assert np.allclose(result.treasury_fees, 1)
+  assert np.all(result.rejected_deposits == 1)
+  assert np.all(result.lp_fees >= 0)
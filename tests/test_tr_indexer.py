@@ -0,0 +1,95 @@
+import pytest
+np = pytest.importorskip("numpy")
+from scripts.tr_indexer import (RangeIndexer, POSITION_MANAGER, ZERO_ADDRESS, TRANSFER, INIT_TR, DEPOSIT, WITHDRAW, CLAIM_FEES,
+  INCREASE_LIQUIDITY, DECREASE_LIQUIDITY, to_limbs, from_limbs)
+
+TR, USDC, WETH = "0x" + "11" * 20, "0x" + "22" * 20, "0x" + "33" * 20
+USER, POOL, TREASURY = "0x" + "44" * 20, "0x" + "55" * 20, "0x" + "66" * 20
+
+
+class Chain:
+  # Logs in the same order as the contracts emit them, one transaction per block
+  def __init__(self):
+    self.logs, self.block = [], 0
+
+  def tx(self, *events):
+    self.block += 1
+    for k, (address, topics, words) in enumerate(events):
+      self.logs.append({"address": address, "topics": ["0x%064x" % (t if isinstance(t, int) else int(t, 16)) for t in topics],
+        "data": "0x" + "".join("%064x" % (w if isinstance(w, int) else int(w, 16)) for w in words),
+        "blockNumber": self.block, "logIndex": k, "transactionHash": "0x%064x" % self.block})
+
+
+def transfer(token, sender, recipient, value):
+  return (token, [TRANSFER, sender, recipient], [value])
+
+
+def flows(n0, n1, sender, recipient):
+  return [transfer(USDC, sender, recipient, n0), transfer(WETH, sender, recipient, n1)]
+
+
+def claim(fee0, fee1, compound0=0, compound1=0, liquidity=0):
+  tf0, tf1 = fee0 * 20 // 100, fee1 * 20 // 100
+  events = flows(fee0, fee1, POOL, TR) + flows(tf0, tf1, TR, TREASURY)
+  if liquidity: events += [(POSITION_MANAGER, [INCREASE_LIQUIDITY, 7], [liquidity, compound0, compound1])] + flows(compound0, compound1, TR, POOL)
+  return events + [(TR, [CLAIM_FEES], [fee0, fee1])]
+
+
+def build_chain():
+  c = Chain()
+  c.tx((TR, [INIT_TR], [USDC, WETH, 500 * 10**10, 5000 * 10**10]))
+  # donation before init, refunded by init and never counted as fees
+  c.tx(transfer(USDC, USER, TR, 5))
+  c.tx(*flows(1000, 10**18, USER, TR), (POSITION_MANAGER, [TRANSFER, ZERO_ADDRESS, TR, 7], []),
+    (POSITION_MANAGER, [INCREASE_LIQUIDITY, 7], [10**15, 990, 10**18 - 10]), *flows(990, 10**18 - 10, TR, POOL),
+    *flows(15, 10, TR, USER), transfer(TR, ZERO_ADDRESS, USER, 10**18), (TR, [DEPOSIT], [USER, 10**18]))
+  c.tx(*claim(100, 10**12))
+  # deposit: the fee share 8 and 10**10 stays in the range
+  c.tx(*claim(50, 10**11), *flows(500, 5 * 10**17, USER, TR), (POSITION_MANAGER, [INCREASE_LIQUIDITY, 7], [5 * 10**14, 490, 5 * 10**17 - 10**10]),
+    *flows(490, 5 * 10**17 - 10**10, TR, POOL), *flows(2, 0, TR, USER), transfer(TR, ZERO_ADDRESS, USER, 5 * 10**17), (TR, [DEPOSIT], [USER, 5 * 10**17]))
+  c.tx(*claim(10**4, 10**16, 8100, 10**15, 10**12))
+  c.tx(*claim(0, 10**12), (POSITION_MANAGER, [DECREASE_LIQUIDITY, 7], [5 * 10**14, 400, 4 * 10**17]), *flows(10, 3 * 10**15, TR, USER),
+    transfer(TR, USER, ZERO_ADDRESS, 5 * 10**17), (TR, [WITHDRAW], [USER, 5 * 10**17]))
+  return c
+
+
+def test_limbs():
+  values = [0, 1, 2**64, 2**128 - 1, 2**256 - 1, 12345678901234567890123456789]
+  limbs = to_limbs(values)
+  assert limbs.dtype == np.uint64 and limbs.shape == (6, 4)
+  assert list(from_limbs(limbs)) == values
+  assert to_limbs([]).shape == (0, 4) and len(from_limbs(to_limbs([]))) == 0
+
+
+def test_replay():
+  indexer = RangeIndexer()
+  indexer.ingest(build_chain().logs)
+  fee0 = 100 - 20 + 50 - 10 + 8 + 10**4 - 2000 - 8100 - 10
+  fee1 = 10**12 - 2 * 10**11 + 10**11 - 2 * 10**10 + 10**10 + 10**16 - 2 * 10**15 - 10**15 + 10**12 - 2 * 10**11 - 3 * 10**15
+  assert indexer.range_state(TR) == {"token_id": 7, "liquidity": 10**15 + 5 * 10**14 + 10**12 - 5 * 10**14, "fee0": fee0, "fee1": fee1, "supply": 10**18}
+  assert (indexer.ranges, indexer.token0, indexer.token1, indexer.last_block) == ([TR], [USDC], [WETH], 7)
+  history = indexer.history(TR)
+  # one row per transaction changing the range, none for the donation
+  assert list(history["block"]) == [3, 4, 5, 6, 7]
+  assert list(history["supply"]) == [10**18, 10**18, 15 * 10**17, 15 * 10**17, 10**18]
+  assert list(history["fee0"]) == [0, 80, 80 + 40 + 8, 80 + 40 + 8 + 8000 - 8100, fee0]
+
+
+def test_checkpoint_resume(tmp_path):
+  logs = build_chain().logs
+  full = RangeIndexer()
+  full.ingest(logs)
+
+  path = str(tmp_path / "index.npz")
+  first = RangeIndexer()
+  first.ingest([l for l in logs if l["blockNumber"] <= 4])
+  first.save(path)
+  resumed = RangeIndexer.load(path)
+  assert resumed.range_state(TR) == first.range_state(TR) and resumed.last_block == 4
+  # already indexed blocks are skipped
+  resumed.ingest(logs)
+  assert resumed.range_state(TR) == full.range_state(TR) and resumed.last_block == full.last_block
+  for column, values in full.history().items():
+    assert list(resumed.history()[column]) == list(values)
+  with np.load(path) as f:
+    assert all(f[k].dtype != object for k in f.files)
@@ -0,0 +1,65 @@
+import pytest
+np = pytest.importorskip("numpy")
+from scripts.tr_math import (MIN_TICK, MAX_TICK, MIN_SQRT_RATIO, MAX_SQRT_RATIO, SolidityRevert, RangeState, mul_div, mul_div_rounding_up,
+  get_sqrt_ratio_at_tick, get_tick_at_sqrt_ratio, get_amounts_for_liquidity, get_liquidity_for_amounts, range_ticks)
+from scripts.liquidity_math import get_amounts_for_liquidity as get_amounts_float
+
+
+def test_tick_math():
+  assert get_sqrt_ratio_at_tick(0) == 2**96
+  assert get_sqrt_ratio_at_tick(MIN_TICK) == MIN_SQRT_RATIO and get_sqrt_ratio_at_tick(MAX_TICK) == MAX_SQRT_RATIO
+  assert get_tick_at_sqrt_ratio(MIN_SQRT_RATIO) == MIN_TICK and get_tick_at_sqrt_ratio(MAX_SQRT_RATIO - 1) == MAX_TICK - 1
+  with pytest.raises(SolidityRevert): get_sqrt_ratio_at_tick(MAX_TICK + 1)
+  with pytest.raises(SolidityRevert): get_tick_at_sqrt_ratio(MAX_SQRT_RATIO)
+
+  ticks = np.random.default_rng(0).integers(MIN_TICK + 1, MAX_TICK, 5000)
+  sqrt_ratios = get_sqrt_ratio_at_tick(ticks)
+  # the tick is the greatest one whose sqrt price is below the input
+  assert np.all(get_tick_at_sqrt_ratio(sqrt_ratios) == ticks) and np.all(get_tick_at_sqrt_ratio(sqrt_ratios - 1) == ticks - 1)
+  assert np.allclose(sqrt_ratios.astype(float), 2**96 * 1.0001 ** (ticks / 2), rtol=1e-9)
+
+
+def test_full_math():
+  assert mul_div(2**255, 4, 8) == 2**254
+  assert mul_div_rounding_up(10, 10, 3) == 34 and mul_div(10, 10, 3) == 33
+  with pytest.raises(SolidityRevert): mul_div(2**255, 4, 1)
+  with pytest.raises(SolidityRevert): mul_div(1, 1, 0)
+
+
+def test_liquidity_amounts():
+  sqrt_lower, sqrt_upper = get_sqrt_ratio_at_tick(np.array([191150, 200000])), get_sqrt_ratio_at_tick(np.array([214170, 200010]))
+  sqrt_price = get_sqrt_ratio_at_tick(np.array([[205000], [190000], [220000]]))
+  liquidity = get_liquidity_for_amounts(sqrt_price, sqrt_lower, sqrt_upper, 1000 * 10**6, 10**18)
+  amount0, amount1 = get_amounts_for_liquidity(sqrt_price, sqrt_lower, sqrt_upper, liquidity)
+  assert np.all(amount0 <= 1000 * 10**6) and np.all(amount1 <= 10**18)
+  # same as the float model within rounding
+  float0, float1 = get_amounts_float(sqrt_price.astype(float) / 2**96, sqrt_lower.astype(float) / 2**96, sqrt_upper.astype(float) / 2**96, liquidity.astype(float))
+  assert np.allclose(amount0.astype(float), float0, rtol=1e-9, atol=1) and np.allclose(amount1.astype(float), float1, rtol=1e-9, atol=1)
+
+
+def test_range_ticks():
+  # USDC/WETH range 500-5000 and ticker 1000-1200, like in test_RangeManager.py
+  lower, upper = range_ticks(500 * 10**10, 5000 * 10**10, 6, 18, False)
+  assert lower % 10 == 0 and upper % 10 == 0 and lower < upper
+  assert abs(1.0001 ** -upper * 1e12 - 500) < 1 and abs(1.0001 ** -lower * 1e12 - 5000) < 5
+  lower, upper = range_ticks(1000 * 10**10, 1200 * 10**10, 6, 18, True)
+  assert upper - lower == 10
+  # Solidity rounds signed division and modulo towards zero
+  lower, upper = range_ticks(np.array([10**10, 10**12]), 2 * 10**12, 18, 6, False)
+  assert list(lower % 10) == [0, 0] and np.all(lower < 0)
+
+
+def test_range_valuation():
+  lower, upper = range_ticks(500 * 10**10, 5000 * 10**10, 6, 18, False)
+  tr = RangeState(lower, upper, 10**15, 10**18, 6, 18, 1000, 10**12)
+  prices1 = np.array([400 * 10**8, 1600 * 10**8, 6000 * 10**8], dtype=object)
+  amount0, amount1 = tr.return_expected_balance(10**8, prices1)
+  assert amount1[0] > 0 and amount0[0] == 1000 and amount1[2] == 10**12 and amount0[2] > 0
+  values = tr.get_value_per_lp_at_price(10**8, prices1)
+  assert values[1] == (amount0[1] * 10**8 // 10**6 + amount1[1] * prices1[1] // 10**18) * 10**18 // 10**18
+  assert RangeState(lower, upper, 0, 0, 6, 18).get_value_per_lp_at_price(10**8, 1600 * 10**8) == 0
+
+  sqrt_price = get_sqrt_ratio_at_tick(-201000)
+  half0, half1 = tr.get_token_amounts(10**18 // 2, sqrt_price)
+  full0, full1 = tr.get_token_amounts(10**18, sqrt_price)
+  assert full0 - 2 * half0 in (0, 1) and full1 - 2 * half1 in (0, 1)